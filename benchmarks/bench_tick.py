@@ -0,0 +1,112 @@
+"""
+Tick arithmetic benchmarks
+
+Compares the integer timestamp helpers in :mod:`ncfacbot.tickmath` with the
+datetime-based helpers they replaced. Run from the repository root with the
+development dependencies installed:
+
+    python benchmarks/bench_tick.py
+"""
+
+# stdlib
+import calendar
+from datetime import datetime, timezone
+from timeit import repeat
+
+# 3rd party
+from aethersprite.common import FIFTEEN_MINS
+
+# local
+from ncfacbot import tickmath
+
+#: Number of calls per timing run
+NUMBER = 100_000
+#: Number of timing runs; the best is reported
+REPEAT = 5
+
+
+def legacy_get_next_tick(n=1):
+    """The original get_next_tick helper"""
+
+    now = calendar.timegm(datetime.now(timezone.utc).timetuple())
+    tick_stamp = (now + (n * FIFTEEN_MINS)) - (now % FIFTEEN_MINS)
+
+    return datetime.fromtimestamp(tick_stamp, tz=timezone.utc)
+
+
+def legacy_discord_timestamp(dt: datetime):
+    """The original discord_timestamp helper"""
+
+    stamp = calendar.timegm(dt.timetuple())
+
+    return f"<t:{stamp}>"
+
+
+def legacy_tick(n=1):
+    """The clock reads and formatting done by the original tick command"""
+
+    future_tick = legacy_get_next_tick(n)
+    stamp = legacy_discord_timestamp(future_tick)
+    until = (future_tick - datetime.now(timezone.utc)).total_seconds()
+
+    return stamp, until
+
+
+def tick(n=1):
+    """The clock reads and formatting done by the tick command"""
+
+    now = tickmath.now()
+    future_tick = tickmath.next_tick(now, n)
+
+    return tickmath.discord_stamp(future_tick), future_tick - now
+
+
+def legacy_next_ticks(count=16):
+    """Next several ticks using the original helpers"""
+
+    return [legacy_get_next_tick(n) for n in range(1, count + 1)]
+
+
+def next_ticks(count=16):
+    """Next several ticks using the batch API"""
+
+    return tickmath.next_ticks(tickmath.now(), count)
+
+
+BENCHMARKS = (
+    (
+        "next tick",
+        legacy_get_next_tick,
+        lambda: tickmath.next_tick(tickmath.now()),
+    ),
+    ("tick command", legacy_tick, tick),
+    ("next 16 ticks", legacy_next_ticks, next_ticks),
+)
+"""Pairs of (name, legacy function, replacement function) to compare"""
+
+
+def measure(fn) -> float:
+    """
+    Time a function.
+
+    :param fn: The function to time
+    :returns: The best time per call, in microseconds
+    """
+
+    return min(repeat(fn, number=NUMBER, repeat=REPEAT)) / NUMBER * 1e6
+
+
+def main():
+    print(f"{'benchmark':<16}{'legacy':>12}{'tickmath':>12}{'speedup':>10}")
+
+    for name, legacy, current in BENCHMARKS:
+        before = measure(legacy)
+        after = measure(current)
+        print(
+            f"{name:<16}{before:>10.3f}us{after:>10.3f}us"
+            f"{before / after:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
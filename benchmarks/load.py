@@ -0,0 +1,241 @@
+"""
+Safe contents ingestion load generator
+
+Posts synthetic UserScript reports for many guilds to the safe contents
+endpoint with many requests in flight at once, as when a whole faction logs in
+after a raid, and reports throughput, latency percentiles, and how many bytes
+the database writes for each byte received.
+
+By default the web application is run in-process with storage in a temporary
+folder. With ``--url``, requests are sent to a running bot instead; its
+UserScript keys must match ``--key``, and database figures are not available.
+
+Run from the repository root with the development dependencies installed:
+
+    python benchmarks/load.py [--guilds 200] [--requests 5000]
+        [--concurrency 100] [--items 500] [--url http://localhost:8000]
+"""
+
+# stdlib
+from argparse import ArgumentParser
+import asyncio as aio
+import json
+from os.path import getsize, join
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+# 3rd party
+from aethersprite.common import FakeContext
+from aethersprite.settings import settings
+from fastapi import FastAPI
+import httpx
+from sqlitedict import SqliteDict
+import sqlitedict
+
+# local
+from ncfacbot import metrics, safe
+from ncfacbot.metrics import Samples, TimedTable
+from payloads import safe_items
+
+PATH = "/nexusclash.safe/post"
+"""Path of the safe contents endpoint"""
+
+
+class WriteCounter:
+    """SqliteDict encoder which counts what it writes"""
+
+    def __init__(self):
+        #: Number of values written
+        self.writes = 0
+        #: Number of encoded bytes written
+        self.bytes = 0
+
+    def __call__(self, obj):
+        data = sqlitedict.encode(obj)
+        self.writes += 1
+        self.bytes += len(data)
+
+        return data
+
+
+def reports(
+    guilds: int, requests: int, items: int, key: str, rng: Random
+) -> list[bytes]:
+    """
+    Generate request bodies.
+
+    Each guild's safe holds a different number of items, up to half again as
+    many as ``items``. Successive reports for a guild adjust a few of the
+    counts, as members withdraw and deposit, and one in ten comes from a
+    character who is spell blind.
+
+    :param guilds: The number of guilds reporting
+    :param requests: The total number of reports
+    :param items: The average number of items in a safe
+    :param key: The UserScript key for every guild
+    :param rng: The random number generator to use
+    :returns: The encoded request bodies, in the order to send them
+    """
+
+    safes = {
+        str(1000 + g): safe_items(rng.randint(items // 2, items * 3 // 2), rng)
+        for g in range(guilds)
+    }
+    ids = list(safes)
+    bodies = []
+
+    for _ in range(requests):
+        guild = rng.choice(ids)
+        contents = safes[guild]
+        components = contents["Component"]
+
+        for _ in range(min(3, len(components))):
+            i = rng.randrange(len(components))
+            name = safe._item_name(components[i])
+            components[i] = f"{name} ({rng.randint(1, 40)})"
+
+        if rng.random() < 0.1:
+            contents = {**contents, "Spell": ["0"]}
+
+        bodies.append(
+            json.dumps({"guild": guild, "key": key, "items": contents}).encode()
+        )
+
+    return bodies
+
+
+async def drive(
+    client: httpx.AsyncClient, bodies: list[bytes], concurrency: int
+) -> tuple[Samples, dict[int, int], float]:
+    """
+    Send every report, keeping a fixed number of requests in flight.
+
+    :param client: The HTTP client to send with
+    :param bodies: The request bodies to send
+    :param concurrency: The number of requests in flight at once
+    :returns: Latencies in seconds, counts by response status, and the
+        elapsed time in seconds
+    """
+
+    latencies = Samples(len(bodies))
+    statuses: dict[int, int] = {}
+    pending = iter(bodies)
+
+    async def worker():
+        for body in pending:
+            start = perf_counter()
+            response = await client.post(
+                PATH,
+                content=body,
+                headers={"Content-Type": "application/json"},
+            )
+            latencies.observe(perf_counter() - start)
+            statuses[response.status_code] = (
+                statuses.get(response.status_code, 0) + 1
+            )
+
+    start = perf_counter()
+    await aio.gather(*(worker() for _ in range(concurrency)))
+
+    return latencies, statuses, perf_counter() - start
+
+
+def webapp(folder: str, guilds: int, key: str, counter: WriteCounter):
+    """
+    Set up the web application as the bot would, with its storage in a
+    temporary folder.
+
+    :param folder: The folder to store the database in
+    :param guilds: The number of guilds reporting
+    :param key: The UserScript key for every guild
+    :param counter: Encoder counting the database writes
+    :returns: The web application and the path of its database
+    """
+
+    path = join(folder, "safe.sqlite3")
+    safe.Safe._safe = TimedTable(
+        SqliteDict(path, tablename="contents", autocommit=True, encode=counter),
+        "safe.contents",
+    )
+    app = FastAPI()
+    metrics.setup_webapp(app, None)
+    safe.setup_webapp(app, None)
+
+    for g in range(guilds):
+        ctx = FakeContext(guild={"id": str(1000 + g)})
+        settings["safe.key"].set(ctx, key)  # type: ignore
+
+    return app, path
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--key", default="loadtest")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="Send requests to a running bot")
+    args = parser.parse_args()
+    bodies = reports(
+        args.guilds, args.requests, args.items, args.key, Random(args.seed)
+    )
+    received = sum(len(b) for b in bodies)
+
+    async def run(folder: str):
+        counter = WriteCounter()
+
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=None)
+            path = None
+        else:
+            app, path = webapp(folder, args.guilds, args.key, counter)
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),  # type: ignore
+                base_url="http://loadtest",
+            )
+
+        async with client:
+            latencies, statuses, elapsed = await drive(
+                client, bodies, args.concurrency
+            )
+
+        if path is not None:
+            safe.Safe._safe.db.close()
+
+        return latencies, statuses, elapsed, counter, path
+
+    with TemporaryDirectory() as folder:
+        latencies, statuses, elapsed, counter, path = aio.run(run(folder))
+        size = getsize(path) if path else None
+
+    p50, p90, p99 = (q * 1000 for q in latencies.quantiles())
+    rows = [
+        ("requests", f"{len(bodies)}"),
+        ("concurrency", f"{args.concurrency}"),
+        ("statuses", ", ".join(f"{k}: {v}" for k, v in statuses.items())),
+        ("elapsed", f"{elapsed:.2f}s"),
+        ("throughput", f"{len(bodies) / elapsed:.1f} req/s"),
+        ("latency p50", f"{p50:.1f}ms"),
+        ("latency p90", f"{p90:.1f}ms"),
+        ("latency p99", f"{p99:.1f}ms"),
+        ("latency max", f"{max(latencies.values) * 1000:.1f}ms"),
+        ("received", f"{received / 2**20:.1f}MiB"),
+    ]
+
+    if size is not None:
+        rows += [
+            ("db writes", f"{counter.writes}"),
+            ("db bytes written", f"{counter.bytes / 2**20:.1f}MiB"),
+            ("write amplification", f"{counter.bytes / received:.2f}x"),
+            ("db file size", f"{size / 2**20:.1f}MiB"),
+        ]
+
+    for name, value in rows:
+        print(f"{name:<22}{value}")
+
+
+if __name__ == "__main__":
+    main()
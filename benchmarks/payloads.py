@@ -0,0 +1,126 @@
+"""
+Synthetic safe contents payloads
+
+Builds request bodies shaped like those posted by ``nc-safe-report.user.js``,
+for use by the benchmarks and load generator.
+"""
+
+# stdlib
+from random import Random
+
+# local
+from ncfacbot.catalog import catalog
+
+POTIONS = (
+    "Acid Affinity",
+    "Cold Affinity",
+    "Death Affinity",
+    "Electric Affinity",
+    "Fire Affinity",
+    "Healing",
+    "Invulnerability",
+    "Regeneration",
+    "Strength",
+    "Water-Breathing",
+)
+"""Potion names to report"""
+
+SPELLS = (
+    "Bolt of Fire",
+    "Bolt of Ice",
+    "Bolt of Lightning",
+    "Dark Heal",
+    "Glyph of Lightning",
+    "Lesser Heal",
+    "Lightning Storm",
+    "Stinging Wave",
+    "Tangle Vines",
+    "Wisp Blast",
+)
+"""Spell names to report"""
+
+GEMS = ("Amethyst", "Diamond", "Emerald", "Ruby", "Sapphire", "Topaz")
+"""Spell gem types"""
+
+
+def safe_items(
+    count: int, rng: Random, structured: bool = False
+) -> dict[str, list]:
+    """
+    Generate safe contents as listed by the UserScript.
+
+    Components make up half of the items, and potions and spell gems a
+    quarter each. Spell gems are grouped by spell, as they are in the safe.
+
+    :param count: The total number of items to generate
+    :param rng: The random number generator to use
+    :param structured: Whether to send each item's fields, as the current
+        UserScript does, rather than its text
+    :returns: Item listings by category
+    """
+
+    components = list(catalog.get().tags)
+    spells = count // 4
+    potions = count // 4
+    items = {
+        "Component": [
+            (rng.choice(components), rng.randint(1, 40))
+            for _ in range(count - spells - potions)
+        ],
+        "Potion": [
+            (f"Potion of {rng.choice(POTIONS)}", rng.randint(1, 40))
+            for _ in range(potions)
+        ],
+        "Spell": sorted(
+            (
+                rng.choice(SPELLS),
+                rng.choice(GEMS),
+                rng.randint(1, 5),
+                rng.randint(1, 10),
+            )
+            for _ in range(spells)
+        ),
+    }
+
+    if structured:
+        return {
+            "Component": [
+                {"name": n, "count": c} for n, c in items["Component"]
+            ],
+            "Potion": [{"name": n, "count": c} for n, c in items["Potion"]],
+            "Spell": [
+                {"name": n, "shots": s, "count": c}
+                for n, _, s, c in items["Spell"]
+            ],
+        }
+
+    return {
+        "Component": [f"{n} ({c})" for n, c in items["Component"]],
+        "Potion": [f"{n} ({c})" for n, c in items["Potion"]],
+        "Spell": [
+            f"{n} - Small {g} Gem, {s} shots ({c})"
+            for n, g, s, c in items["Spell"]
+        ],
+    }
+
+
+def safe_payload(
+    guild: str, key: str, count: int, rng: Random, structured: bool = False
+) -> dict:
+    """
+    Generate a safe contents request body.
+
+    :param guild: The guild ID, as the UserScript sends it
+    :param key: The guild's UserScript key
+    :param count: The total number of items to generate
+    :param rng: The random number generator to use
+    :param structured: Whether to send each item's fields rather than its
+        text
+    :returns: The request body
+    """
+
+    return {
+        "guild": guild,
+        "key": key,
+        "items": safe_items(count, rng, structured),
+    }
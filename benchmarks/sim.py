@@ -0,0 +1,455 @@
+"""
+Deterministic timer simulation
+
+Runs raid and Sorcerers Might countdown scheduling for many fake guilds on an
+event loop with a virtual clock. Whenever the loop would wait for a timer, the
+clock jumps straight to it, so hours of schedules run in seconds and every
+timer fires exactly when it should unless the scheduling code is wrong. The
+messages each guild receives are checked for order and timing, and the run
+doubles as a throughput benchmark for the scheduling code.
+
+Run from the repository root with the development dependencies installed:
+
+    python benchmarks/sim.py [--guilds 2000] [--users 3] [--seed 1]
+"""
+
+# stdlib
+from argparse import ArgumentParser
+import asyncio as aio
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import count
+from random import Random
+import selectors
+import time
+
+# 3rd party
+from aethersprite.common import FakeContext
+from discord.abc import GuildChannel
+
+# local
+from ncfacbot import metrics, raid, sm
+from ncfacbot.metrics import TimedTable
+
+START = 1_700_000_000
+"""Virtual UNIX timestamp the simulation starts at"""
+
+TOLERANCE = 1.0
+"""Seconds a message may be off from its expected time"""
+
+
+class VirtualClock:
+    """Clock which only moves when the event loop has nothing to do"""
+
+    def __init__(self, now: float):
+        #: The current virtual UNIX timestamp
+        self.now = float(now)
+
+    def time(self) -> float:
+        return self.now
+
+
+class _VirtualSelector(selectors.SelectSelector):
+    """Selector which advances the clock instead of blocking"""
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        if timeout is None:
+            raise RuntimeError("Simulation stalled; nothing is scheduled")
+
+        self.clock.now += timeout
+
+        return super().select(0)
+
+
+class VirtualEventLoop(aio.SelectorEventLoop):
+    """Event loop driven by a :class:`VirtualClock`"""
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__(_VirtualSelector(clock))
+        self.clock = clock
+        # absorb float rounding when the clock jumps to a timer's deadline
+        self._clock_resolution = 1e-3
+
+    def time(self) -> float:
+        # like the real loop clock, this is monotonic rather than wall time,
+        # so code which mixes the two up will misbehave here as well
+        return self.clock.now - START
+
+
+@contextmanager
+def virtual_time(clock: VirtualClock):
+    """Make wall clock reads in the bot's modules use the virtual clock."""
+
+    class VirtualDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(clock.now, tz)
+
+    patches = (
+        (time, "time", clock.time),
+        (metrics, "time", clock.time),
+        (raid, "datetime", VirtualDatetime),
+        (sm, "datetime", VirtualDatetime),
+    )
+    originals = [(obj, name, getattr(obj, name)) for obj, name, _ in patches]
+
+    for obj, name, value in patches:
+        setattr(obj, name, value)
+
+    try:
+        yield
+    finally:
+        for obj, name, value in originals:
+            setattr(obj, name, value)
+
+
+class FakeRole:
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+        self.mention = f"<@&{id}>"
+
+
+class FakeMessage:
+    ids = count(1)
+
+    def __init__(self, content: str | None):
+        self.id = next(self.ids)
+        self.content = content
+
+    async def add_reaction(self, emoji):
+        pass
+
+
+class FakeChannel(GuildChannel):
+    def __init__(
+        self, sim: "Simulation", guild: "FakeGuild", id: int, name: str
+    ):
+        self.sim = sim
+        self.guild = guild
+        self.id = id
+        self.name = name
+
+    async def send(self, content: str | None = None, **kwargs):
+        self.sim.sent.append((self.sim.clock.now, self.guild.id, content))
+
+        return FakeMessage(content)
+
+
+class FakeGuild:
+    def __init__(self, sim: "Simulation", id: int):
+        self.id = id
+        self.name = f"guild-{id}"
+        self.channels = [FakeChannel(sim, self, id * 10, "raids")]
+        self.roles = [FakeRole(id * 10 + 1, "medic")]
+
+
+class FakeMember:
+    def __init__(self, id: int):
+        self.id = id
+        self.name = f"user{id}"
+        self.display_name = f"User {id}"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeBot:
+    def __init__(self, guilds: list[FakeGuild]):
+        self.guilds = guilds
+        self.cogs = {}
+
+    async def add_cog(self, cog):
+        for command in cog.get_commands():
+            command.cog = cog
+
+        self.cogs[cog.qualified_name] = cog
+
+    def add_command(self, command):
+        pass
+
+    def add_listener(self, listener, name=None):
+        pass
+
+    def remove_listener(self, listener, name=None):
+        pass
+
+
+class CommandContext(FakeContext):
+    """Command context for a fake member in a fake guild"""
+
+    def __init__(self, bot: FakeBot, guild: FakeGuild, author: FakeMember):
+        super().__init__(guild=guild)
+        self.bot = bot
+        self.guild = guild
+        self.author = author
+        self.channel = guild.channels[0]
+        self.message = FakeMessage(None)
+
+    async def send(self, content: str | None = None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+def _stream(content: str | None) -> str | None:
+    """Helper function to tell which timer a message came from"""
+
+    if content is None:
+        return None
+
+    if "Reminder:" in content or "Time to raid" in content:
+        return "raid"
+
+    if "Sorcerers Might ended" in content:
+        return "sm"
+
+    return None
+
+
+class Simulation:
+    """Fake guilds, bot, and storage running on a virtual clock"""
+
+    def __init__(self, guilds: int, seed: int = 1):
+        self.clock = VirtualClock(START)
+        self.loop = VirtualEventLoop(self.clock)
+        self.random = Random(seed)
+        #: Every message sent, as (virtual time, guild ID, content)
+        self.sent: list[tuple[float, int, str | None]] = []
+        #: Messages expected, as (virtual time, guild ID, stream, substring)
+        self.expected: list[tuple[float, int, str, str]] = []
+        self.guilds = [FakeGuild(self, 1000 + i) for i in range(guilds)]
+        self.bot = FakeBot(self.guilds)
+        self._users = 0
+
+    def member(self) -> FakeMember:
+        self._users += 1
+
+        return FakeMember(self._users)
+
+    def ctx(self, guild: FakeGuild, member: FakeMember) -> CommandContext:
+        return CommandContext(self.bot, guild, member)
+
+    async def setup(self):
+        """Load the extensions with in-memory storage."""
+
+        raid.Raid._schedules = TimedTable({}, "raid.schedule")
+        raid.Raid._handles = {}
+        raid.Raid._index = {}
+        raid.Raid._at = {}
+        raid.Raid._attendance = TimedTable({}, "raid.rsvp")
+        raid.Raid._rsvps = {}
+        raid.Raid._embeds = {}
+        sm.schedule = TimedTable({}, "sm.announce")
+        sm.boards = TimedTable({}, "sm.board")
+        await raid.setup(self.bot)
+        await sm.setup(self.bot)  # type: ignore
+        await sm.on_ready()
+        self.cog = self.bot.cogs["raid"]
+
+    async def teardown(self):
+        await raid.teardown(self.bot)
+        await sm.teardown(self.bot)  # type: ignore
+
+    async def schedule_raids(self):
+        """Schedule a raid in every guild through the raid commands."""
+
+        for guild in self.guilds:
+            ctx = self.ctx(guild, self.member())
+            # raids are scheduled to the minute
+            when = START - START % 60 + self.random.randrange(60, 48 * 3600, 60)
+            stamp = datetime.fromtimestamp(when, timezone.utc)
+            target = f"Target {guild.id}"
+            commands = [
+                self.cog.target.callback(self.cog, ctx, target=target),
+                self.cog.schedule.callback(
+                    self.cog, ctx, when=stamp.strftime("%Y-%m-%d %H:%M")
+                ),
+            ]
+
+            # leaders may set the target and schedule in either order
+            self.random.shuffle(commands)
+
+            for c in commands:
+                await c
+
+            if when - START > 28800:
+                self.expected.append(
+                    (when - 28800, guild.id, "raid", "(in 8 hours)")
+                )
+
+            if when - START > 1800:
+                self.expected.append(
+                    (when - 1800, guild.id, "raid", "in 30 minutes")
+                )
+
+            self.expected.append(
+                (when, guild.id, "raid", f"Time to raid {target}")
+            )
+
+    async def start_countdowns(self, users: int):
+        """Start SM countdowns for several users in every guild, and cancel
+        some of them partway through."""
+
+        for guild in self.guilds:
+            for _ in range(users):
+                member = self.member()
+                n = self.random.randint(1, sm.SM_LIMIT)
+                await sm.sm.callback(self.ctx(guild, member), n)
+
+                if self.random.random() < 0.25:
+                    cancel = self.random.randrange(1, n * 60)
+                    self.loop.call_later(
+                        cancel,
+                        lambda c=self.ctx(guild, member): self.loop.create_task(
+                            sm.sm.callback(c, 0)
+                        ),
+                    )
+                    continue
+
+                self.expected.append(
+                    (
+                        START - START % 60 + 60 * (n + 1),
+                        guild.id,
+                        "sm",
+                        f"Sorcerers Might ended for {member.display_name}!",
+                    )
+                )
+
+    async def restart(self):
+        """Drop every live timer and rehydrate them from storage, as if the
+        bot had been restarted."""
+
+        for handle in raid.Raid._handles.values():
+            handle.cancel()
+
+        for alerts in getattr(self.bot, "sm_alerts").values():
+            for _, handle in alerts.values():
+                handle.cancel()
+
+        raid.Raid._handles = {}
+        raid.Raid._index = {}
+        raid.Raid._at = {}
+        raid.Raid._rsvps = {}
+        raid.Raid._embeds = {}
+        setattr(self.bot, "sm_alerts", {})
+        setattr(self.bot, "sm_index", {})
+
+        for attr in ("__raid_ready__", "__sm_ready__"):
+            if hasattr(self.bot, attr):
+                delattr(self.bot, attr)
+
+        await self.cog.on_ready()
+        await sm.on_ready()
+
+    def check(self):
+        """Check that exactly the expected messages were sent, in order and
+        on time.
+
+        Raid messages for a guild must arrive in order. SM countdowns are
+        independent of each other, so those which end at the same time may
+        arrive in any order."""
+
+        received: dict[tuple[int, str], list[tuple[float, str]]] = {}
+        expected: dict[tuple[int, str], list[tuple[float, str]]] = {}
+
+        for when, guild, content in self.sent:
+            stream = _stream(content)
+
+            if stream is not None:
+                received.setdefault((guild, stream), []).append((when, content))  # type: ignore
+
+        for when, guild, stream, content in sorted(self.expected):
+            expected.setdefault((guild, stream), []).append((when, content))  # type: ignore
+
+        for key in expected.keys() | received.keys():
+            got = received.get(key, [])
+            want = expected.get(key, [])
+
+            if key[1] == "sm":
+                got = sorted(got, key=lambda m: (round(m[0]), m[1]))
+
+            assert len(got) == len(want), (
+                f"Guild {key[0]}: expected {len(want)} {key[1]} messages, "
+                f"got {len(got)}: {got}"
+            )
+
+            for (got_when, got_msg), (want_when, want_msg) in zip(got, want):
+                assert want_msg in got_msg, (
+                    f"Guild {key[0]}: expected '{want_msg}' at {want_when}, "
+                    f"got '{got_msg}' at {got_when}"
+                )
+                assert abs(got_when - want_when) <= TOLERANCE, (
+                    f"Guild {key[0]}: '{want_msg}' expected at {want_when}, "
+                    f"sent at {got_when}"
+                )
+
+    def run(self, users: int, restart: bool = True) -> dict:
+        """
+        Run the whole simulation.
+
+        :param users: The number of SM countdowns to start per guild
+        :param restart: Whether to restart partway through, exercising the
+            rehydration in each extension's on_ready
+        :returns: Benchmark results
+        """
+
+        async def main():
+            await self.setup()
+            scheduling = time.perf_counter()
+            await self.schedule_raids()
+            await self.start_countdowns(users)
+            scheduling = time.perf_counter() - scheduling
+
+            if restart:
+                # part way through the SM countdowns and raid reminders
+                await aio.sleep(30 * 60)
+                await self.restart()
+
+            await aio.sleep(49 * 3600 - (self.clock.now - START))
+            await self.teardown()
+
+            return scheduling
+
+        aio.set_event_loop(self.loop)
+
+        with virtual_time(self.clock):
+            wall = time.perf_counter()
+            scheduling = self.loop.run_until_complete(main())
+            wall = time.perf_counter() - wall
+
+        self.loop.close()
+        self.check()
+
+        return {
+            "guilds": len(self.guilds),
+            "timers": len(self.expected),
+            "messages": len(self.sent),
+            "virtual_hours": (self.clock.now - START) / 3600,
+            "scheduling_seconds": scheduling,
+            "wall_seconds": wall,
+            "timers_per_second": len(self.expected) / wall,
+        }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--guilds", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-restart", action="store_true")
+    args = parser.parse_args()
+    results = Simulation(args.guilds, args.seed).run(
+        args.users, not args.no_restart
+    )
+
+    for k, v in results.items():
+        print(
+            f"{k:<20}{v:>12.2f}" if isinstance(v, float) else f"{k:<20}{v:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
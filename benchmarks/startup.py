@@ -0,0 +1,121 @@
+"""
+Startup time benchmark
+
+Measures how long a fresh interpreter takes to import the extensions, set
+them up, and run their ready handlers against a fake bot, and reports whether
+the web framework was imported and how many database tables were opened along
+the way. Point ``--tree`` at another checkout to compare against it.
+
+Run from the repository root with the development dependencies installed:
+
+    python benchmarks/startup.py [--runs 10] [--tree path/to/checkout]
+"""
+
+# stdlib
+from argparse import ArgumentParser
+import json
+from os.path import dirname, realpath
+from statistics import median
+import subprocess
+import sys
+
+CHILD = """
+import asyncio as aio
+import gc
+import importlib
+import json
+import sys
+import time
+
+start = time.perf_counter()
+extensions = importlib.import_module("ncfacbot._all")
+imported = time.perf_counter()
+
+
+class FakeBot:
+    guilds = []
+
+    def __init__(self):
+        self.listeners = []
+
+    async def load_extension(self, name):
+        await importlib.import_module(name).setup(self)
+
+    async def add_cog(self, cog):
+        self.listeners += [fn for _, fn in cog.get_listeners()]
+
+    def add_command(self, command):
+        pass
+
+    def add_listener(self, listener, name=None):
+        self.listeners.append(listener)
+
+
+async def main():
+    bot = FakeBot()
+    await extensions.setup(bot)
+    loaded = time.perf_counter()
+
+    for listener in bot.listeners:
+        if listener.__name__ == "on_ready":
+            await listener()
+
+    return loaded
+
+
+loaded = aio.run(main())
+ready = time.perf_counter()
+from sqlitedict import SqliteDict
+
+print(json.dumps({
+    "import": imported - start,
+    "setup": loaded - imported,
+    "ready": ready - start,
+    "web": "fastapi" in sys.modules,
+    "tables": sum(isinstance(o, SqliteDict) for o in gc.get_objects()),
+}))
+"""
+"""Program run in each fresh interpreter"""
+
+
+def measure(tree: str) -> dict:
+    """
+    Start the extensions once, in a fresh interpreter.
+
+    :param tree: The checkout to import the extensions from
+    :returns: Timings in seconds, whether the web framework was imported, and
+        the number of database tables opened
+    """
+
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        capture_output=True,
+        check=True,
+        cwd=tree,
+        text=True,
+    ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--tree",
+        default=dirname(dirname(realpath(__file__))),
+        help="Checkout to measure",
+    )
+    args = parser.parse_args()
+    runs = [measure(args.tree) for _ in range(args.runs)]
+
+    for key in ("import", "setup", "ready"):
+        ms = median(r[key] for r in runs) * 1000
+        print(f"{key + ' ms':<16}{ms:>10.1f}")
+
+    print(f"{'web imported':<16}{str(runs[-1]['web']):>10}")
+    print(f"{'tables opened':<16}{runs[-1]['tables']:>10}")
+
+
+if __name__ == "__main__":
+    main()
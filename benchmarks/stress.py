@@ -0,0 +1,335 @@
+"""
+Concurrency stress test for per-guild command locks
+
+Fires many read-modify-write commands at once in a single guild, against fake
+Discord objects whose sends take a while and SqliteDict storage in a temporary
+folder, then checks that no update was lost. Then runs the same burst in
+several guilds at once, to check that guilds don't wait on each other. Before
+that, the invoke hooks of the raid and SM commands are run the way discord.py
+runs them, to check that the metrics hooks accept them.
+
+Run from the repository root with the development dependencies installed:
+
+    python benchmarks/stress.py [--users 50] [--ops 10] [--guilds 8]
+
+Use ``--unlocked`` to run without the locks, to see the lost updates. The run
+exits with a non-zero status if any update was lost.
+"""
+
+# stdlib
+from argparse import ArgumentParser
+import asyncio as aio
+from os.path import join
+from random import Random
+import sys
+from itertools import count
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+# 3rd party
+from sqlitedict import SqliteDict
+
+# local
+from ncfacbot import locks, raid, shop, sm
+from ncfacbot.metrics import TimedTable, command_seconds
+from suite import (
+    CommandContext,
+    FakeBot,
+    FakeChannel,
+    FakeGuild,
+    FakeMember,
+    FakeMessage,
+)
+
+GUILD = 1000
+"""ID of the guild hammered by the single guild tests"""
+
+
+class NumberedMessage(FakeMessage):
+    ids = count(1)
+
+    def __init__(self):
+        self.id = next(self.ids)
+
+
+class SlowChannel(FakeChannel):
+    """
+    Channel whose sends yield to other commands, for up to twice the latency,
+    so that commands don't finish in the order they started
+    """
+
+    latency = 0.005
+    jitter = Random(1)
+
+    async def send(self, content: str | None = None, **kwargs):
+        await aio.sleep(self.jitter.uniform(0, 2 * self.latency))
+        await super().send(content, **kwargs)
+
+        return NumberedMessage()
+
+
+class Unlocked(locks.KeyedLocks):
+    """Locks which never hold anyone up"""
+
+    def __call__(self, key):
+        return aio.Lock()
+
+
+class StressBot(FakeBot):
+    def __init__(self, guilds: list[FakeGuild]):
+        super().__init__(guilds)
+        self.cogs = {}
+        self._before_invoke = None
+        self._after_invoke = None
+
+    async def add_cog(self, cog):
+        self.cogs[cog.qualified_name] = cog
+
+        # discord.py does this when injecting the cog
+        for c in cog.walk_commands():
+            c.cog = cog
+
+    def add_command(self, command):
+        pass
+
+    def add_listener(self, listener, name=None):
+        pass
+
+    def remove_listener(self, listener, name=None):
+        pass
+
+
+class Stress:
+    """Fake guilds, bot, and temporary storage shared by the tests"""
+
+    def __init__(self, folder: str, guilds: int):
+        self.folder = folder
+        self.guilds = [FakeGuild(GUILD + i) for i in range(guilds)]
+
+        for guild in self.guilds:
+            guild.channels = [SlowChannel(guild)]
+
+        self.bot = StressBot(self.guilds)
+        shop.Shop._lists = self._table("shop", "shopping_list")
+        sm.schedule = self._table("sm", "announce")
+        raid.Raid._schedules = self._table("raid", "schedule")
+        raid.Raid._attendance = self._table("raid", "rsvp")
+        self.shop = shop.Shop(self.bot)  # type: ignore
+
+    def _table(self, name: str, table: str) -> TimedTable:
+        """Helper function to open storage in the temporary folder"""
+
+        return TimedTable(
+            SqliteDict(
+                join(self.folder, f"{name}.sqlite3"),
+                tablename=table,
+                autocommit=True,
+            ),
+            f"{name}.{table}",
+        )
+
+    async def setup(self):
+        await raid.setup(self.bot)
+        await sm.setup(self.bot)  # type: ignore
+        self.raid = self.bot.cogs["raid"]
+
+    def ctx(self, user: int, guild: FakeGuild | None = None):
+        return CommandContext(
+            self.bot, guild or self.guilds[0], FakeMember(user)  # type: ignore
+        )
+
+    async def shop_set(self, users: int, ops: int) -> list[str]:
+        """Every user asks for one more of the same item, many times."""
+
+        await aio.gather(
+            *(
+                self.shop.set.callback(
+                    self.shop, self.ctx(u), "+1", item="fuel"  # type: ignore
+                )
+                for _ in range(ops)
+                for u in range(users)
+            )
+        )
+        lists = shop.Shop._lists.get(GUILD, {})
+        have = {
+            u: (
+                sum(lists[f"user{u}"].items.values())
+                if f"user{u}" in lists
+                else 0
+            )
+            for u in range(users)
+        }
+
+        return [f"user{u} has {n} fuel" for u, n in have.items() if n != ops]
+
+    async def sm_restart(self, users: int, ops: int) -> list[str]:
+        """
+        Every user restarts their countdown many times at once. Each restart
+        cancels the previous timer, so exactly one timer per user should be
+        left armed, and it should be the one that is tracked.
+        """
+
+        await aio.gather(
+            *(
+                sm.sm.callback(self.ctx(u), n + 1)
+                for n in range(ops)
+                for u in range(users)
+            )
+        )
+        alerts = getattr(self.bot, "sm_alerts").get(str(GUILD), {})
+        armed: dict[str, list[aio.TimerHandle]] = {}
+
+        for handle in aio.get_running_loop()._scheduled:  # type: ignore
+            if handle._callback is sm._done and not handle.cancelled():
+                armed.setdefault(handle._args[3], []).append(handle)
+
+        lost = []
+
+        for u in range(users):
+            user = f"user{u}"
+            handles = armed.get(user, [])
+            tracked = alerts.get(user, (None, None))[1]
+
+            if len(handles) != 1 or handles[0] is not tracked:
+                lost.append(f"{user} has {len(handles)} timers armed")
+
+            for handle in handles:
+                handle.cancel()
+
+        return lost
+
+    async def raid_shared(self, users: int) -> list[str]:
+        """
+        Every user sets the target of the same raid at once, then one more
+        makes it repeat. No command turns repeating off, so it must be left
+        on.
+        """
+
+        ctx = self.ctx(0)
+        await self.raid.schedule.callback(
+            self.raid, ctx, when="name=shared 2099-01-01 00:00"
+        )
+        await self.raid.target.callback(self.raid, ctx, target="name=shared X")
+        calls = [
+            self.raid.target.callback(
+                self.raid, self.ctx(u), target=f"name=shared T{u}"
+            )
+            for u in range(users)
+        ]
+        calls.append(
+            self.raid.repeat.callback(self.raid, ctx, rule="name=shared weekly")
+        )
+        await aio.gather(*calls)
+        stored = raid.Raid._schedules[raid.raid_key(GUILD, "shared")]
+
+        if stored.repeat != raid.WEEK:
+            return [f"raid shared repeats {stored.rule}"]
+
+        return []
+
+    async def hooks(self) -> list[str]:
+        """
+        Run the invoke hooks of every raid and SM command the way discord.py
+        does, checking that each one's latency was recorded.
+        """
+
+        failed = []
+
+        for cmd in (*self.raid.walk_commands(), sm.sm, sm.sm_all, sm.sm_board):
+            ctx = self.ctx(0)
+            ctx.command = cmd
+            ctx.command_failed = False
+            name = cmd.qualified_name
+            before = command_seconds.histogram(name).count
+
+            try:
+                await cmd.call_before_hooks(ctx)  # type: ignore
+                await cmd.call_after_hooks(ctx)  # type: ignore
+            except Exception as ex:
+                failed.append(f"{name}: {ex!r}")
+                continue
+
+            if command_seconds.histogram(name).count != before + 1:
+                failed.append(f"{name} was not timed")
+
+        return failed
+
+    async def parallel(self, ops: int) -> float:
+        """
+        Run the same burst in one guild, then in every guild at once.
+
+        :returns: How many times longer every guild took than one
+        """
+
+        async def burst(guild: FakeGuild):
+            ctx = self.ctx(0, guild)
+
+            for _ in range(ops):
+                await self.shop.set.callback(
+                    self.shop, ctx, "+1", item="fuel"  # type: ignore
+                )
+
+        start = perf_counter()
+        await aio.gather(*(burst(self.guilds[0]) for _ in range(4)))
+        one = perf_counter() - start
+        start = perf_counter()
+        await aio.gather(*(burst(g) for g in self.guilds for _ in range(4)))
+
+        return (perf_counter() - start) / one
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=10)
+    parser.add_argument("--guilds", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=SlowChannel.latency)
+    parser.add_argument(
+        "--unlocked", action="store_true", help="Run without the locks"
+    )
+    args = parser.parse_args()
+    SlowChannel.latency = args.latency
+
+    if args.unlocked:
+        locks.guild_locks = Unlocked()
+
+    async def run() -> bool:
+        stress = Stress(folder, args.guilds)
+        await stress.setup()
+        hooks = await stress.hooks()
+        ok = not hooks
+        print(f"{'invoke hooks':<24}{len(hooks):>6} failed")
+
+        for line in hooks[:5]:
+            print(f"    {line}")
+
+        for name, test in (
+            ("shop.set", stress.shop_set(args.users, args.ops)),
+            ("sm", stress.sm_restart(args.users, args.ops)),
+            ("raid.target/repeat", stress.raid_shared(args.users)),
+        ):
+            lost = await test
+            ok = ok and not lost
+            print(f"{name:<24}{len(lost):>6} lost updates")
+
+            for line in lost[:5]:
+                print(f"    {line}")
+
+        ratio = await stress.parallel(args.ops)
+        print(f"{args.guilds} guilds vs one{ratio:>15.2f}x time")
+        print(f"{'idle locks left':<24}{len(locks.guild_locks):>6}")
+        ok = ok and ratio < args.guilds / 2 and not len(locks.guild_locks)
+        await raid.teardown(stress.bot)
+        await sm.teardown(stress.bot)  # type: ignore
+
+        return ok
+
+    with TemporaryDirectory() as folder:
+        ok = aio.run(run())
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+Hot path benchmark suite
+
+Times the command and web handlers that do the most work, offline, against
+fake Discord objects and SqliteDict storage in a temporary folder. Results are
+compared with the baselines stored in ``baselines.json`` next to this file,
+and the run fails if anything is slower than its baseline by more than the
+tolerance. Baselines are only comparable on the same machine, so record new
+ones with ``--save`` before changing storage or parsing code.
+
+Run from the repository root with the development dependencies installed:
+
+    python benchmarks/suite.py [--save] [--tolerance 0.5] [-k safe]
+"""
+
+# stdlib
+from argparse import ArgumentParser
+import asyncio as aio
+import json
+from os.path import dirname, join, realpath
+import platform
+from random import Random
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+# 3rd party
+from aethersprite.common import FakeContext
+from aethersprite.settings import settings
+from discord.abc import GuildChannel
+from sqlitedict import SqliteDict
+
+# local
+from ncfacbot import get_next_tick, safe, shop, sm
+from ncfacbot.metrics import TimedTable
+from payloads import safe_items, safe_payload
+
+BASELINES = join(realpath(dirname(__file__)), "baselines.json")
+"""File holding the recorded baselines"""
+
+REPEAT = 5
+"""Number of timing runs per benchmark; the best is reported"""
+
+GUILD = 1000
+"""ID of the fake guild everything happens in"""
+
+KEY = "benchmark"
+"""UserScript key for the fake guild"""
+
+
+class FakeMessage:
+    async def add_reaction(self, emoji):
+        pass
+
+
+class FakeChannel(GuildChannel):
+    def __init__(self, guild: "FakeGuild"):
+        self.guild = guild
+        self.id = guild.id * 10
+        self.name = "general"
+        #: Number of messages sent
+        self.sent = 0
+
+    async def send(self, content: str | None = None, **kwargs):
+        self.sent += 1
+
+        return FakeMessage()
+
+
+class FakeGuild:
+    def __init__(self, id: int):
+        self.id = id
+        self.name = f"guild-{id}"
+        self.channels = [FakeChannel(self)]
+        self.roles = []
+
+
+class FakeMember:
+    def __init__(self, id: int):
+        self.id = id
+        self.name = f"user{id}"
+        self.display_name = f"User {id}"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeBot:
+    def __init__(self, guilds: list[FakeGuild]):
+        self.guilds = guilds
+        self.sm_alerts = {}
+        self.sm_index = {}
+        self.sm_boards = {}
+
+
+class CommandContext(FakeContext):
+    """Command context for a fake member in a fake guild"""
+
+    def __init__(self, bot: FakeBot, guild: FakeGuild, author: FakeMember):
+        super().__init__(guild=guild)
+        self.bot = bot
+        self.guild = guild
+        self.author = author
+        self.channel = guild.channels[0]
+        self.message = FakeMessage()
+
+    async def send(self, content: str | None = None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class Benchmark:
+    """A timed operation"""
+
+    def __init__(self, name: str, fn, ops: int = 1, flush=None):
+        #: The benchmark's name
+        self.name = name
+        #: Function or coroutine function doing the work for one run
+        self.fn = fn
+        #: Number of operations done by each call of :attr:`fn`
+        self.ops = ops
+        #: Function which waits for pending writes, timed with each run
+        self.flush = flush
+
+    def measure(self, loop: aio.AbstractEventLoop) -> float:
+        """
+        Time the benchmark.
+
+        :param loop: The event loop to run coroutines on
+        :returns: The best time per operation, in microseconds
+        """
+
+        best = float("inf")
+
+        for _ in range(REPEAT):
+            start = perf_counter()
+            result = self.fn()
+
+            if aio.iscoroutine(result):
+                loop.run_until_complete(result)
+
+            if self.flush is not None:
+                self.flush()
+
+            best = min(best, perf_counter() - start)
+
+        return best / self.ops * 1e6
+
+
+class Suite:
+    """Fake guild, bot, and temporary storage shared by the benchmarks"""
+
+    def __init__(self, folder: str, seed: int = 1):
+        self.folder = folder
+        self.random = Random(seed)
+        self.guild = FakeGuild(GUILD)
+        self.bot = FakeBot([self.guild])
+        safe.Safe._safe = self._table("safe", "contents")
+        safe.Safe._thresholds = self._table("safe", "threshold")
+        safe.Safe._levels = self._table("safe", "levels")
+        shop.Shop._lists = self._table("shop", "shopping_list")
+        sm.schedule = self._table("sm", "announce")
+        safe._settings()
+
+        for guild in (self.guild, {"id": str(GUILD)}):
+            settings["safe.key"].set(FakeContext(guild=guild), KEY)  # type: ignore
+
+        self.safe = safe.Safe(self.bot)  # type: ignore
+        self.shop = shop.Shop(self.bot)  # type: ignore
+        #: Storage used by the benchmarks
+        self.tables = (
+            safe.Safe._safe,
+            safe.Safe._levels,
+            shop.Shop._lists,
+            sm.schedule,
+        )
+
+    def _table(self, name: str, table: str) -> TimedTable:
+        """Helper function to open storage in the temporary folder"""
+
+        return TimedTable(
+            SqliteDict(
+                join(self.folder, f"{name}.sqlite3"),
+                tablename=table,
+                autocommit=True,
+            ),
+            f"{name}.{table}",
+        )
+
+    def flush(self):
+        """Wait for every pending write to be committed."""
+
+        for table in self.tables:
+            table.db.commit()
+
+    def ctx(self, user: int = 1) -> CommandContext:
+        return CommandContext(self.bot, self.guild, FakeMember(user))
+
+    def http_safe(self, items: int, structured: bool = False) -> Benchmark:
+        """Post safe contents with the given number of items."""
+
+        body = json.dumps(
+            safe_payload(str(GUILD), KEY, items, self.random, structured)
+        ).encode()
+
+        return Benchmark(
+            f"safe.http_post {items // 1000}k"
+            + (" structured" if structured else ""),
+            lambda: safe.http_safe(json.loads(body)),
+            flush=self.flush,
+        )
+
+    def http_safe_thresholds(self, items: int, watched: int) -> Benchmark:
+        """Post changing safe contents while items have thresholds."""
+
+        bodies = [
+            json.dumps(
+                safe_payload(str(GUILD), KEY, items, self.random, True)
+            ).encode()
+            for _ in range(2)
+        ]
+        names = {
+            i["name"].lower(): (i["name"], 20)
+            for i in json.loads(bodies[0])["items"]["Component"][:watched]
+        }
+        safe.Safe._thresholds[str(GUILD)] = names
+        turn = [0]
+
+        async def run():
+            turn[0] += 1
+            await safe.http_safe(json.loads(bodies[turn[0] % 2]))
+
+        return Benchmark(
+            f"safe.http_post {items // 1000}k thresholds",
+            run,
+            flush=self.flush,
+        )
+
+    def safe_get(self, items: int, ops: int = 10) -> Benchmark:
+        """List safe components, chunked into several messages."""
+
+        contents = safe_items(items * 2, self.random)
+        safe.Safe._safe[str(GUILD)] = {
+            "Components": contents["Component"],
+            "Potions": contents["Potion"],
+            "Spells": contents["Spell"],
+        }
+        self.flush()
+        ctx = self.ctx()
+
+        async def run():
+            for _ in range(ops):
+                await self.safe._get(ctx, "Components")  # type: ignore
+
+        return Benchmark(f"safe._get {items // 1000}k", run, ops)
+
+    def _shopping_lists(self, users: int):
+        """Helper function to fill the shopping lists for many users"""
+
+        names = list(shop.catalog.get().tags)
+        lists = {}
+
+        for i in range(users):
+            member = FakeMember(i)
+            lst = shop.ShoppingList(member.display_name, member.name)
+
+            for name in self.random.sample(names, 3):
+                lst.items[name.lower()] = self.random.randint(1, 10)
+
+            lists[member.name] = lst
+
+        shop.Shop._lists[GUILD] = lists
+        self.flush()
+
+    def shop_set(self, users: int, ops: int = 10) -> Benchmark:
+        """Adjust one user's request while many users have lists."""
+
+        self._shopping_lists(users)
+        ctx = self.ctx(users // 2)
+
+        async def run():
+            for _ in range(ops):
+                await self.shop.set.callback(
+                    self.shop, ctx, "+1", item="fuel"  # type: ignore
+                )
+
+        return Benchmark(
+            f"shop.set {users // 1000}k users", run, ops, self.flush
+        )
+
+    def shop_list_net(self, users: int) -> Benchmark:
+        """Total every user's requests."""
+
+        self._shopping_lists(users)
+        ctx = self.ctx()
+
+        return Benchmark(
+            f"shop.list net {users // 1000}k users",
+            lambda: self.shop.list.callback(
+                self.shop, ctx, "net"  # type: ignore
+            ),
+        )
+
+    def sm_churn(self, users: int) -> Benchmark:
+        """Start and then cancel a countdown for many users."""
+
+        contexts = [self.ctx(i) for i in range(users)]
+
+        async def run():
+            for ctx in contexts:
+                await sm.sm.callback(ctx, 10)  # type: ignore
+
+            for ctx in contexts:
+                await sm.sm.callback(ctx, 0)  # type: ignore
+
+        return Benchmark(f"sm start/cancel {users}", run, users * 2, self.flush)
+
+    def next_tick(self, ops: int = 10_000) -> Benchmark:
+        """Calculate the next tick."""
+
+        def run():
+            for _ in range(ops):
+                get_next_tick()
+
+        return Benchmark("get_next_tick", run, ops)
+
+    def benchmarks(self):
+        """
+        Prepare each benchmark in turn. Several share storage, so each must
+        be run before the next is prepared.
+
+        :returns: A generator of benchmarks
+        """
+
+        for items in (1000, 10_000, 50_000):
+            yield self.http_safe(items)
+
+        yield self.http_safe(50_000, structured=True)
+        yield self.http_safe_thresholds(50_000, 100)
+
+        for items in (1000, 10_000):
+            yield self.safe_get(items)
+
+        yield self.shop_set(10_000)
+        yield self.shop_list_net(10_000)
+        yield self.sm_churn(1000)
+        yield self.next_tick()
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--save", action="store_true", help="Record results as the baselines"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed slowdown over the baselines, as a fraction",
+    )
+    parser.add_argument(
+        "-k", dest="only", help="Only run benchmarks containing this text"
+    )
+    args = parser.parse_args()
+
+    try:
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+    except FileNotFoundError:
+        baselines = {"results": {}}
+
+    loop = aio.new_event_loop()
+    aio.set_event_loop(loop)
+    results = {}
+    regressions = []
+    print(f"{'benchmark':<28}{'per op':>14}{'baseline':>14}{'change':>9}")
+
+    with TemporaryDirectory() as folder:
+        for bench in Suite(folder).benchmarks():
+            if args.only and args.only not in bench.name:
+                continue
+
+            us = bench.measure(loop)
+            results[bench.name] = {"us_per_op": round(us, 3), "ops": bench.ops}
+            baseline = baselines["results"].get(bench.name)
+
+            if baseline is None:
+                print(f"{bench.name:<28}{us:>12.3f}us{'-':>14}{'-':>9}")
+
+                continue
+
+            change = us / baseline["us_per_op"] - 1
+            print(
+                f"{bench.name:<28}{us:>12.3f}us"
+                f"{baseline['us_per_op']:>12.3f}us{change:>+9.0%}"
+            )
+
+            if change > args.tolerance:
+                regressions.append(bench.name)
+
+    loop.close()
+
+    if args.save:
+        baselines = {
+            "machine": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "processor": platform.machine(),
+            },
+            "results": {**baselines["results"], **results},
+        }
+
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+        print(f"Saved baselines to {BASELINES}")
+
+        return
+
+    if regressions:
+        print(f"Slower than baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,17 @@
 
 # stdlib
 import calendar
-from datetime import datetime, timezone
+from datetime import datetime
 
-# 3rd party
-from aethersprite.common import FIFTEEN_MINS
+# local
+from . import tickmath
+
+#: Maximum length of a Discord message
+MAX_MESSAGE_LENGTH = 2000
+#: Markdown code block fence
+CODE_BLOCK = "```"
+#: Newline, for use in f-strings
+NEWLINE = "\n"
 
 
 def discord_timestamp(dt: datetime):
@@ -16,9 +23,10 @@ def discord_timestamp(dt: datetime):
     :returns: A formatted Discord timestamp string
     """
 
-    stamp = calendar.timegm(dt.timetuple())
+    if dt.tzinfo is None:
+        return tickmath.discord_stamp(calendar.timegm(dt.timetuple()))
 
-    return f"<t:{stamp}>"
+    return tickmath.discord_stamp(int(dt.timestamp()))
 
 
 def get_next_tick(n=1):
@@ -31,7 +39,61 @@ def get_next_tick(n=1):
     :rtype: datetime
     """
 
-    now = calendar.timegm(datetime.now(timezone.utc).timetuple())
-    tick_stamp = (now + (n * FIFTEEN_MINS)) - (now % FIFTEEN_MINS)
+    return tickmath.to_datetime(tickmath.next_tick(tickmath.now(), n))
+
+
+def render_table(rows, title="", limit=MAX_MESSAGE_LENGTH):
+    """
+    Render rows as a column-aligned code block, split across as few messages
+    as possible without breaking any rows apart.
+
+    Every column except the last is padded with leaders to the width of its
+    widest value.
+
+    :param rows: The rows to render; each is a sequence of column values
+    :type rows: Iterable[Sequence]
+    :param title: Text to show above the table in the first message
+    :type title: str
+    :param limit: The maximum length of each message
+    :type limit: int
+    :returns: The rendered messages
+    :rtype: list[str]
+    """
+
+    rows = [[str(c) for c in row] for row in rows]
+
+    if not rows:
+        return []
+
+    widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]) - 1)]
+    wrapper = len(CODE_BLOCK) * 2
+    messages = []
+    buffer = []
+    prefix = f"{title}{NEWLINE}" if title else ""
+    size = wrapper + len(prefix)
+
+    for row in rows:
+        line = "".join(
+            [f"{c.ljust(w, '.')}... " for c, w in zip(row, widths)] + [row[-1]]
+        )[: limit - wrapper]
+        added = len(line) + (1 if buffer else 0)
+
+        if buffer and size + added > limit:
+            messages.append(
+                f"{prefix}{CODE_BLOCK}{NEWLINE.join(buffer)}{CODE_BLOCK}"
+            )
+            buffer = []
+            prefix = ""
+            size = wrapper
+
+        if not buffer:
+            # the first row of the first message shares it with the title
+            line = line[: limit - size]
+            added = len(line)
+
+        buffer.append(line)
+        size += added
+
+    messages.append(f"{prefix}{CODE_BLOCK}{NEWLINE.join(buffer)}{CODE_BLOCK}")
 
-    return datetime.fromtimestamp(tick_stamp, tz=timezone.utc)
+    return messages
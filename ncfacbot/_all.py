@@ -1,8 +1,18 @@
 """Load all command extensions"""
 
+# stdlib
+from os import environ
+
+# api
+from aethersprite import config, log
+
 META_EXTENSION = True
 
 _mods = (
+    "backup",
+    "maintenance",
+    "memory",
+    "metrics",
     "raid",
     "safe",
     "shop",
@@ -12,11 +22,39 @@ _mods = (
 _package = __name__.replace("._all", "")
 
 
+def _enabled() -> tuple[str, ...]:
+    """
+    Helper function to get the extensions to load. They may be limited with
+    a list in the `[ncfacbot] extensions` configuration value, or with a
+    comma-separated `NCFACBOT_EXTENSIONS` environment variable.
+    """
+
+    wanted = config.get("ncfacbot", {}).get(
+        "extensions", environ.get("NCFACBOT_EXTENSIONS")
+    )
+
+    if wanted is None:
+        return _mods
+
+    if isinstance(wanted, str):
+        wanted = [w.strip() for w in wanted.split(",") if w.strip()]
+
+    for w in wanted:
+        if w not in _mods:
+            log.warning(f"Ignoring unknown extension: {w}")
+
+    # keep the load order
+    return tuple(m for m in _mods if m in wanted)
+
+
 async def setup(bot):
-    for m in _mods:
+    loaded = _enabled()
+    setattr(bot, "ncfacbot_extensions", loaded)
+
+    for m in loaded:
         await bot.load_extension(f"{_package}.{m}")
 
 
 async def teardown(bot):
-    for m in _mods:
+    for m in getattr(bot, "ncfacbot_extensions", _mods):
         await bot.unload_extension(f"{_package}.{m}")
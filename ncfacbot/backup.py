@@ -0,0 +1,580 @@
+"""
+Faction data export and import
+
+Raids and their RSVPs, SM countdowns and status boards, shopping lists, safe
+snapshots, thresholds, and levels, and tick reminders are written as
+newline-delimited JSON, one record per line, so that backups can be read by
+any version of the bot (or anything else). Records of kinds this version
+doesn't know are skipped on import. Each record looks like::
+
+    {"data": {...}, "guild": "1234", "key": "user", "kind": "sm", "v": 1}
+
+where `key` identifies the member (or, for raids, the raid name) a record
+belongs to, for the kinds which store several records per guild, and is null
+otherwise. Both directions stream one
+record at a time.
+
+Export and import from the command line with::
+
+    python -m ncfacbot.backup export [-o FILE] [--guild ID ...]
+    python -m ncfacbot.backup import FILE [--guild ID ...]
+
+Fully compact the database files, while the bot is stopped, with::
+
+    python -m ncfacbot.backup compact
+"""
+
+# stdlib
+from argparse import ArgumentParser
+import asyncio as aio
+from datetime import datetime, timezone
+import json
+from os import makedirs
+from os.path import getsize
+import sys
+from tempfile import NamedTemporaryFile
+import typing
+
+# 3rd party
+from discord import File
+from discord.ext.commands import Bot, command, Context, is_owner
+from sqlitedict import SqliteDict
+
+# api
+from aethersprite import data_folder, log
+
+# local
+from . import raid, safe, shards, shop, sm, tick
+from .metrics import instrument
+from .storage import LazyTable
+
+SCHEMA_VERSION = 1
+"""Version of the record format written by :func:`export`"""
+
+BATCH = 500
+"""Number of writes per transaction when importing"""
+
+UPLOAD_LIMIT = 8 * 1024 * 1024
+"""Largest export to upload to Discord, in bytes"""
+
+BACKUP_FOLDER = f"{data_folder}backups"
+"""Folder exports are written to by the export command"""
+
+
+class Kind:
+    """A kind of record, and the storage it lives in"""
+
+    def __init__(
+        self,
+        name: str,
+        table: typing.Callable[[], typing.MutableMapping],
+        key: type,
+        per_member: bool,
+        dump: typing.Callable[[typing.Any], dict],
+        load: typing.Callable[[dict], typing.Any],
+        split: typing.Callable[[typing.Any], tuple] | None = None,
+        join: (
+            typing.Callable[[typing.Any, str | None], typing.Any] | None
+        ) = None,
+    ):
+        #: The record kind
+        self.name = name
+        #: Function returning the table, so that it may be swapped out
+        self.table = table
+        #: Type of the table's guild keys
+        self.key = key
+        #: Whether each guild's value is a dict of records keyed by member
+        self.per_member = per_member
+        #: Function converting a stored value to JSON-compatible data
+        self.dump = dump
+        #: Function converting data back to a stored value
+        self.load = load
+        #: For kinds stored one row per record rather than one per guild,
+        #: function splitting a row's key into guild and record key
+        self.split = split
+        #: Function joining a guild and record key into a row's key
+        self.join = join
+
+
+def _dump_safe(contents: dict) -> dict:
+    """Helper function to export a safe snapshot"""
+
+    return {k.lower(): v for k, v in contents.items()}
+
+
+def _load_safe(data: dict) -> dict:
+    """Helper function to import a safe snapshot"""
+
+    return {k: list(data.get(k.lower(), [])) for k in safe.Safe._icons}
+
+
+def _dump_rsvp(rsvp: raid.Attendance) -> dict:
+    """Helper function to export a raid's RSVPs"""
+
+    return {"members": sorted(rsvp.members), "messages": list(rsvp.messages)}
+
+
+def _load_rsvp(data: dict) -> raid.Attendance:
+    """Helper function to import a raid's RSVPs"""
+
+    rsvp = raid.Attendance()
+    rsvp.members = {int(m) for m in data.get("members", ())}
+    rsvp.messages = [int(m) for m in data.get("messages", ())]
+
+    return rsvp
+
+
+def _dump_board(board: tuple[int, int]) -> dict:
+    """Helper function to export an SM status board"""
+
+    return {"channel": board[0], "message": board[1]}
+
+
+def _load_board(data: dict) -> tuple[int, int]:
+    """Helper function to import an SM status board"""
+
+    return (int(data["channel"]), int(data["message"]))
+
+
+def _dump_thresholds(thresholds: dict[str, tuple[str, int]]) -> dict:
+    """Helper function to export safe thresholds"""
+
+    return {k: {"name": name, "n": n} for k, (name, n) in thresholds.items()}
+
+
+def _load_thresholds(data: dict) -> dict[str, tuple[str, int]]:
+    """Helper function to import safe thresholds"""
+
+    return {k: (str(v["name"]), int(v["n"])) for k, v in data.items()}
+
+
+def _load_levels(data: dict) -> dict[str, dict[str, int]]:
+    """Helper function to import safe levels"""
+
+    return {
+        c: {k: int(n) for k, n in counts.items()} for c, counts in data.items()
+    }
+
+
+KINDS = (
+    Kind(
+        "raid",
+        lambda: raid.Raid._schedules,
+        int,
+        False,
+        raid.RaidSchedule.to_dict,
+        raid.RaidSchedule.from_dict,
+        raid.split_key,
+        raid.raid_key,
+    ),
+    Kind(
+        "rsvp",
+        lambda: raid.Raid._attendance,
+        int,
+        False,
+        _dump_rsvp,
+        _load_rsvp,
+        raid.split_key,
+        raid.raid_key,
+    ),
+    Kind("safe", lambda: safe.Safe._safe, str, False, _dump_safe, _load_safe),
+    Kind(
+        "safe_threshold",
+        lambda: safe.Safe._thresholds,
+        str,
+        False,
+        _dump_thresholds,
+        _load_thresholds,
+    ),
+    Kind(
+        "safe_levels",
+        lambda: safe.Safe._levels,
+        str,
+        False,
+        dict,
+        _load_levels,
+    ),
+    Kind(
+        "shop",
+        lambda: shop.Shop._lists,
+        int,
+        True,
+        shop.ShoppingList.to_dict,
+        shop.ShoppingList.from_dict,
+    ),
+    Kind(
+        "sm",
+        lambda: sm.schedule,
+        str,
+        True,
+        sm.SMSchedule.to_dict,
+        sm.SMSchedule.from_dict,
+    ),
+    Kind("sm_board", lambda: sm.boards, str, False, _dump_board, _load_board),
+    Kind(
+        "tick",
+        lambda: tick.reminders,
+        str,
+        True,
+        tick.TickReminder.to_dict,
+        tick.TickReminder.from_dict,
+    ),
+)
+"""Every kind of record, in export order"""
+
+_kinds = {k.name: k for k in KINDS}
+
+
+def _record(kind: Kind, guild, key: str | None, value) -> str:
+    """Helper function to encode a record as a line of JSON"""
+
+    return json.dumps(
+        {
+            "v": SCHEMA_VERSION,
+            "kind": kind.name,
+            "guild": str(guild),
+            "key": key,
+            "data": kind.dump(value),
+        },
+        sort_keys=True,
+    )
+
+
+def export(
+    guilds: typing.Collection[str] | None = None,
+) -> typing.Iterator[str]:
+    """
+    Export records, one guild's value at a time.
+
+    :param guilds: Only export these guild IDs
+    :returns: A generator of JSON records, without line endings
+    """
+
+    for kind in KINDS:
+        table = kind.table()
+
+        if kind.split is not None:
+            for row, value in table.items():
+                guild, key = kind.split(row)
+
+                if guilds is None or str(guild) in guilds:
+                    yield _record(kind, guild, key, value)
+
+            continue
+
+        if guilds is None:
+            values = table.items()
+        else:
+            keys = [kind.key(g) for g in guilds]
+            values = ((k, table[k]) for k in keys if k in table)
+
+        for guild, value in values:
+            if not kind.per_member:
+                yield _record(kind, guild, None, value)
+
+                continue
+
+            for key, member in value.items():
+                yield _record(kind, guild, str(key), member)
+
+
+def _writer(table: typing.MutableMapping) -> typing.MutableMapping:
+    """Helper function to open a table for writing in transactions"""
+
+    lazy = getattr(table, "db", None)
+
+    if isinstance(lazy, LazyTable):
+        return SqliteDict(
+            lazy.filename, tablename=lazy.tablename, journal_mode="WAL"
+        )
+
+    # not stored in SQLite; write straight through
+    return table
+
+
+def load(
+    lines: typing.Iterable[str],
+    guilds: typing.Collection[str] | None = None,
+    batch: int = BATCH,
+) -> tuple[dict[str, int], set[str]]:
+    """
+    Import records. Records replace any stored for the same guild (and
+    member, for the kinds stored per member), and others are left alone.
+    Records of unknown kinds are skipped with a warning.
+
+    Consecutive records for the same guild are merged before writing, and
+    writes are committed in batches.
+
+    :param lines: The JSON records
+    :param guilds: Only import records for these guild IDs
+    :param batch: The number of writes per transaction
+    :returns: The number of records imported for each kind, and the IDs of
+        the guilds they belonged to
+    """
+
+    counts = {k.name: 0 for k in KINDS}
+    skipped: dict[str, int] = {}
+    touched: set[str] = set()
+    writers: dict[str, typing.MutableMapping] = {}
+    writes = 0
+    group: tuple[Kind, typing.Any] | None = None
+    pending: dict = {}
+
+    def commit():
+        for w in writers.values():
+            if isinstance(w, SqliteDict):
+                w.commit()
+
+    def write(kind: Kind, key, value=None):
+        nonlocal writes
+
+        writer = writers.get(kind.name)
+
+        if writer is None:
+            writer = writers[kind.name] = _writer(kind.table())
+
+        if value is None:
+            if kind.per_member:
+                value = writer[key] if key in writer else {}
+                value.update(pending)
+            else:
+                value = pending[None]
+
+            pending.clear()
+
+        writer[key] = value
+        writes += 1
+
+        if writes % batch == 0:
+            commit()
+
+    def flush():
+        if group is None or not pending:
+            return
+
+        write(*group)
+
+    try:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+
+            if record.get("v") != SCHEMA_VERSION:
+                raise ValueError(
+                    f"Line {number}: unsupported version {record.get('v')}"
+                )
+
+            if record.get("kind") not in _kinds:
+                # written by a newer version; import what this one knows
+                name = str(record.get("kind"))
+                skipped[name] = skipped.get(name, 0) + 1
+
+                continue
+
+            if guilds is not None and record["guild"] not in guilds:
+                continue
+
+            kind = _kinds[record["kind"]]
+            key = kind.key(record["guild"])
+            counts[kind.name] += 1
+            touched.add(record["guild"])
+
+            if kind.join is not None:
+                # stored one row per record; nothing to merge
+                row = kind.join(key, record["key"])
+                write(kind, row, kind.load(record["data"]))
+
+                continue
+
+            if group != (kind, key):
+                flush()
+                group = (kind, key)
+
+            pending[record["key"]] = kind.load(record["data"])
+
+        flush()
+        commit()
+
+        for name, count in skipped.items():
+            log.warning(f"Skipped {count} records of unknown kind {name}")
+    finally:
+        for w in writers.values():
+            if isinstance(w, SqliteDict):
+                w.close()
+
+    return counts, touched
+
+
+def _export_file(path: str, guilds: typing.Collection[str] | None) -> int:
+    """Helper function to export to a file, returning the record count"""
+
+    count = 0
+
+    with open(path, "w", encoding="utf-8") as f:
+        for line in export(guilds):
+            f.write(line + "\n")
+            count += 1
+
+    return count
+
+
+def _load_file(
+    path: str, guilds: typing.Collection[str] | None
+) -> tuple[dict[str, int], set[str]]:
+    """Helper function to import from a file"""
+
+    with open(path, encoding="utf-8") as f:
+        return load(f, guilds)
+
+
+@command(name="backup.export")
+@is_owner()
+async def export_(ctx: Context, *guilds: int):
+    """
+    Export faction data as NDJSON
+
+    Exports raids and their RSVPs, SM countdowns and status boards, shopping lists, safe contents, thresholds, and levels, and tick reminders for this server, or for the servers whose IDs are provided. The export is sent to you by direct message if it is small enough, and otherwise left in the bot's data folder.
+    """
+
+    if not guilds and ctx.guild is None:
+        await ctx.send(":person_shrugging: Provide the IDs of the servers.")
+
+        return
+
+    wanted = {str(g) for g in guilds} if guilds else {str(ctx.guild.id)}
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    makedirs(BACKUP_FOLDER, exist_ok=True)
+    path = f"{BACKUP_FOLDER}/ncfacbot-{stamp}.ndjson"
+    loop = aio.get_running_loop()
+    count = await loop.run_in_executor(None, _export_file, path, wanted)
+    log.info(f"{ctx.author} exported {count} records to {path}")
+
+    # exports hold raid targets and safe contents, so they're never posted
+    # where others can read them
+    if getsize(path) > UPLOAD_LIMIT:
+        await ctx.author.send(
+            f":floppy_disk: Exported {count} records to `{path}`; too "
+            "large to upload."
+        )
+    else:
+        await ctx.author.send(
+            f":floppy_disk: Exported {count} records.",
+            file=File(path, f"ncfacbot-{stamp}.ndjson"),
+        )
+
+    if ctx.guild is not None:
+        await ctx.send(":floppy_disk: Export sent by direct message.")
+
+
+@command(name="backup.import")
+@is_owner()
+async def import_(ctx: Context, *guilds: int):
+    """
+    Import faction data from NDJSON
+
+    Attach a file made by backup.export. Records replace any stored for the same guild (and member), and timers are rescheduled. Provide one or more guild IDs to only import those guilds.
+    """
+
+    if not ctx.message.attachments:
+        await ctx.send(":person_shrugging: Attach an export to import.")
+
+        return
+
+    wanted = {str(g) for g in guilds} if guilds else None
+    loop = aio.get_running_loop()
+
+    with NamedTemporaryFile(suffix=".ndjson") as f:
+        await ctx.message.attachments[0].save(f.name)  # type: ignore
+
+        try:
+            counts, touched = await loop.run_in_executor(
+                None, _load_file, f.name, wanted
+            )
+        except (KeyError, TypeError, ValueError) as ex:
+            await ctx.send(f":thumbsdown: Import failed: {ex}")
+            log.error(f"{ctx.author} failed to import: {ex}")
+
+            return
+
+    for gid in touched:
+        guild = ctx.bot.get_guild(int(gid))
+
+        if guild is not None:
+            await shards.refresh(ctx.bot, guild)
+
+    summary = ", ".join(f"{v} {k}" for k, v in counts.items())
+    await ctx.send(f":inbox_tray: Imported {summary}.")
+    log.info(f"{ctx.author} imported {summary}")
+
+
+async def setup(bot: Bot):
+    for c in (export_, import_):
+        instrument(c)
+        bot.add_command(c)
+
+
+async def teardown(bot: Bot):
+    for c in (export_, import_):
+        bot.remove_command(c.name)
+
+
+def main():
+    parser = ArgumentParser(
+        description="Export, import, or compact faction data"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    out = commands.add_parser("export", help="Write records as NDJSON")
+    out.add_argument("-o", "--output", help="File to write; default stdout")
+    out.add_argument("--guild", action="append", help="Only this guild ID")
+    into = commands.add_parser("import", help="Read records from NDJSON")
+    into.add_argument("file", help="File to read; - for stdin")
+    into.add_argument("--guild", action="append", help="Only this guild ID")
+    into.add_argument("--batch", type=int, default=BATCH)
+    commands.add_parser(
+        "compact", help="Fully compact the databases; stop the bot first"
+    )
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        # imported here, since it is only needed by this command
+        from .maintenance import compact_all
+
+        reclaimed = compact_all(full=True)
+        print(
+            f"Reclaimed {sum(reclaimed.values())} bytes from "
+            f"{len(reclaimed)} files",
+            file=sys.stderr,
+        )
+
+        return
+
+    guilds = set(args.guild) if args.guild else None
+
+    if args.command == "export":
+        if args.output:
+            count = _export_file(args.output, guilds)
+        else:
+            count = 0
+
+            for line in export(guilds):
+                sys.stdout.write(line + "\n")
+                count += 1
+
+        print(f"Exported {count} records", file=sys.stderr)
+
+        return
+
+    if args.file == "-":
+        counts, _ = load(sys.stdin, guilds, args.batch)
+    else:
+        with open(args.file, encoding="utf-8") as f:
+            counts, _ = load(f, guilds, args.batch)
+
+    summary = ", ".join(f"{v} {k}" for k, v in counts.items())
+    print(f"Imported {summary}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Per-guild cache of resolved settings and role authorization
+
+Settings are resolved through their filters, and role checks walk the
+member's roles, on every command. Results are kept per guild until a setting
+changes in that guild, or a member's roles or the guild's roles or channels
+change, so hot paths can look them up as often as they like. Member role
+changes are only seen with the privileged members intent, so role check
+results also expire after a short time.
+"""
+
+# stdlib
+from inspect import isawaitable
+from time import monotonic
+import typing
+
+# 3rd party
+from discord.ext.commands import Bot, Context
+
+# api
+from aethersprite.authz import require_roles_from_setting
+from aethersprite.settings import settings
+
+AUTHZ_TTL = 60
+"""Seconds a role check result is kept"""
+
+AUTHZ_LIMIT = 1000
+"""Most role check results kept per guild; the oldest are dropped first"""
+
+_values: dict[str, dict[tuple, typing.Any]] = {}
+"""Resolved setting values by guild, keyed by (name, channel)"""
+
+_authz: dict[str, dict[tuple, tuple[bool, float]]] = {}
+"""Role check results and their expiry times by guild, keyed by (member,
+settings, channel)"""
+
+_watched: dict[str, object] = {}
+"""Setting instances whose changes are being watched, by name"""
+
+
+def _guild_key(guild) -> str | None:
+    """Helper function to normalize a guild or guild ID as a cache key"""
+
+    if guild is None:
+        return None
+
+    if isinstance(guild, dict):
+        return str(guild["id"])
+
+    return str(getattr(guild, "id", guild))
+
+
+def _channel_key(ctx) -> int | None:
+    """Helper function to get a context's channel ID, if it has one"""
+
+    return getattr(getattr(ctx, "channel", None), "id", None)
+
+
+def _watch(name: str):
+    """
+    Helper function to invalidate a guild's cache whenever a setting is
+    changed there. Settings are registered again when their extension is
+    reloaded, so new instances are wrapped and old values dropped.
+    """
+
+    setting = settings[name]
+
+    if _watched.get(name) is setting:
+        return
+
+    original = setting.set
+
+    def set(ctx, value, *args, **kwargs):
+        try:
+            return original(ctx, value, *args, **kwargs)
+        finally:
+            invalidate(ctx.guild)
+
+    setattr(setting, "set", set)
+    _watched[name] = setting
+
+    for values in _values.values():
+        for key in [k for k in values if k[0] == name]:
+            del values[key]
+
+
+def get(name: str, ctx: Context) -> typing.Any:
+    """
+    Get a setting's value, resolving it only if it isn't cached.
+
+    :param name: The setting name
+    :param ctx: The context to resolve the setting in
+    :returns: The setting's value
+    """
+
+    guild = _guild_key(ctx.guild)
+    _watch(name)
+
+    if guild is None:
+        return settings[name].get(ctx)
+
+    channel = (
+        _channel_key(ctx) if getattr(settings[name], "channel", False) else None
+    )
+    values = _values.setdefault(guild, {})
+    key = (name, channel)
+
+    try:
+        return values[key]
+    except KeyError:
+        value = values[key] = settings[name].get(ctx)
+
+        return value
+
+
+def authz(setting: str | tuple[str, ...]):
+    """
+    Get a command check which requires the roles in one or more settings,
+    as :func:`require_roles_from_setting` does, caching the result.
+
+    :param setting: The setting name(s) holding the allowed roles
+    :returns: The check function
+    """
+
+    names = (setting,) if isinstance(setting, str) else tuple(setting)
+
+    async def check(ctx: Context) -> bool:
+        guild = _guild_key(ctx.guild)
+
+        for name in names:
+            _watch(name)
+
+        if guild is None:
+            result = require_roles_from_setting(ctx, setting=setting)
+
+            return await result if isawaitable(result) else result
+
+        results = _authz.setdefault(guild, {})
+        key = (ctx.author.id, names, _channel_key(ctx))
+        now = monotonic()
+        cached = results.get(key)
+
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        result = require_roles_from_setting(ctx, setting=setting)
+        allowed = bool(await result if isawaitable(result) else result)
+        # move the result to the end, so the oldest are dropped first
+        results.pop(key, None)
+        results[key] = (allowed, now + AUTHZ_TTL)
+
+        while len(results) > AUTHZ_LIMIT:
+            del results[next(iter(results))]
+
+        return allowed
+
+    return check
+
+
+def invalidate(guild=None, member: int | None = None):
+    """
+    Drop cached results.
+
+    :param guild: The guild (or its ID) to drop results for; all guilds if
+        not provided
+    :param member: Only drop role check results for this member ID
+    """
+
+    key = _guild_key(guild)
+
+    if key is None:
+        _values.clear()
+        _authz.clear()
+
+        return
+
+    if member is None:
+        _values.pop(key, None)
+        _authz.pop(key, None)
+
+        return
+
+    results = _authz.get(key, {})
+
+    for k in [k for k in results if k[0] == member]:
+        del results[k]
+
+
+async def on_member_update(before, after):
+    if before.roles != after.roles:
+        invalidate(after.guild, after.id)
+
+
+async def on_guild_role_change(role):
+    invalidate(role.guild)
+
+
+async def on_guild_role_update(before, after):
+    invalidate(after.guild)
+
+
+async def on_guild_channel_change(channel):
+    invalidate(channel.guild)
+
+
+async def on_guild_channel_update(before, after):
+    invalidate(after.guild)
+
+
+_listeners = (
+    (on_member_update, "on_member_update"),
+    (on_guild_role_change, "on_guild_role_create"),
+    (on_guild_role_change, "on_guild_role_delete"),
+    (on_guild_role_update, "on_guild_role_update"),
+    (on_guild_channel_change, "on_guild_channel_create"),
+    (on_guild_channel_change, "on_guild_channel_delete"),
+    (on_guild_channel_update, "on_guild_channel_update"),
+)
+"""Events which invalidate the cache"""
+
+
+def watch(bot: Bot):
+    """
+    Listen for the events which invalidate the cache. Extensions using the
+    cache call this in their setup; only the first call has any effect.
+
+    :param bot: The bot instance
+    """
+
+    if getattr(bot, "__cache_watch__", False):
+        return
+
+    for listener, name in _listeners:
+        bot.add_listener(listener, name)
+
+    setattr(bot, "__cache_watch__", True)
@@ -0,0 +1,211 @@
+"""Component catalog shared by the shop and safe commands"""
+
+# stdlib
+from os import environ, stat
+from os.path import dirname, join, realpath
+import tomllib
+
+# api
+from aethersprite import config, data_folder, log
+
+CATALOG_VERSION = 1
+"""Highest catalog file format version this module understands"""
+
+CATALOG_PATH = config.get("ncfacbot", {}).get(
+    "components_catalog",
+    environ.get(
+        "COMPONENTS_CATALOG",
+        join(realpath(dirname(__file__)), "data", "components.toml"),
+    ),
+)
+"""Path to the base component catalog"""
+
+OVERRIDES_FOLDER = f"{data_folder}components"
+"""Folder holding per-guild catalog overrides, named `<guild id>.toml`"""
+
+
+def _mtime(path: str) -> float | None:
+    """Helper function to get a file's modification time, if it exists"""
+
+    try:
+        return stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _load(path: str) -> dict:
+    """Helper function to read and validate a catalog file"""
+
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+
+    version = data.get("version", CATALOG_VERSION)
+
+    if version > CATALOG_VERSION:
+        raise ValueError(f"Unsupported catalog version {version} in {path}")
+
+    return data
+
+
+class CatalogTables:
+    """Lookup tables precompiled from a component catalog"""
+
+    def __init__(self, entries: list[dict]):
+        #: Display names keyed by lowercase lookup key
+        self.lowered: dict[str, str] = {}
+        #: Lookup keys matching each substring of every lookup key
+        self.index: dict[str, tuple[str, ...]] = {}
+        #: Tags for each display name
+        self.tags: dict[str, frozenset[str]] = {}
+        #: Sorted display names for each tag
+        self.tagged: dict[str, tuple[str, ...]] = {}
+
+        for entry in entries:
+            name = entry["name"]
+            key = entry.get("key", name).lower()
+            self.lowered[key] = name
+            self.tags[name] = frozenset(entry.get("tags", ()))
+
+        self.lowered = dict(sorted(self.lowered.items()))
+        index: dict[str, list[str]] = {}
+        tagged: dict[str, list[str]] = {}
+
+        for key in self.lowered:
+            length = len(key)
+            seen = set()
+
+            for start in range(length):
+                for end in range(start + 1, length + 1):
+                    sub = key[start:end]
+
+                    if sub in seen:
+                        continue
+
+                    seen.add(sub)
+                    index.setdefault(sub, []).append(key)
+
+        for name, tags in sorted(self.tags.items()):
+            for tag in tags:
+                tagged.setdefault(tag, []).append(name)
+
+        self.index = {k: tuple(v) for k, v in index.items()}
+        self.tagged = {k: tuple(v) for k, v in sorted(tagged.items())}
+        #: Lowercase display names of all known components
+        self.names = frozenset(n.lower() for n in self.tags)
+
+    def match(self, query: str) -> tuple[str, ...]:
+        """
+        Find the lookup keys containing a substring.
+
+        :param query: The (partial) component name to search for
+        :returns: The lookup keys that match, in sorted order
+        """
+
+        query = query.lower()
+
+        if not query:
+            return tuple(self.lowered)
+
+        return self.index.get(query, ())
+
+    def is_component(self, name: str) -> bool:
+        """
+        Check whether a display name is a known component.
+
+        :param name: The display name to check
+        :returns: True if the name is in the catalog
+        """
+
+        return name.lower() in self.names
+
+
+class Catalog:
+    """Component catalog which reloads its source files when they change"""
+
+    def __init__(self, path: str, overrides: str):
+        #: Path to the base catalog file
+        self.path = path
+        #: Folder holding per-guild override files
+        self.overrides = overrides
+        self._base: tuple[float | None, list[dict]] | None = None
+        self._tables: dict[str | None, tuple[tuple, CatalogTables]] = {}
+
+    def _base_entries(self) -> tuple[float | None, list[dict]]:
+        """Get the base catalog entries, reloading them if necessary"""
+
+        mtime = _mtime(self.path)
+
+        if self._base is None or self._base[0] != mtime:
+            try:
+                entries = _load(self.path).get("component", [])
+            except (OSError, ValueError, tomllib.TOMLDecodeError) as ex:
+                # keep the last good entries until the file changes again
+                log.error(f"Unable to load catalog {self.path}: {ex}")
+                self._base = (mtime, self._base[1] if self._base else [])
+
+                return self._base
+
+            self._base = (mtime, entries)
+            log.info(f"Loaded {len(entries)} components from {self.path}")
+
+        return self._base
+
+    def _merge(self, entries: list[dict], path: str, guild: str) -> list[dict]:
+        """Apply a guild's override file to the base catalog entries"""
+
+        try:
+            data = _load(path)
+        except (OSError, ValueError, tomllib.TOMLDecodeError) as ex:
+            log.error(f"Unable to load catalog overrides {path}: {ex}")
+
+            return entries
+
+        exclude = {n.lower() for n in data.get("exclude", ())}
+        merged = {e["name"].lower(): e for e in entries}
+
+        for entry in data.get("component", ()):
+            merged[entry["name"].lower()] = entry
+
+        log.info(f"Applied catalog overrides for guild {guild}")
+
+        return [e for n, e in merged.items() if n not in exclude]
+
+    def get(self, guild: int | str | None = None) -> CatalogTables:
+        """
+        Get the lookup tables for a guild.
+
+        The source files are checked for modification on each call, so edits
+        to the base catalog or a guild's overrides take effect without a
+        restart.
+
+        :param guild: The guild ID whose overrides to apply, if any
+        :returns: The precompiled lookup tables
+        """
+
+        key = None if guild is None else str(guild)
+        base_mtime, entries = self._base_entries()
+        override = None if key is None else join(self.overrides, f"{key}.toml")
+        override_mtime = None if override is None else _mtime(override)
+        version = (base_mtime, override_mtime)
+        cached = self._tables.get(key)
+
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        if override_mtime is not None:
+            entries = self._merge(entries, override, key)  # type: ignore
+        elif key is not None:
+            # no overrides; share the base tables
+            tables = self.get()
+            self._tables[key] = (version, tables)
+
+            return tables
+
+        tables = CatalogTables(entries)
+        self._tables[key] = (version, tables)
+
+        return tables
+
+
+catalog = Catalog(CATALOG_PATH, OVERRIDES_FOLDER)
+"""Shared component catalog"""
@@ -0,0 +1,78 @@
+"""
+Per-guild locks for commands which read, change, and write back stored state
+
+Commands which load a guild's value, change it, and save it again across an
+`await` can lose each other's changes when they run at the same time in the
+same guild. Running them under their guild's lock serializes them, while
+other guilds carry on in parallel.
+"""
+
+# stdlib
+import asyncio as aio
+from functools import wraps
+import typing
+from weakref import WeakValueDictionary
+
+# 3rd party
+from discord.ext.commands import Cog
+
+
+class KeyedLocks:
+    """
+    Locks by key, created on first use. A lock is only referenced by the
+    coroutines holding or waiting for it, so it is dropped as soon as it is
+    idle, and the number of locks never exceeds the number in use.
+    """
+
+    def __init__(self):
+        self._locks: WeakValueDictionary[typing.Hashable, aio.Lock] = (
+            WeakValueDictionary()
+        )
+
+    def __call__(self, key: typing.Hashable) -> aio.Lock:
+        """
+        Get the lock for a key.
+
+        :param key: The key
+        :returns: The lock; hold a reference to it until it is released
+        """
+
+        lock = self._locks.get(key)
+
+        if lock is None:
+            lock = self._locks[key] = aio.Lock()
+
+        return lock
+
+    def __len__(self):
+        return len(self._locks)
+
+
+guild_locks = KeyedLocks()
+"""Locks shared by every extension, keyed by (namespace, guild ID)"""
+
+
+def serialized(namespace: str):
+    """
+    Decorator which runs a command's callback under its guild's lock, so
+    that commands in the same namespace and guild run one at a time. Apply
+    it beneath the command decorator.
+
+    :param namespace: Name shared by the commands which change the same
+        stored state; commands in other namespaces aren't held up
+    """
+
+    def decorator(fn: typing.Callable):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            ctx = args[1] if isinstance(args[0], Cog) else args[0]
+
+            if ctx.guild is None:
+                return await fn(*args, **kwargs)
+
+            async with guild_locks((namespace, ctx.guild.id)):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,467 @@
+"""
+Stale data pruning and database compaction
+
+Periodically deletes data for guilds the bot has left, expired raids, SM
+countdowns and tick reminders, and empty shopping lists, then releases the
+database files' free pages. Stale data is found and the files are compacted
+in a thread, off the event loop; each stale value is then pruned on the loop,
+under the same per-guild lock as the commands which change it.
+
+A full VACUUM rewrites a file while holding its lock, so it is only done
+offline, with ``ncfacbot-backup compact`` while the bot is stopped.
+"""
+
+# stdlib
+import asyncio as aio
+from datetime import datetime, timedelta, timezone
+from os import environ
+from os.path import getsize
+import sqlite3
+
+# 3rd party
+from discord.ext.commands import Bot, command, Context, is_owner
+
+# api
+from aethersprite import config, log
+
+# local
+from . import raid, render_table, safe, shards, shop, sm, tick
+from .locks import guild_locks
+from .metrics import instrument
+from .storage import LazyTable
+from .tickmath import tick_index
+
+INTERVAL = float(
+    config.get("ncfacbot", {}).get(
+        "maintenance_interval", environ.get("MAINTENANCE_INTERVAL", 24)
+    )
+)
+"""Hours between maintenance runs"""
+
+FIRST_DELAY = 600
+"""Seconds to wait after startup before the first run"""
+
+GRACE = timedelta(days=1)
+"""How long past due raids, countdowns, and reminders are kept"""
+
+
+def _guild(guild_of, key) -> int | None:
+    """Helper function to get the guild ID from a key, if it has one"""
+
+    try:
+        return guild_of(key)
+    except (TypeError, ValueError):
+        log.warning(f"Skipping key without a guild ID: {key!r}")
+
+        return None
+
+
+def _stale(table, keep_guild, prune_value, guild_of=int) -> list:
+    """
+    Helper function to find the keys of a table which have stale data.
+
+    :param table: The table, keyed by guild
+    :param keep_guild: Function returning False for guild IDs to delete
+    :param prune_value: Function taking a guild's value and returning it
+        with stale entries removed, None to delete it, and the number of
+        entries removed
+    :param guild_of: Function getting the guild ID from a key; keys it
+        can't get one from are skipped
+    :returns: The keys to prune
+    """
+
+    stale = []
+
+    for key in list(table.keys()):
+        guild = _guild(guild_of, key)
+
+        if guild is None:
+            continue
+
+        if not keep_guild(guild) or prune_value(table[key])[1]:
+            stale.append(key)
+
+    return stale
+
+
+async def _prune(
+    table, namespace, keys, keep_guild, prune_value, guild_of=int
+) -> int:
+    """
+    Helper function to prune keys of a table. Each value is read again and
+    written back under its guild's lock, so changes made since the keys were
+    found aren't lost.
+
+    :param table: The table, keyed by guild
+    :param namespace: The namespace of the locks of commands which change
+        the table
+    :param keys: The keys to prune, from :func:`_stale`
+    :param keep_guild: As :func:`_stale`
+    :param prune_value: As :func:`_stale`
+    :param guild_of: As :func:`_stale`
+    :returns: The number of entries removed
+    """
+
+    removed = 0
+
+    for key in keys:
+        guild = _guild(guild_of, key)
+
+        if guild is None:
+            continue
+
+        async with guild_locks((namespace, guild)):
+            if key not in table:
+                continue
+
+            if not keep_guild(guild):
+                del table[key]
+                removed += 1
+
+                continue
+
+            value, count = prune_value(table[key])
+
+            if count == 0:
+                continue
+
+            removed += count
+
+            if value is None:
+                del table[key]
+            else:
+                table[key] = value
+
+    return removed
+
+
+def _prune_members(value: dict, stale) -> tuple[dict | None, int]:
+    """Helper function to remove stale entries from a per-member dict"""
+
+    kept = {k: v for k, v in value.items() if not stale(v)}
+    removed = len(value) - len(kept)
+
+    if not kept:
+        return None, max(removed, 1)
+
+    return kept, removed
+
+
+def _tables(now: datetime) -> dict[str, tuple]:
+    """
+    Helper function to get the tables to prune.
+
+    :param now: The current time
+    :returns: The table, lock namespace, value pruning function, and guild ID
+        function, by name
+    """
+
+    def whole(stale):
+        return lambda value: (None, 1) if stale(value) else (value, 0)
+
+    def raid_guild(key):
+        return raid.split_key(key)[0]
+
+    expired = now - GRACE
+    tick_expired = tick_index(int(expired.timestamp()))
+
+    return {
+        "raid": (
+            raid.Raid._schedules,
+            "raid",
+            whole(
+                lambda r: r.schedule is not None
+                and r.schedule <= expired
+                and not r.repeat
+            ),
+            raid_guild,
+        ),
+        "rsvp": (
+            raid.Raid._attendance,
+            "raid",
+            whole(lambda a: False),
+            raid_guild,
+        ),
+        "safe": (safe.Safe._safe, "safe", whole(lambda s: False), int),
+        "safe_levels": (
+            safe.Safe._levels,
+            "safe",
+            whole(lambda l: False),
+            int,
+        ),
+        "safe_threshold": (
+            safe.Safe._thresholds,
+            "safe",
+            whole(lambda t: False),
+            int,
+        ),
+        "shop": (
+            shop.Shop._lists,
+            "shop",
+            lambda lists: _prune_members(lists, lambda l: not l.items),
+            int,
+        ),
+        "sm": (
+            sm.schedule,
+            "sm",
+            lambda scheds: _prune_members(
+                scheds, lambda s: s.schedule <= expired
+            ),
+            int,
+        ),
+        "sm_board": (sm.boards, "sm", whole(lambda b: False), int),
+        "tick": (
+            tick.reminders,
+            "tick",
+            lambda reminders: _prune_members(
+                reminders, lambda r: r.tick <= tick_expired
+            ),
+            int,
+        ),
+    }
+
+
+def _keeper(known: set[int], owns):
+    """
+    Helper function to build the function telling which guilds to keep.
+
+    :param known: IDs of the guilds the bot is in
+    :param owns: Function telling whether this process owns a guild ID; other
+        processes' guilds are never treated as left
+    """
+
+    def keep_guild(guild: int) -> bool:
+        return guild in known or not owns(guild)
+
+    return keep_guild
+
+
+def scan(known: set[int], owns, now: datetime) -> dict[str, list]:
+    """
+    Find stale data. This blocks, and should be run in a thread.
+
+    :param known: IDs of the guilds the bot is in
+    :param owns: Function telling whether this process owns a guild ID
+    :param now: The current time
+    :returns: The keys to prune in each table
+    """
+
+    keep_guild = _keeper(known, owns)
+
+    return {
+        name: _stale(table, keep_guild, prune_value, guild_of)
+        for name, (table, _, prune_value, guild_of) in _tables(now).items()
+    }
+
+
+async def prune(
+    stale: dict[str, list], known: set[int], owns, now: datetime
+) -> dict[str, int]:
+    """
+    Delete stale data found by :func:`scan`, on the event loop.
+
+    :param stale: The keys to prune in each table
+    :param known: IDs of the guilds the bot is in now
+    :param owns: Function telling whether this process owns a guild ID
+    :param now: The current time
+    :returns: The number of entries removed from each table
+    """
+
+    keep_guild = _keeper(known, owns)
+    removed = {}
+
+    for name, (table, namespace, prune_value, guild_of) in _tables(now).items():
+        removed[name] = await _prune(
+            table, namespace, stale[name], keep_guild, prune_value, guild_of
+        )
+
+    return removed
+
+
+def _size(filename: str) -> int:
+    """Helper function to get the size of a database and its log"""
+
+    total = 0
+
+    for path in (filename, f"{filename}-wal"):
+        try:
+            total += getsize(path)
+        except OSError:
+            pass
+
+    return total
+
+
+def compact(filename: str, full: bool = False):
+    """
+    Reclaim free pages in a database file.
+
+    Online, only the free pages of files in incremental auto-vacuum mode are
+    released, and the log is checkpointed without waiting for anyone. A full
+    compaction switches the file to incremental auto-vacuum, rewrites it with
+    VACUUM, and refreshes its query statistics; it holds the file's lock
+    throughout, so it should only be done while the bot is stopped.
+
+    :param filename: The database file
+    :param full: Whether to do a full compaction
+    """
+
+    conn = sqlite3.connect(filename, timeout=30, isolation_level=None)
+
+    try:
+        if full:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        else:
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    finally:
+        conn.close()
+
+
+def compact_all(full: bool = False) -> dict[str, int]:
+    """
+    Compact every database file. This blocks, and should be run in a thread.
+
+    :param full: Whether to do a full compaction; see :func:`compact`
+    :returns: The number of bytes reclaimed from each file
+    """
+
+    files = set()
+
+    for table in (
+        raid.Raid._schedules,
+        raid.Raid._attendance,
+        safe.Safe._safe,
+        safe.Safe._levels,
+        safe.Safe._thresholds,
+        shop.Shop._lists,
+        sm.schedule,
+        sm.boards,
+        tick.reminders,
+    ):
+        lazy = getattr(table, "db", None)
+
+        if isinstance(lazy, LazyTable) and lazy.is_open:
+            # wait for pending writes before measuring
+            lazy.db.commit()
+
+        if isinstance(lazy, LazyTable):
+            files.add(lazy.filename)
+
+    reclaimed = {}
+
+    for filename in sorted(files):
+        before = _size(filename)
+
+        if not before:
+            continue
+
+        try:
+            compact(filename, full)
+        except sqlite3.OperationalError as ex:
+            log.error(f"Unable to compact {filename}: {ex}")
+
+            continue
+
+        reclaimed[filename] = before - _size(filename)
+
+    return reclaimed
+
+
+async def maintain(bot: Bot) -> tuple[dict[str, int], dict[str, int]]:
+    """
+    Run maintenance. Stale data is found and the databases are compacted in
+    a thread, but stale data is deleted on the event loop, under the locks of
+    the commands which change it.
+
+    :param bot: The bot instance
+    :returns: The number of entries removed from each table, and the number
+        of bytes reclaimed from each file
+    """
+
+    def owns(gid: int) -> bool:
+        return shards.owns(bot, gid)
+
+    now = datetime.now(timezone.utc)
+    loop = aio.get_running_loop()
+    stale = await loop.run_in_executor(
+        None, scan, {g.id for g in bot.guilds}, owns, now
+    )
+    removed = await prune(stale, {g.id for g in bot.guilds}, owns, now)
+    reclaimed = await loop.run_in_executor(None, compact_all)
+    log.info(
+        f"Maintenance removed {sum(removed.values())} entries and reclaimed "
+        f"{sum(reclaimed.values())} bytes"
+    )
+
+    return removed, reclaimed
+
+
+async def _schedule(bot: Bot):
+    """Run maintenance every :data:`INTERVAL` hours."""
+
+    await aio.sleep(FIRST_DELAY)
+
+    while True:
+        try:
+            await maintain(bot)
+        except Exception:
+            log.exception("Maintenance failed")
+
+        await aio.sleep(INTERVAL * 3600)
+
+
+@command(name="maintenance")
+@is_owner()
+async def maintenance(ctx: Context):
+    """
+    Prune stale data and compact the databases now
+
+    Removes data for guilds the bot has left, raids (except repeating raids), SM countdowns, and tick reminders more than a day past due, and empty shopping lists, then releases the database files' free pages. Stop the bot and run ncfacbot-backup compact to fully compact them.
+    """
+
+    removed, reclaimed = await maintain(ctx.bot)
+    rows = [("table", "removed")] + sorted(removed.items())
+    rows += [("file", "bytes")] + [
+        (f.split("/")[-1], n) for f, n in sorted(reclaimed.items())
+    ]
+
+    for message in render_table(rows, ":broom: **Maintenance**"):
+        await ctx.send(message)
+
+    log.info(f"{ctx.author} ran maintenance")
+
+
+async def on_ready():
+    if getattr(bot, "maintenance_task", None) is None:
+        setattr(
+            bot,
+            "maintenance_task",
+            aio.get_running_loop().create_task(_schedule(bot)),
+        )
+
+
+bot: Bot
+
+
+async def setup(bot_: Bot):
+    global bot
+
+    bot = bot_
+    instrument(maintenance)
+    bot.add_command(maintenance)
+    bot.add_listener(on_ready)
+
+
+async def teardown(bot: Bot):
+    task = getattr(bot, "maintenance_task", None)
+
+    if task is not None:
+        task.cancel()
+        setattr(bot, "maintenance_task", None)
+
+    bot.remove_listener(on_ready)
+    bot.remove_command(maintenance.name)
@@ -0,0 +1,143 @@
+"""
+Memory footprint report
+
+Shows the process's resident memory, and how many entries and roughly how
+many bytes each of the bot's in-memory structures holds, so that growth as
+the bot joins guilds and users pile up timers and lists can be spotted.
+"""
+
+# stdlib
+import gc
+from mmap import PAGESIZE
+import sys
+import typing
+
+# 3rd party
+from discord.ext.commands import Bot, command, Context, is_owner
+
+# api
+from aethersprite import log
+
+# local
+from . import cache, raid, render_table
+from .locks import guild_locks
+from .metrics import instrument
+from .storage import slots
+
+_SEQUENCES = (list, tuple, set, frozenset)
+
+
+def rss() -> int | None:
+    """
+    Get the process's resident memory.
+
+    :returns: The size in bytes, or None where it can't be read
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    return pages * PAGESIZE
+
+
+def deep_size(obj: typing.Any, seen: set[int] | None = None) -> int:
+    """
+    Estimate the bytes held by a structure. Containers and this package's
+    objects are followed; anything else, such as timer handles and Discord
+    objects, is only counted itself.
+
+    :param obj: The structure
+    :param seen: IDs of objects already counted
+    :returns: The estimated size in bytes
+    """
+
+    if seen is None:
+        seen = set()
+
+    if id(obj) in seen:
+        return 0
+
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, _SEQUENCES):
+        for item in obj:
+            size += deep_size(item, seen)
+    elif type(obj).__module__.startswith(f"{__package__}."):
+        for name in slots(type(obj)):
+            size += deep_size(getattr(obj, name, None), seen)
+
+        if hasattr(obj, "__dict__"):
+            size += deep_size(vars(obj), seen)
+
+    return size
+
+
+def footprint(bot: Bot) -> list[tuple[str, int, int]]:
+    """
+    Measure the bot's in-memory structures.
+
+    :param bot: The bot instance
+    :returns: The name, number of entries, and estimated bytes of each
+    """
+
+    structures = {
+        "cache.values": cache._values,
+        "cache.authz": cache._authz,
+        "locks": dict(guild_locks._locks),
+        "raid.handles": raid.Raid._handles,
+        "raid.index": raid.Raid._index,
+        "raid.rsvps": raid.Raid._rsvps,
+        "raid.embeds": raid.Raid._embeds,
+        "raid.alarms": raid.Raid._alarms,
+        "sm.alerts": getattr(bot, "sm_alerts", {}),
+        "sm.index": getattr(bot, "sm_index", {}),
+        "sm.boards": getattr(bot, "sm_boards", {}),
+        "tick.reminders": getattr(bot, "tick_reminders", {}),
+    }
+
+    return [
+        (name, len(value), deep_size(value))
+        for name, value in structures.items()
+    ]
+
+
+@command(name="memory")
+@is_owner()
+async def memory(ctx: Context):
+    """
+    Show the bot's memory footprint
+
+    Shows resident memory, the number of objects tracked by the garbage collector, and the number of entries and estimated bytes held by each in-memory structure (timers, indexes, caches, and locks). Stored data is not counted, since it is read from disk as needed.
+    """
+
+    resident = rss()
+    rows = [
+        ("resident", "-" if resident is None else f"{resident // 1024} KiB"),
+        ("gc objects", len(gc.get_objects())),
+        ("structure", "entries/KiB"),
+    ]
+    rows += [
+        (name, f"{count}/{size / 1024:.1f}")
+        for name, count, size in footprint(ctx.bot)
+    ]
+
+    for message in render_table(rows, ":abacus: **Memory**"):
+        await ctx.send(message)
+
+    log.info(f"{ctx.author} checked memory")
+
+
+async def setup(bot: Bot):
+    instrument(memory)
+    bot.add_command(memory)
+
+
+async def teardown(bot: Bot):
+    bot.remove_command(memory.name)
@@ -0,0 +1,601 @@
+"""Command latency, error, and database time metrics"""
+
+# stdlib
+import asyncio as aio
+from bisect import bisect_left
+from collections import deque
+from collections.abc import MutableMapping
+from contextvars import ContextVar
+from functools import wraps
+from os import environ
+from time import perf_counter, time
+import typing
+
+# 3rd party
+from discord.ext.commands import Bot, Command, command, Context, is_owner
+
+# api
+from aethersprite import config, log
+
+# local
+from . import render_table
+
+if typing.TYPE_CHECKING:
+    from fastapi import FastAPI, Request
+
+BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+"""Upper bounds of histogram buckets, in seconds"""
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""Prometheus text exposition format content type"""
+
+QUANTILES = (0.5, 0.9, 0.99)
+"""Quantiles reported for sampled values"""
+
+SAMPLES = 1000
+"""Number of recent samples kept for calculating quantiles"""
+
+LAG_INTERVAL = 0.5
+"""Seconds between event loop lag samples"""
+
+LAG_WARNING = float(
+    config.get("ncfacbot", {}).get(
+        "loop_lag_warning", environ.get("LOOP_LAG_WARNING", 0.25)
+    )
+)
+"""Event loop lag, in seconds, above which a warning is logged"""
+
+_db_time: ContextVar[list[float] | None] = ContextVar("db_time", default=None)
+"""Database time accumulated by the current command, request, or callback"""
+
+
+class Histogram:
+    """Cumulative histogram of observed values"""
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS):
+        #: Upper bounds of the buckets
+        self.buckets = buckets
+        #: Number of observations in each bucket (not cumulative)
+        self.counts = [0] * (len(buckets) + 1)
+        #: Sum of all observations
+        self.sum = 0.0
+        #: Number of observations
+        self.count = 0
+
+    def observe(self, value: float):
+        """
+        Record an observation.
+
+        :param value: The observed value
+        """
+
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Samples:
+    """Recent observed values, for calculating quantiles"""
+
+    def __init__(self, size: int = SAMPLES):
+        #: The most recent observations
+        self.values: deque[float] = deque(maxlen=size)
+        #: Sum of all observations
+        self.sum = 0.0
+        #: Number of observations
+        self.count = 0
+
+    def observe(self, value: float):
+        """
+        Record an observation.
+
+        :param value: The observed value
+        """
+
+        self.values.append(value)
+        self.sum += value
+        self.count += 1
+
+    def quantiles(self) -> list[float]:
+        """
+        Calculate the quantiles of the recent observations.
+
+        :returns: The value at each of :data:`QUANTILES`, or an empty list if
+            nothing has been observed
+        """
+
+        ordered = sorted(self.values)
+        last = len(ordered) - 1
+
+        if last < 0:
+            return []
+
+        return [ordered[round(q * last)] for q in QUANTILES]
+
+
+class Family:
+    """A named metric with one series per label value"""
+
+    def __init__(self, name: str, help: str, kind: str, label: str):
+        #: The metric name
+        self.name = name
+        #: The metric description
+        self.help = help
+        #: The metric type; either "counter", "histogram", or "summary"
+        self.kind = kind
+        #: The name of the label distinguishing each series
+        self.label = label
+        #: The series, keyed by label value
+        self.series: dict[str, typing.Any] = {}
+
+    def histogram(self, value: str) -> Histogram:
+        """
+        Get the histogram for a label value.
+
+        :param value: The label value
+        :returns: The histogram, created if necessary
+        """
+
+        h = self.series.get(value)
+
+        if h is None:
+            h = self.series[value] = Histogram()
+
+        return h
+
+    def samples(self, value: str) -> Samples:
+        """
+        Get the samples for a label value.
+
+        :param value: The label value
+        :returns: The samples, created if necessary
+        """
+
+        samples = self.series.get(value)
+
+        if samples is None:
+            samples = self.series[value] = Samples()
+
+        return samples
+
+    def inc(self, value: str, amount: float = 1):
+        """
+        Increment the counter for a label value.
+
+        :param value: The label value
+        :param amount: The amount to add
+        """
+
+        self.series[value] = self.series.get(value, 0) + amount
+
+    def render(self) -> list[str]:
+        """
+        Render the metric in Prometheus text format.
+
+        :returns: The lines of output
+        """
+
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+        for value, series in sorted(self.series.items()):
+            label = f'{self.label}="{_escape(value)}"'
+
+            if self.kind == "counter":
+                lines.append(f"{self.name}{{{label}}} {series}")
+
+                continue
+
+            if self.kind == "summary":
+                for q, v in zip(QUANTILES, series.quantiles()):
+                    lines.append(f'{self.name}{{{label},quantile="{q}"}} {v}')
+
+                lines.append(f"{self.name}_sum{{{label}}} {series.sum}")
+                lines.append(f"{self.name}_count{{{label}}} {series.count}")
+
+                continue
+
+            total = 0
+
+            for bound, count in zip(series.buckets, series.counts):
+                total += count
+                lines.append(
+                    f'{self.name}_bucket{{{label},le="{bound}"}} {total}'
+                )
+
+            lines.append(
+                f'{self.name}_bucket{{{label},le="+Inf"}} {series.count}'
+            )
+            lines.append(f"{self.name}_sum{{{label}}} {series.sum}")
+            lines.append(f"{self.name}_count{{{label}}} {series.count}")
+
+        return lines
+
+
+command_seconds = Family(
+    "ncfacbot_command_seconds", "Command latency", "histogram", "command"
+)
+command_errors = Family(
+    "ncfacbot_command_errors_total", "Failed commands", "counter", "command"
+)
+command_db_seconds = Family(
+    "ncfacbot_command_db_seconds",
+    "Database time per command",
+    "histogram",
+    "command",
+)
+callback_seconds = Family(
+    "ncfacbot_callback_seconds",
+    "Timer callback latency",
+    "histogram",
+    "callback",
+)
+callback_errors = Family(
+    "ncfacbot_callback_errors_total",
+    "Failed timer callbacks",
+    "counter",
+    "callback",
+)
+http_seconds = Family(
+    "ncfacbot_http_seconds", "Web request latency", "histogram", "route"
+)
+http_errors = Family(
+    "ncfacbot_http_errors_total", "Failed web requests", "counter", "route"
+)
+http_db_seconds = Family(
+    "ncfacbot_http_db_seconds",
+    "Database time per web request",
+    "histogram",
+    "route",
+)
+db_seconds = Family(
+    "ncfacbot_db_seconds_total",
+    "Database time per table",
+    "counter",
+    "table",
+)
+broadcast_seconds = Family(
+    "ncfacbot_broadcast_seconds",
+    "Delivery latency of each guild's copy of a broadcast message",
+    "histogram",
+    "message",
+)
+broadcast_errors = Family(
+    "ncfacbot_broadcast_errors_total",
+    "Failed deliveries of broadcast messages",
+    "counter",
+    "message",
+)
+
+loop_lag = Family(
+    "ncfacbot_loop_lag_seconds", "Event loop lag", "summary", "loop"
+)
+timer_lateness = Family(
+    "ncfacbot_timer_lateness_seconds",
+    "Delay between when a timer was scheduled to fire and when it fired",
+    "summary",
+    "timer",
+)
+
+families = [
+    command_seconds,
+    command_errors,
+    command_db_seconds,
+    callback_seconds,
+    callback_errors,
+    http_seconds,
+    http_errors,
+    http_db_seconds,
+    db_seconds,
+    broadcast_seconds,
+    broadcast_errors,
+    loop_lag,
+    timer_lateness,
+]
+"""Every metric served by the metrics route"""
+
+
+def _escape(value: str) -> str:
+    """Helper function to escape a label value"""
+
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _db_elapsed(table: str, start: float):
+    """Helper function to record database time"""
+
+    elapsed = perf_counter() - start
+    db_seconds.inc(table, elapsed)
+    acc = _db_time.get()
+
+    if acc is not None:
+        acc[0] += elapsed
+
+
+class TimedTable(MutableMapping):
+    """Mapping wrapper which records the time spent accessing a database"""
+
+    def __init__(self, db: MutableMapping, name: str):
+        #: The wrapped mapping
+        self.db = db
+        #: The table name used for reporting
+        self.name = name
+
+    def __getitem__(self, key):
+        start = perf_counter()
+
+        try:
+            return self.db[key]
+        finally:
+            _db_elapsed(self.name, start)
+
+    def __setitem__(self, key, value):
+        start = perf_counter()
+
+        try:
+            self.db[key] = value
+        finally:
+            _db_elapsed(self.name, start)
+
+    def __delitem__(self, key):
+        start = perf_counter()
+
+        try:
+            del self.db[key]
+        finally:
+            _db_elapsed(self.name, start)
+
+    def __contains__(self, key):
+        start = perf_counter()
+
+        try:
+            return key in self.db
+        finally:
+            _db_elapsed(self.name, start)
+
+    def __len__(self):
+        start = perf_counter()
+
+        try:
+            return len(self.db)
+        finally:
+            _db_elapsed(self.name, start)
+
+    def __iter__(self):
+        return self._timed(iter(self.db))
+
+    def items(self):
+        return self._timed(iter(self.db.items()))
+
+    def keys(self):
+        return self._timed(iter(self.db.keys()))
+
+    def values(self):
+        return self._timed(iter(self.db.values()))
+
+    def _timed(self, it: typing.Iterator):
+        """Time each step of an iterator."""
+
+        while True:
+            start = perf_counter()
+
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                _db_elapsed(self.name, start)
+
+            yield item
+
+
+async def _before(*args):
+    """
+    Command pre-invoke hook; start timing. Hooks of commands in a cog are
+    passed the cog before the context.
+    """
+
+    ctx: Context = args[-1]
+    setattr(ctx, "_metrics_start", perf_counter())
+    _db_time.set([0.0])
+
+
+async def _after(*args):
+    """
+    Command post-invoke hook; record timing. Hooks of commands in a cog are
+    passed the cog before the context.
+    """
+
+    ctx: Context = args[-1]
+    assert ctx.command
+    start = getattr(ctx, "_metrics_start", None)
+
+    if start is None:
+        return
+
+    name = ctx.command.qualified_name
+    command_seconds.histogram(name).observe(perf_counter() - start)
+    acc = _db_time.get()
+
+    if acc is not None:
+        command_db_seconds.histogram(name).observe(acc[0])
+
+    if ctx.command_failed:
+        command_errors.inc(name)
+
+
+def instrument(cmd: Command):
+    """
+    Record latency, errors, and database time for a command.
+
+    :param cmd: The command to instrument
+    """
+
+    cmd.before_invoke(_before)
+    cmd.after_invoke(_after)
+
+
+def timed(name: str):
+    """
+    Decorator which records latency, errors, and database time for a timer
+    callback.
+
+    :param name: The callback name used for reporting
+    """
+
+    def decorator(fn: typing.Callable):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _db_time.set([0.0])
+            start = perf_counter()
+
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                callback_errors.inc(name)
+
+                raise
+            finally:
+                callback_seconds.histogram(name).observe(perf_counter() - start)
+                _db_time.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+def record_lateness(name: str, scheduled: float):
+    """
+    Record how late a timer fired.
+
+    :param name: The timer name used for reporting
+    :param scheduled: The UNIX timestamp the timer was scheduled for
+    """
+
+    lateness = time() - scheduled
+    timer_lateness.samples(name).observe(lateness)
+
+    if lateness > LAG_WARNING:
+        log.warning(f"Timer {name} fired {lateness:.3f}s late")
+
+
+async def _watchdog():
+    """Sample event loop lag until canceled"""
+
+    loop = aio.get_running_loop()
+    samples = loop_lag.samples("main")
+
+    while True:
+        expected = loop.time() + LAG_INTERVAL
+        await aio.sleep(LAG_INTERVAL)
+        lag = max(0.0, loop.time() - expected)
+        samples.observe(lag)
+
+        if lag > LAG_WARNING:
+            log.warning(f"Event loop lag of {lag:.3f}s")
+
+
+def render() -> str:
+    """
+    Render all metrics in Prometheus text format.
+
+    :returns: The metrics
+    """
+
+    lines = []
+
+    for family in families:
+        lines += family.render()
+
+    return "\n".join(lines) + "\n"
+
+
+async def http_metrics():
+    """Serve metrics in Prometheus text format"""
+
+    from fastapi.responses import PlainTextResponse
+
+    return PlainTextResponse(render(), media_type=CONTENT_TYPE)
+
+
+async def _middleware(request: "Request", call_next):
+    """Web request timing middleware"""
+
+    acc = [0.0]
+    token = _db_time.set(acc)
+    start = perf_counter()
+    failed = True
+
+    try:
+        response = await call_next(request)
+        failed = response.status_code >= 500
+    finally:
+        # label by route template rather than path to keep cardinality low
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        http_seconds.histogram(route).observe(perf_counter() - start)
+        http_db_seconds.histogram(route).observe(acc[0])
+        _db_time.reset(token)
+
+        if failed:
+            http_errors.inc(route)
+
+    return response
+
+
+@command(name="perf")
+@is_owner()
+async def perf(ctx: Context):
+    """
+    Show event loop lag and timer lateness
+
+    Shows the 50th, 90th, and 99th percentile of recent samples, in milliseconds.
+    """
+
+    rows = [("series", "p50/p90/p99 ms", "count")]
+
+    for family in (loop_lag, timer_lateness):
+        for name, samples in sorted(family.series.items()):
+            ms = "/".join(f"{q * 1000:.1f}" for q in samples.quantiles())
+            rows.append((name, ms or "-", samples.count))
+
+    for message in render_table(rows, ":stopwatch: **Performance**"):
+        await ctx.send(message)
+
+    log.info(f"{ctx.author} checked performance")
+
+
+async def setup(bot: Bot):
+    # commands are instrumented by their own extensions; this extension
+    # watches the event loop and serves the metrics route
+    setattr(
+        bot, "loop_watchdog", aio.get_running_loop().create_task(_watchdog())
+    )
+    instrument(perf)
+    bot.add_command(perf)
+
+
+async def teardown(bot: Bot):
+    getattr(bot, "loop_watchdog").cancel()
+
+
+def setup_webapp(app: "FastAPI", _):
+    """Web application setup"""
+
+    app.middleware("http")(_middleware)
+    app.add_api_route("/metrics", http_metrics, methods=["GET"])
@@ -2,61 +2,305 @@
 
 # stdlib
 import asyncio as aio
+from bisect import bisect_left, insort
 from datetime import datetime, timedelta, timezone
-from functools import partial
 import math
+import re
 import time
+from time import perf_counter
 
 # 3rd party
-from discord import Embed
+from discord import AllowedMentions, Embed, Guild
 from discord.abc import GuildChannel
 from discord.colour import Colour
 from discord.ext.commands import check, Cog, command, Context
-from sqlitedict import SqliteDict
 
 # api
-from aethersprite import data_folder, log
-from aethersprite.authz import channel_only, require_roles_from_setting
-from aethersprite.common import FakeContext, seconds_to_str
+from aethersprite import log
+from aethersprite.authz import channel_only
+from aethersprite.common import FakeContext, FIFTEEN_MINS, seconds_to_str
 from aethersprite.emotes import THUMBS_DOWN
 from aethersprite.filters import ChannelFilter, RoleFilter
 from aethersprite.settings import register, settings
 
 # local
-from . import discord_timestamp
+from . import cache, discord_timestamp, shards, tickmath
+from .locks import guild_locks, serialized
+from .metrics import (
+    broadcast_errors,
+    broadcast_seconds,
+    instrument,
+    record_lateness,
+    timed,
+)
+from .storage import Record, table
 
 #: Expected format for schedule input
 INPUT_FORMAT = "%Y-%m-%d %H:%M %z"
 #: No raid message
 MSG_NO_RAID = ":person_shrugging: There is no scheduled raid."
+#: Name of the raid when none is given
+DEFAULT_NAME = "raid"
+#: Raid name prefix on target/schedule input, e.g. "name=alpha 23:45"
+NAME_PREFIX = re.compile(r"^name=([a-z][\w-]{0,31})\s+(.+)$", re.I | re.S)
+#: Most raids listed by the check command
+MAX_LISTED = 25
+#: Seconds in a week, for weekly raids
+WEEK = 7 * 24 * 3600
+#: Tick interval input for repeating raids, e.g. "every 96 ticks"
+TICKS_RULE = re.compile(r"^(?:every\s+)?(\d+)\s+ticks?$", re.I)
+#: Reaction members add to a raid's embed to attend
+RSVP = "\N{WHITE HEAVY CHECK MARK}"
+#: Seconds between saving changed RSVPs
+RSVP_FLUSH = 60
+#: Most embeds per raid whose reactions are counted
+RSVP_MESSAGES = 10
+#: Most guilds a raid message is delivered to at once
+BROADCAST_LIMIT = 8
+#: Default seconds during which repeated raid alarms are folded together
+ALARM_WINDOW = 120
+#: Most reporters listed on a raid alarm
+ALARM_REPORTERS = 20
 
 # authz decorators
-authz_schedule = partial(require_roles_from_setting, setting="raid.scheduleroles")
-authz_check = partial(
-    require_roles_from_setting, setting=("raid.scheduleroles", "raid.checkroles")
-)
+authz_schedule = cache.authz("raid.scheduleroles")
+authz_check = cache.authz(("raid.scheduleroles", "raid.checkroles"))
+
+
+def raid_key(guild: int | str, name: str | None = None) -> str:
+    """
+    Get the storage key of a raid.
+
+    :param guild: The guild ID
+    :param name: The raid name
+    :returns: The key
+    """
+
+    return f"{guild}:{name or DEFAULT_NAME}"
+
+
+def split_key(key) -> tuple[int, str]:
+    """
+    Get the guild ID and raid name from a storage key. Keys stored before
+    raids were named are only the guild ID.
+
+    :param key: The key
+    :returns: The guild ID and raid name
+    """
+
+    guild, _, name = str(key).partition(":")
+
+    return int(guild), name or DEFAULT_NAME
+
+
+def _named(text: str) -> tuple[str, str]:
+    """Helper function to split an optional raid name prefix from input"""
+
+    match = NAME_PREFIX.match(text.strip())
+
+    if match is None:
+        return DEFAULT_NAME, text
+
+    return match[1].lower(), match[2]
 
 
-class RaidSchedule:
+def _name_only(text: str) -> str:
+    """Helper function to get a raid name given on its own, as name=<name>"""
+
+    text = text.strip()
+
+    if text[:5].lower() == "name=":
+        text = text[5:]
+
+    return text.lower()
+
+
+def _ally_ids(guild: Guild) -> set[int]:
+    """Helper function to get the IDs of the guilds a guild lists as allies"""
+
+    allies = cache.get("raid.allies", FakeContext(guild=guild))
+
+    if not allies:
+        return set()
+
+    return {int(i) for i in str(allies).split(",") if i.strip().isdigit()}
+
+
+class RaidSchedule(Record):
     "Raid schedule; tracks target, time, leader, and channel"
 
-    #: Time of the raid
-    schedule: datetime | None = None
-    #: The target to raid
-    target: str | None = None
+    __slots__ = (
+        "guild",
+        "name",
+        "leader",
+        "channel",
+        "schedule",
+        "target",
+        "repeat",
+    )
+
+    defaults = {
+        "name": DEFAULT_NAME,
+        "schedule": None,
+        "target": None,
+        "repeat": None,
+    }
 
-    def __init__(self, guild: int, leader: str, channel: int):
+    def __init__(
+        self, guild: int, leader: str, channel: str, name: str = DEFAULT_NAME
+    ):
         #: The guild that owns the raid
         self.guild = guild
+        #: The raid's name, unique within its guild
+        self.name = name
         #: Who set the target/schedule
         self.leader = leader
         #: Channel where the last manipulation was done
         self.channel = channel
+        #: Time of the raid
+        self.schedule: datetime | None = None
+        #: The target to raid
+        self.target: str | None = None
+        #: Seconds between occurrences of a repeating raid
+        self.repeat: int | None = None
 
     def __repr__(self):
         return (
-            f'<RaidSchedule guild={self.guild} target="{self.target}" '
-            f"schedule={self.schedule}>"
+            f'<RaidSchedule guild={self.guild} name="{self.name}" '
+            f'target="{self.target}" schedule={self.schedule}>'
+        )
+
+    @property
+    def title(self) -> str | None:
+        """The target, and the raid's name if it has one"""
+
+        if self.name == DEFAULT_NAME:
+            return self.target
+
+        return f"{self.target} ({self.name})"
+
+    @property
+    def rule(self) -> str | None:
+        """Description of how the raid repeats, if it does"""
+
+        if not self.repeat:
+            return None
+
+        if self.repeat == WEEK:
+            return "weekly"
+
+        return f"every {self.repeat // FIFTEEN_MINS} ticks"
+
+    def next_occurrence(self, after: datetime) -> datetime:
+        """
+        Get the first occurrence of a repeating raid after a given time,
+        without expanding the ones in between.
+
+        :param after: The time to start from
+        :returns: The time of the occurrence
+        """
+
+        assert self.schedule and self.repeat
+
+        if after < self.schedule:
+            return self.schedule
+
+        passed = (after - self.schedule).total_seconds() // self.repeat
+
+        return self.schedule + timedelta(seconds=(passed + 1) * self.repeat)
+
+    def to_dict(self) -> dict:
+        """
+        Get the schedule as a dict of JSON-compatible values.
+
+        :returns: The schedule's fields keyed by name
+        """
+
+        return {
+            "guild": str(self.guild),
+            "name": self.name,
+            "leader": self.leader,
+            "channel": self.channel,
+            "target": self.target,
+            "schedule": self.schedule.isoformat() if self.schedule else None,
+            "repeat": self.repeat,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RaidSchedule":
+        """
+        Create a schedule from a dict made by :meth:`to_dict`.
+
+        :param data: The schedule's fields keyed by name
+        :returns: The schedule
+        """
+
+        raid = cls(
+            int(data["guild"]),
+            data["leader"],
+            data["channel"],
+            data.get("name") or DEFAULT_NAME,
+        )
+        raid.target = data.get("target")
+        raid.repeat = data.get("repeat")
+
+        if data.get("schedule"):
+            raid.schedule = datetime.fromisoformat(data["schedule"])
+
+        return raid
+
+
+class Attendance(Record):
+    "Members attending a raid, and the embeds they react to"
+
+    __slots__ = ("members", "messages")
+
+    def __init__(self):
+        #: IDs of members who have RSVPed
+        self.members: set[int] = set()
+        #: IDs of the raid's embeds, oldest first
+        self.messages: list[int] = []
+
+    def __repr__(self):
+        return (
+            f"<Attendance members={len(self.members)} "
+            f"messages={len(self.messages)}>"
+        )
+
+
+class Alarm:
+    "A raid alarm message, and the reports folded into it"
+
+    __slots__ = ("message", "at", "reporters", "count", "editing")
+
+    def __init__(self, message, at: float, reporter: str):
+        #: The alarm message
+        self.message = message
+        #: When the alarm was sent
+        self.at = at
+        #: Who reported the raid, in order, without duplicates
+        self.reporters: dict[str, None] = {reporter: None}
+        #: How many times the raid was reported
+        self.count = 1
+        #: Whether an edit of the message is in flight
+        self.editing = False
+
+    def __str__(self):
+        bumper = ":rotating_light:" * 3
+        text = " ".join((bumper, "@everyone We are being raided!", bumper))
+        text = f"**{text}**"
+
+        if self.count == 1:
+            return text
+
+        reporters = list(self.reporters)[:ALARM_REPORTERS]
+
+        if len(self.reporters) > ALARM_REPORTERS:
+            reporters.append(f"{len(self.reporters) - ALARM_REPORTERS} more")
+
+        return (
+            f"{text}\n:loudspeaker: Reported {self.count} times by "
+            f"{', '.join(reporters)}"
         )
 
 
@@ -66,32 +310,359 @@ class Raid(Cog, name="raid"):
     Raid commands
 
     NOTE: A raid will not actually be scheduled until both a schedule AND a target have been set. Until then, check and cancel commands will get a "There is no scheduled raid" message.
+
+    Several raids may be scheduled at once by giving each a name, e.g. "!raid.target name=alpha Some Castle" and "!raid.schedule name=alpha 23:45"; the same name=alpha picks the raid for raid.check, raid.cancel, and raid.repeat. Raids set without a name share the name "raid". Raids may repeat weekly or every so many ticks; see raid.repeat.
+
+    React to a raid's embed to attend; once anyone has, reminders mention only those attending.
+
+    Servers which list each other's IDs in raid.allies share raids: reminders and announcements are also sent to each ally's raid.channel, without pinging anyone there.
     """
 
-    _schedules = SqliteDict(
-        f"{data_folder}raid.sqlite3", tablename="schedule", autocommit=True
-    )
+    #: Raids, keyed by guild ID and raid name (see :func:`raid_key`)
+    _schedules = table("raid", "schedule")
+    #: Timer handles of scheduled raids, keyed by (guild ID, raid name)
     _handles = {}
+    #: Scheduled raids' (timestamp, name) by guild ID, in time order
+    _index: dict[int, list[tuple[float, str]]] = {}
+    #: Timestamp each raid is indexed at, keyed by (guild ID, raid name)
+    _at: dict[tuple[int, str], float] = {}
+    #: Saved RSVPs, keyed like :attr:`_schedules`
+    _attendance = table("raid", "rsvp")
+    #: RSVPs of loaded raids, keyed by (guild ID, raid name)
+    _rsvps: dict[tuple[int, str], Attendance] = {}
+    #: The raid each embed belongs to, keyed by message ID
+    _embeds: dict[int, tuple[int, str]] = {}
+    #: Raids whose RSVPs have changed since they were last saved
+    _dirty: set[tuple[int, str]] = set()
+    #: Timer handle of the next save, if one is pending
+    _flusher: aio.TimerHandle | None = None
+    #: The most recent raid alarm, by guild ID
+    _alarms: dict[int, Alarm] = {}
 
     def __init__(self, bot):
         self.bot = bot
 
-    def _reset(self, guild: int):
+    def cog_unload(self):
+        shards.unhandoff(self.bot, self.adopt)
+        self._flush()
+
+    def _rsvp(self, guild: int, name: str) -> Attendance:
+        "Get a raid's RSVPs, loading them if necessary"
+
+        key = (guild, name)
+
+        if key not in self._rsvps:
+            row = raid_key(guild, name)
+            rsvp = (
+                self._attendance[row]
+                if row in self._attendance
+                else Attendance()
+            )
+            self._rsvps[key] = rsvp
+
+            for message in rsvp.messages:
+                self._embeds[message] = key
+
+        return self._rsvps[key]
+
+    def _touch(self, key: tuple[int, str]):
+        "Mark a raid's RSVPs as changed, and schedule saving them"
+
+        self._dirty.add(key)
+
+        if self._flusher is None:
+            loop = aio.get_event_loop()
+            Raid._flusher = loop.call_later(RSVP_FLUSH, self._flush)
+
+    @timed("raid.rsvp_flush")
+    def _flush(self):
+        "Save changed RSVPs in one batch"
+
+        if self._flusher is not None:
+            self._flusher.cancel()
+            Raid._flusher = None
+
+        for guild, name in self._dirty:
+            row = raid_key(guild, name)
+            rsvp = self._rsvps.get((guild, name))
+
+            if rsvp is not None and (rsvp.members or rsvp.messages):
+                self._attendance[row] = rsvp
+            elif row in self._attendance:
+                del self._attendance[row]
+
+        self._dirty.clear()
+
+    def _forget(self, guild: int, name: str):
+        "Drop a raid's RSVPs"
+
+        rsvp = self._rsvps.pop((guild, name), None)
+
+        if rsvp is not None:
+            for message in rsvp.messages:
+                self._embeds.pop(message, None)
+
+        # delete the saved copy now, rather than at the next save, so that the
+        # raid isn't loaded again with the old RSVPs in the meantime
+        self._dirty.discard((guild, name))
+        row = raid_key(guild, name)
+
+        if row in self._attendance:
+            del self._attendance[row]
+
+    def _mention(self, guild: int, name: str, default: str) -> str:
+        "Mention a raid's attendees, or use the default if there are none"
+
+        rsvp = self._rsvps.get((guild, name))
+
+        if rsvp is None or not rsvp.members:
+            return default
+
+        return " ".join(f"<@{m}>" for m in sorted(rsvp.members))
+
+    def _react(self, payload, attending: bool):
+        "Count a reaction on a raid embed, without fetching the message"
+
+        key = self._embeds.get(payload.message_id)
+
+        if key is None or str(payload.emoji) != RSVP:
+            return
+
+        user = getattr(self.bot, "user", None)
+
+        if user is not None and payload.user_id == user.id:
+            return
+
+        members = self._rsvps[key].members
+
+        if attending:
+            members.add(payload.user_id)
+        else:
+            members.discard(payload.user_id)
+
+        self._touch(key)
+
+    @Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        self._react(payload, True)
+
+    @Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        self._react(payload, False)
+
+    def _names(self, guild: int | None = None) -> dict[int, list[str]]:
+        """
+        Get the names of stored raids by guild ID, in one pass over the
+        keys. Raids stored before they were named are renamed on the way.
+        """
+
+        names: dict[int, list[str]] = {}
+
+        for key in list(self._schedules.keys()):
+            gid, name = split_key(key)
+
+            if guild is not None and gid != guild:
+                continue
+
+            if ":" not in str(key):
+                if not shards.owns(self.bot, gid):
+                    continue
+
+                self._schedules[raid_key(gid, name)] = self._schedules[key]
+                del self._schedules[key]
+
+            names.setdefault(gid, []).append(name)
+
+        return names
+
+    def _indexed(self, guild: int, raid: RaidSchedule):
+        "Add a raid to its guild's time-ordered index, or move it there"
+
+        assert raid.schedule
+        self._unindex(guild, raid.name)
+        at = raid.schedule.timestamp()
+        insort(self._index.setdefault(guild, []), (at, raid.name))
+        self._at[(guild, raid.name)] = at
+
+    def _unindex(self, guild: int, name: str):
+        "Remove a raid from its guild's time-ordered index"
+
+        at = self._at.pop((guild, name), None)
+
+        if at is None:
+            return
+
+        index = self._index[guild]
+        del index[bisect_left(index, (at, name))]
+
+        if not index:
+            del self._index[guild]
+
+    def _allies(self, guild: Guild) -> list[Guild]:
+        "Get the guilds which list a guild as an ally, and which it lists"
+
+        listed = _ally_ids(guild)
+
+        if not listed:
+            return []
+
+        return [
+            g
+            for g in self.bot.guilds
+            if g.id in listed and g.id != guild.id and guild.id in _ally_ids(g)
+        ]
+
+    async def _broadcast(
+        self, guild: Guild, channel, stage: str, own: str, allied: str
+    ) -> dict[int, float]:
+        """
+        Send a raid message to the raid's channel and, concurrently, to the
+        raid channel of each allied guild. A failed delivery doesn't affect
+        the others.
+
+        :param guild: The raid's guild
+        :param channel: The channel to announce the raid in
+        :param stage: The message name used for reporting
+        :param own: The message for the raid's guild
+        :param allied: The message for allied guilds
+        :returns: The delivery latency, in seconds, by guild ID
+        """
+
+        targets = [(guild, channel, own)]
+
+        for ally in self._allies(guild):
+            name = cache.get("raid.channel", FakeContext(guild=ally))
+            found = [c for c in ally.channels if c.name == name]
+
+            if not found:
+                log.warning(f"No raid channel in allied guild {ally}")
+
+                continue
+
+            targets.append((ally, found[0], allied))
+
+        semaphore = aio.Semaphore(BROADCAST_LIMIT)
+        latency: dict[int, float] = {}
+
+        async def deliver(target: Guild, c, content: str):
+            async with semaphore:
+                start = perf_counter()
+                # nobody is pinged in allied guilds, even by the raid's target
+                mentions = None if target is guild else AllowedMentions.none()
+
+                try:
+                    await c.send(content, allowed_mentions=mentions)
+                except Exception:
+                    broadcast_errors.inc(stage)
+                    log.exception(f"Unable to send {stage} to {target}")
+
+                    return
+
+                latency[target.id] = perf_counter() - start
+                broadcast_seconds.histogram(stage).observe(latency[target.id])
+
+        await aio.gather(*(deliver(*t) for t in targets))
+
+        if len(targets) > 1:
+            log.info(
+                f"Delivered {stage} for {guild} to "
+                f"{len(latency)}/{len(targets)} guilds: "
+                + ", ".join(f"{g} {s * 1000:.0f}ms" for g, s in latency.items())
+            )
+
+        return latency
+
+    async def adopt(self, guild: Guild, names=None):
+        "Schedule a guild's raid announcements, if they aren't already"
+
+        if names is None:
+            names = self._names(guild.id).get(guild.id, ())
+
+        for name in names:
+            key = raid_key(guild.id, name)
+
+            if (guild.id, name) in self._handles or key not in self._schedules:
+                continue
+
+            raid = self._schedules[key]
+            log.info(raid)
+            self._rsvp(guild.id, name)
+            await self._go(raid, FakeContext(guild), True)  # type: ignore
+
+    def release(self, guild: Guild):
+        "Stop a guild's raid announcements here, keeping its schedules"
+
+        for _, name in self._index.pop(guild.id, []):
+            self._at.pop((guild.id, name), None)
+            handle = self._handles.pop((guild.id, name), None)
+
+            if handle is not None:
+                handle.cancel()
+
+        # save RSVPs for the guild's next owner, then unload them
+        self._flush()
+
+        for key in [k for k in self._rsvps if k[0] == guild.id]:
+            for message in self._rsvps.pop(key).messages:
+                self._embeds.pop(message, None)
+
+    def _reset(self, guild: int, name: str):
         "Delete schedule, handle, etc. and reset raid"
 
-        if guild in self._handles:
-            self._handles[guild].cancel()
-            del self._handles[guild]
+        if (guild, name) in self._handles:
+            self._handles.pop((guild, name)).cancel()
+
+        self._unindex(guild, name)
+        self._forget(guild, name)
+        key = raid_key(guild, name)
 
-        if guild in self._schedules:
-            del self._schedules[guild]
+        if key in self._schedules:
+            del self._schedules[key]
+
+    async def _announced(self, ctx: Context, name: str, at: datetime):
+        """
+        Helper method to drop an announced raid, or arm the next occurrence
+        of a repeating raid, under the same lock as the raid commands
+
+        :param ctx: The context the raid was scheduled in
+        :param name: The raid's name
+        :param at: The time of the announced occurrence
+        """
+
+        assert ctx.guild
+        guild = ctx.guild.id
+        key = raid_key(guild, name)
+
+        async with guild_locks(("raid", guild)):
+            raid = self._schedules.get(key)
+
+            if raid is None or raid.schedule != at:
+                # canceled or rescheduled since it was announced
+                return
+
+            if not raid.repeat:
+                self._reset(guild, name)
+
+                return
+
+            # only the next occurrence is ever armed, and RSVPs are per
+            # occurrence; the timer may fire just before the schedule, so
+            # start from whichever is later
+            self._handles.pop((guild, name), None)
+            self._forget(guild, name)
+            now = datetime.now(timezone.utc)
+            raid.schedule = raid.next_occurrence(max(now, at))
+            self._schedules[key] = raid
+            await self._go(raid, ctx, True)
+            log.info(f"Next {raid.target} raid @ {raid.schedule}")
 
     async def _go(self, raid: RaidSchedule, ctx: Context, silent=False):
         "Helper method for scheduling announcement callback"
 
         assert ctx.guild
         loop = aio.get_event_loop()
-        channel = settings["raid.channel"].get(ctx)
+        handle_key = (ctx.guild.id, raid.name)
+        channel = cache.get("raid.channel", ctx)
 
         if channel is None:
             channel = raid.channel
@@ -104,50 +675,78 @@ class Raid(Cog, name="raid"):
 
             return False
 
+        def send(stage: str, emoji: str, body: str, default: str, rsvp=True):
+            assert ctx.guild
+            mention = self._mention(*handle_key, default) if rsvp else default
+            own = f"{emoji} {mention} {body}"
+            allied = f"{emoji} {body} (from {ctx.guild.name})"
+            loop.create_task(self._broadcast(ctx.guild, c, stage, own, allied))
+
+        @timed("raid.reminder1")
         def reminder1():
             assert ctx.guild
             assert raid.schedule
-            loop.create_task(
-                c.send(  # type: ignore
-                    f":stopwatch: @everyone "
-                    f"**Reminder:** Raid on {raid.target} @ "
-                    f"{discord_timestamp(raid.schedule)}! "
-                    f"(in 8 hours)"
-                )
+            record_lateness("raid.reminder1", raid.schedule.timestamp() - 28800)
+            send(
+                "raid.reminder1",
+                ":stopwatch:",
+                f"**Reminder:** Raid on {raid.title} @ "
+                f"{discord_timestamp(raid.schedule)}! (in 8 hours)",
+                "@everyone",
             )
             log.info(f"8 hour reminder for {raid.target} @ " f"{raid.schedule}")
             next = datetime.timestamp(raid.schedule - timedelta(minutes=30))
-            self._handles[ctx.guild.id] = loop.call_at(next, reminder2)
+            self._handles[handle_key] = loop.call_later(
+                next - time.time(), reminder2
+            )
             log.info("Scheduled 30 minute reminder")
 
+        @timed("raid.reminder2")
         def reminder2():
             assert ctx.guild
             assert raid.schedule
-            loop.create_task(
-                c.send(  # type: ignore
-                    f":stopwatch: @here "
-                    f"**Reminder:** Raid on {raid.target} in 30 minutes!"
-                )
+            record_lateness("raid.reminder2", raid.schedule.timestamp() - 1800)
+            send(
+                "raid.reminder2",
+                ":stopwatch:",
+                f"**Reminder:** Raid on {raid.title} in 30 minutes!",
+                "@here",
             )
             log.info(f"30 minute reminder for {raid.target} @ " f"{raid.schedule}")
             next = datetime.timestamp(raid.schedule)
-            self._handles[ctx.guild.id] = loop.call_at(next, announce)
+            self._handles[handle_key] = loop.call_later(
+                next - time.time(), announce
+            )
             log.info("Scheduled announcement")
 
-        def announce():
+        @timed("raid.announce")
+        def announce(on_time=True):
             assert ctx.guild
-            loop.create_task(
-                c.send(  # type: ignore
-                    f":crossed_swords: @everyone " f"**Time to raid {raid.target}!**"
-                )
+            assert raid.schedule
+
+            if on_time:
+                record_lateness("raid.announce", raid.schedule.timestamp())
+
+            send(
+                "raid.announce",
+                ":crossed_swords:",
+                f"**Time to raid {raid.title}!**",
+                "@everyone",
+                rsvp=False,
             )
             log.info(f"Announcement for {raid.target}")
-            self._reset(ctx.guild.id)
+            loop.create_task(self._announced(ctx, raid.name, raid.schedule))
 
         if raid.target is None or raid.schedule is None:
             return True
 
-        wait = (raid.schedule - datetime.now(timezone.utc)).total_seconds()
+        now = datetime.now(timezone.utc)
+        wait = (raid.schedule - now).total_seconds()
+
+        if wait <= -86400 and raid.repeat:
+            # occurrences were missed while offline; skip to the next one
+            raid.schedule = raid.next_occurrence(now)
+            wait = (raid.schedule - now).total_seconds()
 
         if wait <= -86400:
             # more than a day old; drop
@@ -155,11 +754,11 @@ class Raid(Cog, name="raid"):
 
         if wait <= 0:
             # in the past; announce immediately
-            announce()
+            announce(False)
 
             return True
 
-        existing = self._handles.get(ctx.guild.id, None)
+        existing = self._handles.get(handle_key, None)
 
         if existing is not None:
             existing.cancel()
@@ -176,13 +775,14 @@ class Raid(Cog, name="raid"):
             handle = loop.call_later(wait, announce)
             log.info(f"Scheduled announcement for {raid.target}")
 
-        self._schedules[ctx.guild.id] = raid
-        self._handles[ctx.guild.id] = handle
+        self._schedules[raid_key(ctx.guild.id, raid.name)] = raid
+        self._handles[handle_key] = handle
+        self._indexed(ctx.guild.id, raid)
 
         if silent:
             return
 
-        await self.check_(ctx)
+        await self._show(ctx, raid)
         log.info(f"{raid.leader} scheduled raid on {raid.target} @ " f"{raid.schedule}")
 
     @Cog.listener()
@@ -194,26 +794,65 @@ class Raid(Cog, name="raid"):
             return
 
         setattr(self.bot, "__raid_ready__", None)
+        known = {g.id for g in self.bot.guilds}
+        names = self._names()
 
-        for gid, raid in self._schedules.items():
-            try:
-                gid = int(gid)
-                ctx = FakeContext([g for g in self.bot.guilds if g.id == gid][0])
-                log.info(raid)
-                await self._go(raid, ctx, True)  # type: ignore
-            except IndexError:
-                # unknown guild; delete record
+        for gid in names:
+            # other processes' guilds are left for them to schedule
+            if gid not in known and shards.owns(self.bot, gid):
+                # unknown guild; delete records
                 log.error(f"Unknown guild {gid}")
-                del self._schedules[gid]
+
+                for name in names[gid]:
+                    del self._schedules[raid_key(gid, name)]
+
+        for guild in self.bot.guilds:
+            await self.adopt(guild, names.get(guild.id, ()))
+
+    async def _edit(self, alarm: Alarm):
+        "Helper method to edit an alarm until it has caught up with reports"
+
+        alarm.editing = True
+
+        try:
+            while True:
+                content = str(alarm)
+                await alarm.message.edit(content=content)
+
+                if str(alarm) == content:
+                    break
+        except Exception:
+            log.exception("Unable to update raid alarm")
+        finally:
+            alarm.editing = False
 
     @command(name="raid")
     @check(authz_check)
     async def alarm(self, ctx):
-        "Raise the raid alarm"
+        "Raise the raid alarm; repeated alarms within raid.alarmwindow seconds are added to the first instead of pinging again"
 
-        channel = settings["raid.channel"].get(ctx)
-        bumper = ":rotating_light:" * 3
-        message = " ".join((bumper, "@everyone We are being raided!", bumper))
+        nick = ctx.author.display_name
+        now = time.time()
+        alarm = self._alarms.get(ctx.guild.id)
+
+        try:
+            window = int(cache.get("raid.alarmwindow", ctx))
+        except (TypeError, ValueError):
+            window = ALARM_WINDOW
+
+        if alarm is not None and now - alarm.at < window:
+            alarm.count += 1
+            alarm.reporters[nick] = None
+
+            # edits in flight pick up this report when they finish
+            if not alarm.editing:
+                aio.get_event_loop().create_task(self._edit(alarm))
+
+            log.info(f"{ctx.author} raised the raid alarm again")
+
+            return
+
+        channel = cache.get("raid.channel", ctx)
         c = ctx
 
         try:
@@ -223,64 +862,239 @@ class Raid(Cog, name="raid"):
             # No raid channel configured, send to same channel as command
             pass
 
-        await c.send(f"**{message}**")
+        alarm = Alarm(None, now, nick)
+        self._alarms[ctx.guild.id] = alarm
+        content = str(alarm)
+        # reports made while sending are added once the message exists
+        alarm.editing = True
+
+        try:
+            alarm.message = await c.send(content)
+        except Exception:
+            del self._alarms[ctx.guild.id]
+
+            raise
+        finally:
+            alarm.editing = False
+
         log.info(f"{ctx.author} raised the raid alarm")
 
+        if str(alarm) != content:
+            await self._edit(alarm)
+
     @command(name="raid.cancel")
     @check(authz_schedule)
-    async def cancel(self, ctx):
-        "Cancels a currently scheduled raid"
+    @serialized("raid")
+    async def cancel(self, ctx, name: str = DEFAULT_NAME):
+        "Cancels a currently scheduled raid; provide name=<name> (e.g. name=alpha) to cancel a named raid"
+
+        name = _name_only(name)
+        key = raid_key(ctx.guild.id, name)
 
-        if (
-            ctx.guild.id not in self._schedules
-            or self._schedules[ctx.guild.id].target is None
-        ):
+        if key not in self._schedules or self._schedules[key].target is None:
             await ctx.send(MSG_NO_RAID)
             log.info(f"{ctx.author} attempted to cancel nonexistent raid")
 
             return
 
-        self._reset(ctx.guild.id)
+        self._reset(ctx.guild.id, name)
         await ctx.send(":negative_squared_cross_mark: Raid canceled.")
-        log.info(f"{ctx.author} canceled raid")
+        log.info(f"{ctx.author} canceled raid {name}")
 
-    @command(name="raid.check")
-    @check(authz_check)
-    async def check_(self, ctx: Context):
-        "Check current raid schedule"
-
-        assert ctx.guild
-        if ctx.guild.id not in self._schedules:
-            await ctx.send(MSG_NO_RAID)
+    def _embed(self, raid: RaidSchedule) -> Embed:
+        "Helper method to describe a raid"
 
-            return
-
-        raid = self._schedules[ctx.guild.id]
+        assert raid.schedule
         until = seconds_to_str(
             (raid.schedule - datetime.now(timezone.utc)).total_seconds()
         )
-        embed = Embed(title="Next raid", colour=Colour.red())
+        title = "Next raid"
+
+        if raid.name != DEFAULT_NAME:
+            title = f"{title}: {raid.name}"
+
+        embed = Embed(title=title, colour=Colour.red())
         embed.add_field(name=":dart: Target", value=raid.target)
         embed.add_field(name=":crown: Leader", value=raid.leader)
         embed.add_field(
             name=":calendar: Schedule", value=discord_timestamp(raid.schedule)
         )
-        embed.set_footer(text=f"{until} from now")
+
+        if raid.repeat:
+            embed.add_field(name=":repeat: Repeats", value=raid.rule)
+
+        rsvp = self._rsvps.get((raid.guild, raid.name))
+
+        if rsvp is not None and rsvp.members:
+            embed.add_field(
+                name=f"{RSVP} Attending", value=str(len(rsvp.members))
+            )
+
+        embed.set_footer(text=f"{until} from now; react {RSVP} to attend")
+
+        return embed
+
+    async def _show(self, ctx: Context, raid: RaidSchedule):
+        "Helper method to post a raid's embed and count RSVPs to it"
+
+        assert ctx.guild
+        key = (ctx.guild.id, raid.name)
+        rsvp = self._rsvp(*key)
+        message = await ctx.send(embed=self._embed(raid))
+        rsvp.messages.append(message.id)
+        self._embeds[message.id] = key
+
+        while len(rsvp.messages) > RSVP_MESSAGES:
+            self._embeds.pop(rsvp.messages.pop(0), None)
+
+        self._touch(key)
+        await message.add_reaction(RSVP)
+
+    @command(name="raid.check")
+    @check(authz_check)
+    async def check_(self, ctx: Context, name: str | None = None):
+        "Check scheduled raids, soonest first, or provide name=<name> (e.g. name=alpha) to check only that raid"
+
+        assert ctx.guild
+
+        if name is not None:
+            key = raid_key(ctx.guild.id, _name_only(name))
+
+            if (
+                key not in self._schedules
+                or self._schedules[key].target is None
+                or self._schedules[key].schedule is None
+            ):
+                await ctx.send(MSG_NO_RAID)
+
+                return
+
+            await self._show(ctx, self._schedules[key])
+
+            return
+
+        index = self._index.get(ctx.guild.id, [])
+
+        if not index:
+            await ctx.send(MSG_NO_RAID)
+
+            return
+
+        raids = [
+            self._schedules[raid_key(ctx.guild.id, n)]
+            for _, n in index[:MAX_LISTED]
+        ]
+
+        if len(raids) == 1:
+            await self._show(ctx, raids[0])
+
+            return
+
+        embed = Embed(title="Upcoming raids", colour=Colour.red())
+
+        for raid in raids:
+            value = f"{discord_timestamp(raid.schedule)} :crown: {raid.leader}"
+
+            if raid.repeat:
+                value = f"{value} :repeat: {raid.rule}"
+
+            embed.add_field(
+                name=f":dart: {raid.name}: {raid.target}",
+                value=value,
+                inline=False,
+            )
+
+        if len(index) > MAX_LISTED:
+            embed.set_footer(text=f"{len(index) - MAX_LISTED} more")
+
         await ctx.send(embed=embed)
 
+    @command(name="raid.repeat", brief="Repeat a raid")
+    @check(authz_schedule)
+    @serialized("raid")
+    async def repeat(self, ctx: Context, *, rule):
+        """
+        Repeat a raid weekly, or every <n> ticks, from its schedule. Only the next occurrence is scheduled at any time, and canceling the raid stops it repeating. A raid repeating by ticks without a schedule starts <n> ticks from now. Use "off" to stop repeating. Prefix with name=<name> for a named raid.
+
+        Examples:
+
+            !raid.repeat weekly
+            !raid.repeat name=alpha every 96 ticks
+            !raid.repeat off
+        """
+
+        assert ctx.guild
+        name, rule = _named(rule)
+        text = rule.strip().lower()
+        match = TICKS_RULE.match(text)
+        ticks = int(match[1]) if match else None
+
+        if text == "off":
+            repeat = None
+        elif text == "weekly":
+            repeat = WEEK
+        elif ticks:
+            repeat = ticks * FIFTEEN_MINS
+        else:
+            await ctx.message.add_reaction(THUMBS_DOWN)
+            log.warning(f"{ctx.author} provided bad args: {rule}")
+
+            return
+
+        nick = ctx.author.display_name
+        key = raid_key(ctx.guild.id, name)
+
+        if repeat is None and key not in self._schedules:
+            await ctx.send(MSG_NO_RAID)
+
+            return
+
+        raid = (
+            self._schedules[key]
+            if key in self._schedules
+            else RaidSchedule(ctx.guild.id, nick, ctx.channel.name, name)
+        )
+
+        if raid.schedule is None and ticks:
+            stamp = int(datetime.now(timezone.utc).timestamp())
+            raid.schedule = tickmath.to_datetime(
+                tickmath.next_tick(stamp, ticks)
+            )
+
+        if raid.schedule is None and repeat:
+            await ctx.send(":person_shrugging: Set the raid's schedule first.")
+
+            return
+
+        raid.repeat = repeat
+        raid.leader = nick
+        self._schedules[key] = raid
+
+        if repeat:
+            await ctx.send(f":repeat: Raid repeats {raid.rule}.")
+        else:
+            await ctx.send(":arrow_right: Raid no longer repeats.")
+
+        log.info(f"{ctx.author} set raid {name} repeat: {raid.rule}")
+        await self._go(raid, ctx)
+
     @command(name="raid.schedule", brief="Set raid schedule")
     @check(authz_schedule)
+    @serialized("raid")
     async def schedule(self, ctx: Context, *, when):
         """
-        Set raid schedule to <when>, which must be a valid 24-hour datetime string (e.g. 2020-01-01 23:45). Date is optional; today's date will be the default value. Will be parsed as GMT.
+        Set raid schedule to <when>, which must be a valid 24-hour datetime string (e.g. 2020-01-01 23:45). Date is optional; today's date will be the default value. Will be parsed as GMT. Prefix with name=<name> to schedule a named raid.
 
         Examples:
 
             !raid.schedule 2020-01-01 23:45
             !raid.schedule 23:45
+            !raid.schedule name=alpha 23:45
         """
 
         assert ctx.guild
+        name, when = _named(when)
+        key = raid_key(ctx.guild.id, name)
         dt = datetime.now(timezone.utc)
         nick = ctx.author.display_name
 
@@ -301,33 +1115,36 @@ class Raid(Cog, name="raid"):
             return
 
         raid = (
-            self._schedules[ctx.guild.id]
-            if ctx.guild.id in self._schedules
-            else RaidSchedule(ctx.guild.id, nick, ctx.channel.id)
+            self._schedules[key]
+            if key in self._schedules
+            else RaidSchedule(ctx.guild.id, nick, ctx.channel.name, name)
         )
         raid.schedule = dt
         raid.leader = nick
-        self._schedules[ctx.guild.id] = raid
+        self._schedules[key] = raid
         await ctx.send(f":calendar: Schedule set to {discord_timestamp(dt)}.")
-        log.info(f"{ctx.author} set raid schedule: {dt}")
+        log.info(f"{ctx.author} set raid {name} schedule: {dt}")
         await self._go(raid, ctx)
 
     @command(name="raid.target")
     @check(authz_schedule)
+    @serialized("raid")
     async def target(self, ctx, *, target):
-        "Set raid target"
+        "Set raid target; prefix with name=<name> (e.g. name=alpha Some Castle) to set a named raid's target"
 
+        name, target = _named(target)
+        key = raid_key(ctx.guild.id, name)
         nick = ctx.author.display_name
         raid = (
-            self._schedules[ctx.guild.id]
-            if ctx.guild.id in self._schedules
-            else RaidSchedule(ctx.guild.id, nick, ctx.channel.name)
+            self._schedules[key]
+            if key in self._schedules
+            else RaidSchedule(ctx.guild.id, nick, ctx.channel.name, name)
         )
         raid.target = target
         raid.leader = nick
-        self._schedules[ctx.guild.id] = raid
+        self._schedules[key] = raid
         await ctx.send(f":point_right: Target set to {target}.")
-        log.info(f"{ctx.author} set raid target: {target}")
+        log.info(f"{ctx.author} set raid {name} target: {target}")
         await self._go(raid, ctx)
 
 
@@ -368,16 +1185,45 @@ async def setup(bot):
         "restrictions. Separate multiple entries with commas.",
         filter=checkroles_filter,
     )
+    register(
+        "raid.allies",
+        None,
+        lambda x: all(i.strip().isdigit() for i in str(x).split(",")),
+        False,
+        "The IDs of the servers this server shares raids with. Raid "
+        "reminders and announcements are also sent to the raid channel of "
+        "each listed server which lists this server in turn, without "
+        "pinging anyone there, and theirs here. Separate multiple entries "
+        "with commas. If set to the default, raids are not shared.",
+    )
+    register(
+        "raid.alarmwindow",
+        ALARM_WINDOW,
+        lambda x: str(x).isdigit(),
+        False,
+        "Seconds after a raid alarm during which further alarms are added "
+        "to it, rather than pinging everyone again. Set to 0 to always "
+        "ping.",
+    )
+    cache.watch(bot)
     cog = Raid(bot)
 
     for c in cog.get_commands():
         c.add_check(channel_only)
+        instrument(c)
 
     await bot.add_cog(cog)
+    shards.handoff(bot, cog.adopt, cog.release)
 
 
 async def teardown(bot):
     global settings
 
-    for k in ("raid.channel", "raid.scheduleroles", "raid.checkroles"):
+    for k in (
+        "raid.channel",
+        "raid.scheduleroles",
+        "raid.checkroles",
+        "raid.allies",
+        "raid.alarmwindow",
+    ):
         del settings[k]
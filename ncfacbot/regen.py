@@ -0,0 +1,148 @@
+"""AP/MP regeneration projection"""
+
+# stdlib
+from math import ceil
+
+# local
+from . import tickmath
+
+
+class Character:
+    """A character's current and maximum AP and MP, and regen per tick"""
+
+    def __init__(
+        self,
+        name: str,
+        ap: int,
+        max_ap: int,
+        ap_rate: int = 1,
+        mp: int = 0,
+        max_mp: int = 0,
+        mp_rate: int = 1,
+    ):
+        #: The character's name
+        self.name = name
+        #: Current action points
+        self.ap = ap
+        #: Maximum action points
+        self.max_ap = max_ap
+        #: Action points regained each tick
+        self.ap_rate = ap_rate
+        #: Current magic points
+        self.mp = mp
+        #: Maximum magic points
+        self.max_mp = max_mp
+        #: Magic points regained each tick
+        self.mp_rate = mp_rate
+
+    def __repr__(self):
+        return (
+            f"<Character name='{self.name}' ap={self.ap}/{self.max_ap} "
+            f"mp={self.mp}/{self.max_mp}>"
+        )
+
+
+class Projection:
+    """When a character's AP and MP will be full"""
+
+    def __init__(
+        self,
+        name: str,
+        ap_ticks: int | None,
+        ap_full: int | None,
+        mp_ticks: int | None,
+        mp_full: int | None,
+    ):
+        #: The character's name
+        self.name = name
+        #: Ticks until AP is full, or None if it never will be
+        self.ap_ticks = ap_ticks
+        #: UNIX timestamp of the tick when AP is full, or None
+        self.ap_full = ap_full
+        #: Ticks until MP is full, or None if it never will be
+        self.mp_ticks = mp_ticks
+        #: UNIX timestamp of the tick when MP is full, or None
+        self.mp_full = mp_full
+
+    def __repr__(self):
+        return (
+            f"<Projection name='{self.name}' ap_full={self.ap_full} "
+            f"mp_full={self.mp_full}>"
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Get the projection as a dict.
+
+        :returns: The projection's fields keyed by name
+        """
+
+        return {
+            "name": self.name,
+            "ap_ticks": self.ap_ticks,
+            "ap_full": self.ap_full,
+            "mp_ticks": self.mp_ticks,
+            "mp_full": self.mp_full,
+        }
+
+
+def ticks_to_fill(current: int, maximum: int, rate: int) -> int | None:
+    """
+    Calculate how many ticks it will take for a resource to fill up.
+
+    :param current: The current amount
+    :param maximum: The maximum amount
+    :param rate: The amount regained each tick
+    :returns: The number of ticks, 0 if already full, or None if it will
+        never be full
+    """
+
+    missing = maximum - current
+
+    if missing <= 0:
+        return 0
+
+    if rate <= 0:
+        return None
+
+    return ceil(missing / rate)
+
+
+def project(
+    characters: list[Character], now: int | None = None
+) -> list[Projection]:
+    """
+    Project when each character's AP and MP will be full.
+
+    Resources are regained at each tick, so a resource which is not yet full
+    fills up at the tick calculated by :func:`tickmath.next_tick` for the
+    number of ticks it needs. A resource which is already full is reported as
+    full at `now`.
+
+    :param characters: The characters to project
+    :param now: The UNIX timestamp to project from; defaults to the current
+        time, read once for the whole roster
+    :returns: A projection for each character, in the same order
+    """
+
+    if now is None:
+        now = tickmath.now()
+
+    def when(ticks: int | None) -> int | None:
+        if ticks is None:
+            return None
+
+        return tickmath.next_tick(now, ticks) if ticks else now
+
+    results = []
+
+    for c in characters:
+        ap_ticks = ticks_to_fill(c.ap, c.max_ap, c.ap_rate)
+        mp_ticks = ticks_to_fill(c.mp, c.max_mp, c.mp_rate)
+        results.append(
+            Projection(
+                c.name, ap_ticks, when(ap_ticks), mp_ticks, when(mp_ticks)
+            )
+        )
+
+    return results
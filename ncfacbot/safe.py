@@ -1,34 +1,47 @@
 """Safe contents commands"""
 
 # stdlib
-from functools import partial
+import asyncio as aio
 from os import environ
 from os.path import dirname, join, realpath
 import re
+import typing
 
 # 3rd party
 from discord.ext.commands import Bot, Cog, command, Context
-from fastapi import APIRouter, FastAPI, Request
-from fastapi.exceptions import HTTPException
-from fastapi.staticfiles import StaticFiles
-from sqlitedict import SqliteDict
 
 # api
-from aethersprite import config, data_folder, log
-from aethersprite.authz import channel_only, require_roles_from_setting
+from aethersprite import config, log
+from aethersprite.authz import channel_only
 from aethersprite.common import FakeContext
-from aethersprite.filters import RoleFilter
+from aethersprite.emotes import THUMBS_DOWN
+from aethersprite.filters import ChannelFilter, RoleFilter
 from aethersprite.settings import register, settings
 
+# local
+from . import cache, render_table
+from .catalog import catalog
+from .locks import serialized
+from .metrics import instrument, timed
+from .storage import table
+
+if typing.TYPE_CHECKING:
+    from fastapi import FastAPI
+
 MAX_ITEMS_PER_MESSAGE = 20
 """Maximum number of items listed per Discord message to avoid rejection"""
 
-SPELLS_PATTERN = r"([- a-zA-Z0-9]+) - Small \w+ Gem, (\d+) shots \((\d+)\)"
+SPELLS_PATTERN = re.compile(
+    r"([- a-zA-Z0-9]+) - Small \w+ Gem, (\d+) shots \((\d+)\)"
+)
 """Regex for splitting apart spell gem text"""
 
-COUNTS_PATTERN = r"\((\d+)\)"
+COUNTS_PATTERN = re.compile(r"\((\d+)\)")
 """Regex for getting counts from potions, etc."""
 
+NAME_PATTERN = re.compile(r"^(.+?) \(\d+\)$")
+"""Regex for getting item names without their counts"""
+
 SCRIPT_URL = config.get("ncfacbot", {}).get(
     "safe_contents_script",
     environ.get(
@@ -47,23 +60,125 @@ README_URL = config.get("ncfacbot", {}).get(
 )
 """URL for README, if any"""
 
-authz_safe = partial(require_roles_from_setting, setting="safe.roles")
-router = APIRouter(prefix="/nexusclash.safe")
-static = StaticFiles(directory=join(realpath(dirname(__file__)), "web"))
+authz_safe = cache.authz("safe.roles")
+authz_threshold = cache.authz("safe.thresholdroles")
 
 
-def _get_database():
-    """Helper function to get a database reference"""
+SPELL_SHOTS = 6
+"""Number of shot counts a spell gem may have, from empty to full"""
 
-    return SqliteDict(
-        f"{data_folder}safe.sqlite3", tablename="contents", autocommit=True
-    )
+POTION_LOW = 12
+"""Potion count shown as low, unless the potion has a threshold"""
 
+ALERT_DELAY = 300
+"""Seconds to gather threshold crossings before posting an alert"""
 
-class Safe(Cog, name="safe"):
-    """Safe contents commands"""
+CATEGORIES = ("Components", "Potions", "Spells")
+"""Categories of stored safe contents"""
+
+
+def _item_name(item: str):
+    """Helper function to strip the count from an item listing"""
+
+    m = NAME_PATTERN.match(item)
+
+    return m.groups()[0] if m else item
+
+
+def _name(item: str | dict, listing: str) -> str:
+    """Helper function to get the name of a component or potion"""
+
+    return item["name"] if isinstance(item, dict) else _item_name(listing)
+
+
+def _field(item: dict, name: str, kind: type):
+    """Helper function to get a field of a structured item, checking its
+    type"""
+
+    value = item.get(name)
+
+    # exact type, so that booleans aren't taken for numbers
+    if type(value) is not kind:
+        raise ValueError(f"Invalid {name}: {value!r}")
+
+    if kind is int and value < 0:
+        raise ValueError(f"Negative {name}: {value}")
+
+    return value
+
+
+def _listing(item: str | dict) -> str:
+    """
+    Helper function to get the listing of a component or potion. Structured
+    items are listed as `name (count)`; text listings are kept as they were
+    sent.
+    """
 
-    _safe = _get_database()
+    if isinstance(item, str):
+        return item
+
+    if not isinstance(item, dict):
+        raise ValueError(f"Invalid item: {item!r}")
+
+    return f"{_field(item, 'name', str)} ({_field(item, 'count', int)})"
+
+
+def _count(item: str | dict) -> int:
+    """Helper function to get the count of a component or potion"""
+
+    if isinstance(item, dict):
+        return _field(item, "count", int)
+
+    m = COUNTS_PATTERN.search(item)
+
+    if m is None:
+        raise ValueError(f"No count in item: {item!r}")
+
+    return int(m.groups()[0])
+
+
+def _spell(item: str | dict) -> tuple[str, int, int]:
+    """Helper function to get the spell, shots, and count of a spell gem"""
+
+    if isinstance(item, dict):
+        spell = _field(item, "name", str)
+        shots = _field(item, "shots", int)
+        count = _field(item, "count", int)
+    else:
+        m = SPELLS_PATTERN.search(item) if isinstance(item, str) else None
+
+        if m is None:
+            raise ValueError(f"Invalid spell gem: {item!r}")
+
+        spell, shots, count = m.groups()
+        shots, count = int(shots), int(count)
+
+    if shots >= SPELL_SHOTS:
+        raise ValueError(f"Too many shots: {shots}")
+
+    return spell, shots, count
+
+
+class Safe(Cog, name="safe"):
+    """
+    Safe contents commands
+
+    Low stock thresholds may be set for any item with safe.threshold; when a report shows an item dropping below its threshold, or restocked, an alert is posted in the safe.alertchannel.
+    """
+
+    _safe = table("safe", "contents")
+
+    #: Low stock thresholds by guild, as (name, count) keyed by lowercased
+    #: item name
+    _thresholds = table("safe", "threshold")
+    #: Item counts in the last report, by guild and category, keyed by
+    #: lowercased item name; only kept for guilds with thresholds
+    _levels = table("safe", "levels")
+    #: Items which crossed their threshold since the last alert, by guild,
+    #: and whether each was low before its first crossing
+    _pending: dict[str, dict[str, bool]] = {}
+    #: Timer handles of pending alerts, by guild
+    _alerts: dict[str, aio.TimerHandle] = {}
 
     _icons = {
         "Components": "tools",
@@ -72,12 +187,14 @@ class Safe(Cog, name="safe"):
     }
     """Emoji to use when displaying lists"""
 
-    async def _get(self, ctx: Context, kind: str):
+    async def _get(
+        self, ctx: Context, kind: str, only: frozenset[str] | None = None
+    ):
         """Helper function for retrieving item lists"""
 
         assert ctx.guild
 
-        if settings["safe.key"].get(ctx) is None:
+        if cache.get("safe.key", ctx) is None:
             await ctx.send(":thumbsdown: No UserScript key has been set.")
             log.warn("No UserScript key is set for this guild")
 
@@ -92,6 +209,9 @@ class Safe(Cog, name="safe"):
         if guild in self._safe:
             items += self._safe[guild][kind]
 
+        if only is not None:
+            items = [i for i in items if _item_name(i).lower() in only]
+
         if not items:
             await ctx.send("> _None_")
         else:
@@ -135,14 +255,136 @@ class Safe(Cog, name="safe"):
         log.info(f"{ctx.author} viewed list of spells")
 
     @command()
-    async def components(self, ctx):
-        """Lists components in the faction safe"""
+    async def components(self, ctx, tag: typing.Optional[str] = None):
+        """
+        Lists components in the faction safe
 
-        await self._get(ctx, "Components")
-        log.info(f"{ctx.author} viewed list of components")
+        Provide a [tag] to only list components in that category. The available categories can be seen with the shop.catalog command.
+        """
 
+        only = None
 
+        if tag is not None:
+            tagged = catalog.get(ctx.guild.id).tagged
+
+            if tag.lower() not in tagged:
+                await ctx.send(":person_shrugging: No such category.")
+
+                return
+
+            only = frozenset(n.lower() for n in tagged[tag.lower()])
+
+        await self._get(ctx, "Components", only)
+        log.info(f"{ctx.author} viewed list of components: {tag}")
+
+    @command(name="safe.threshold")
+    @serialized("safe")
+    async def threshold(
+        self,
+        ctx: Context,
+        n: typing.Optional[int] = None,
+        *,
+        item: typing.Optional[str] = None,
+    ):
+        """
+        Set or list low stock thresholds
+
+        When a report shows fewer than [n] of [item] in the safe, an alert is posted in the safe.alertchannel, and another when it is restocked. Use the item's name as listed in the safe, in any case. Set [n] to 0 to remove the item's threshold. Without arguments, lists every threshold. Only the safe.thresholdroles may set or remove thresholds.
+
+        Examples:
+            !safe.threshold 12 potion of healing
+            !safe.threshold 5 fuel can
+            !safe.threshold 0 fuel can
+        """
+
+        assert ctx.guild
+        guild = str(ctx.guild.id)
+        thresholds = self._thresholds.get(guild, {})
+
+        if n is None and item is None:
+            if not thresholds:
+                await ctx.send(":person_shrugging: No thresholds are set.")
+            else:
+                rows = [(name, n) for name, n in thresholds.values()]
+
+                for message in render_table(
+                    sorted(rows), ":bar_chart: **Low stock thresholds**"
+                ):
+                    await ctx.send(message)
+
+            log.info(f"{ctx.author} listed safe thresholds")
+
+            return
+
+        if n is None or n < 0 or item is None or not item.strip():
+            await ctx.message.add_reaction(THUMBS_DOWN)
+
+            return
+
+        if not await authz_threshold(ctx):
+            await ctx.message.add_reaction(THUMBS_DOWN)
+            log.warning(f"{ctx.author} is not allowed to set safe thresholds")
+
+            return
+
+        key = item.strip().lower()
+
+        if n == 0:
+            if key not in thresholds:
+                await ctx.send(
+                    f":person_shrugging: No threshold for **{item}**."
+                )
+
+                return
+
+            del thresholds[key]
+            await ctx.send(f":red_circle: Removed threshold for **{item}**.")
+        else:
+            thresholds[key] = (item.strip(), n)
+            await ctx.send(f":green_circle: Threshold for **{item}**: {n}.")
+
+        if thresholds:
+            self._thresholds[guild] = thresholds
+        else:
+            # nothing left to watch
+            self._thresholds.pop(guild, None)
+            self._levels.pop(guild, None)
+
+        log.info(f"{ctx.author} set safe threshold for {item} to {n}")
+
+    @command(name="safe.low")
+    async def low(self, ctx: Context):
+        """
+        Lists items below their low stock threshold
+
+        Uses the most recent report; items with no threshold are not listed.
+        """
+
+        assert ctx.guild
+        guild = str(ctx.guild.id)
+        thresholds = self._thresholds.get(guild, {})
+        counts = _totals(self._levels.get(guild, {}))
+        rows = [
+            (name, f"{counts[key]}/{n}")
+            for key, (name, n) in thresholds.items()
+            # items without a report since they got a threshold are unknown
+            if key in counts and counts[key] < n
+        ]
+
+        if not rows:
+            await ctx.send(":green_circle: Nothing is below its threshold.")
+        else:
+            for message in render_table(
+                sorted(rows), ":red_circle: **Low stock**"
+            ):
+                await ctx.send(message)
+
+        log.info(f"{ctx.author} viewed low stock")
+
+
+alertchannel_filter = ChannelFilter("safe.alertchannel")
 roles_filter = RoleFilter("safe.roles")
+thresholdroles_filter = RoleFilter("safe.thresholdroles")
 
 
 def _settings():
@@ -158,6 +400,15 @@ def _settings():
         False,
         "The key used by the UserScript for reporting.",
     )
+    register(
+        "safe.alertchannel",
+        None,
+        lambda x: True,
+        False,
+        "The channel where low stock alerts are posted (see "
+        "safe.threshold). If set to the default, no alerts are posted.",
+        filter=alertchannel_filter,
+    )
     register(
         "safe.roles",
         None,
@@ -168,34 +419,221 @@ def _settings():
         "with commas.",
         filter=roles_filter,
     )
+    register(
+        "safe.thresholdroles",
+        None,
+        lambda x: True,
+        False,
+        "The server roles that are allowed to set low stock thresholds "
+        "(see safe.threshold). If unset, there are no restrictions. "
+        "Separate multiple entries with commas.",
+        filter=thresholdroles_filter,
+    )
+
+
+bot: Bot | None = None
 
 
-async def setup(bot: Bot):
+async def setup(bot_: Bot):
+    global bot
+
+    bot = bot_
     _settings()
-    cog = Safe(bot)
+    cache.watch(bot_)
+    cog = Safe(bot_)
 
     for c in cog.get_commands():
         c.add_check(authz_safe)
         c.add_check(channel_only)
+        instrument(c)
 
-    await bot.add_cog(cog)
+    await bot_.add_cog(cog)
 
 
 async def teardown(bot: Bot):
     global settings
 
+    for handle in Safe._alerts.values():
+        handle.cancel()
+
+    Safe._alerts.clear()
+    Safe._pending.clear()
+
     for k in (
+        "safe.alertchannel",
         "safe.key",
         "safe.roles",
+        "safe.thresholdroles",
     ):
         del settings[k]
 
 
-@router.post("/post")
-async def http_safe(request: Request):
-    """Post safe contents from UserScript"""
+def _totals(levels: dict[str, dict[str, int]]) -> dict[str, int]:
+    """Helper function to total item counts across categories"""
+
+    totals = {}
+
+    for counts in levels.values():
+        for key, count in counts.items():
+            totals[key] = totals.get(key, 0) + count
+
+    return totals
+
+
+def _evaluate(
+    guild: str,
+    thresholds: dict[str, tuple[str, int]],
+    levels: dict[str, dict[str, int]],
+):
+    """
+    Store a guild's new counts of the items with thresholds, and queue an
+    alert for each item whose count crossed its threshold since the last
+    report. Only the items whose counts changed are checked. An item's first
+    count after it gets a threshold is only stored.
+
+    :param guild: The guild ID
+    :param thresholds: The guild's thresholds
+    :param levels: The reported counts by category, missing any category
+        which couldn't be read
+    """
+
+    previous = Safe._levels.get(guild, {})
+    components = catalog.get(guild)
+    read = set(levels)
 
-    from flask import current_app
+    for category in CATEGORIES:
+        if category not in levels:
+            levels[category] = previous.get(category, {})
+
+    after = _totals(levels)
+
+    for key in thresholds.keys() - after.keys():
+        # record missing items as none left, so that the next report can
+        # tell them from items which had no threshold. An item stays in the
+        # categories it was counted in; one which was never counted is only
+        # known to be missing if every category it could be in was read.
+        where = [c for c in CATEGORIES if key in previous.get(c, {})]
+
+        if not where:
+            if components.is_component(key):
+                where = ["Components"]
+            else:
+                where = ["Potions", "Spells"]
+
+        if not read.issuperset(where):
+            continue
+
+        for category in where:
+            levels[category][key] = 0
+
+        after[key] = 0
+
+    Safe._levels[guild] = levels
+    before = _totals(previous)
+    changed = {
+        key
+        for key, _ in before.items() ^ after.items()
+        if key in before and key in thresholds
+    }
+    pending = Safe._pending.get(guild, {})
+
+    for key in changed:
+        n = thresholds[key][1]
+        was_low = before.get(key, 0) < n
+
+        if was_low != (after.get(key, 0) < n):
+            # keep the state from before the first crossing
+            pending.setdefault(key, was_low)
+
+    if not pending or guild in Safe._alerts:
+        return
+
+    Safe._pending[guild] = pending
+    Safe._alerts[guild] = aio.get_running_loop().call_later(
+        ALERT_DELAY, _alert, guild
+    )
+
+
+@timed("safe.alert")
+def _alert(guild: str):
+    """Post a guild's pending alerts, leaving out items which crossed their
+    threshold and then crossed back."""
+
+    Safe._alerts.pop(guild, None)
+    pending = Safe._pending.pop(guild, {})
+    thresholds = Safe._thresholds.get(guild, {})
+    counts = _totals(Safe._levels.get(guild, {}))
+    low = []
+    restocked = []
+
+    for key, was_low in sorted(pending.items()):
+        if key not in thresholds:
+            continue
+
+        name, n = thresholds[key]
+        count = counts.get(key, 0)
+
+        if count < n and not was_low:
+            low.append(f"- {name}: {count} (threshold {n})")
+        elif count >= n and was_low:
+            restocked.append(f"- {name}: {count}")
+
+    if not low and not restocked:
+        return
+
+    aio.get_event_loop().create_task(_post(guild, low, restocked))
+
+
+async def _post(guild: str, low: list[str], restocked: list[str]):
+    """Helper function to send an alert to a guild's alert channel"""
+
+    g = bot.get_guild(int(guild)) if bot is not None else None
+
+    if g is None:
+        # the guild is on another shard or process, or the bot is gone
+        log.warn(f"Unable to post low stock alert for {guild}")
+
+        return
+
+    name = cache.get("safe.alertchannel", FakeContext(guild=g))
+    found = [c for c in g.channels if c.name == name]
+
+    if not found:
+        return
+
+    channel = found[0]
+
+    for title, lines in (
+        (":red_circle: **Low stock**", low),
+        (":green_circle: **Restocked**", restocked),
+    ):
+        for i in range(0, len(lines), MAX_ITEMS_PER_MESSAGE):
+            chunk = lines[i : i + MAX_ITEMS_PER_MESSAGE]
+
+            try:
+                await channel.send(
+                    "\n".join(([title] if i == 0 else []) + chunk)
+                )
+            except Exception:
+                log.exception(f"Unable to post low stock alert in {g}")
+
+                return
+
+    log.info(f"Posted low stock alert in {g}")
+
+
+async def http_safe(data: dict):
+    """
+    Post safe contents from UserScript
+
+    Each item is either an object with its `name` and `count`, and a spell
+    gem's `shots`, or the item's text as listed in the safe, as sent by
+    earlier versions of the UserScript.
+
+    :param data: The decoded request body
+    """
+
+    from fastapi.exceptions import HTTPException
 
     def get_spell_text(spell, counts):
         """Helper function to get spell output"""
@@ -205,8 +643,18 @@ async def http_safe(request: Request):
 
         return f"{spell} **({total})** ||[{shots_txt}]||"
 
-    db = getattr(current_app, "ext_safe_db")
-    data = await request.json()
+    def add_spell(cleaned, spell, counts):
+        """Helper function to list a spell, and record its level"""
+
+        cleaned.append(get_spell_text(spell, counts))
+
+        if levels is not None and spell.lower() in thresholds:
+            levels["Spells"][spell.lower()] = sum(counts)
+
+    db = Safe._safe
+
+    if not isinstance(data, dict):
+        raise HTTPException(400)
 
     for k in ("guild", "items", "key"):
         if k not in data:
@@ -214,7 +662,7 @@ async def http_safe(request: Request):
 
     guild = data["guild"]
     ctx = FakeContext(guild={"id": guild})
-    key = settings["safe.key"].get(ctx)  # type: ignore
+    key = cache.get("safe.key", ctx)  # type: ignore
 
     if key is None:
         raise HTTPException(401)
@@ -222,91 +670,142 @@ async def http_safe(request: Request):
     if key != data["key"]:
         raise HTTPException(403)
 
-    # massage/validate data
-    for category in (
-        "Potion",
-        "Spell",
-    ):
-        items = data["items"][category]
-
-        if len(items) == 0:
-            continue
+    thresholds = Safe._thresholds.get(guild)
+    # item counts are only gathered for guilds with thresholds
+    levels: dict[str, dict[str, int]] | None = (
+        {c: {} for c in CATEGORIES} if thresholds else None
+    )
 
-        # ignore spell/potion blind item reports
-        if items[0] == "0":
-            try:
-                data["items"][category] = db[guild][category]
-            except KeyError:
-                data["items"][category] = []
-
-        # clean up spell listings
-        elif category == "Spell":
-            cleaned = []
-            counts = [0, 0, 0, 0, 0, 0]
-            last_gem = None
-            items_len = len(items)
-
-            for idx in range(items_len):
-                eol = idx == items_len - 1
-                item = items[idx]
-                m = re.search(SPELLS_PATTERN, item)
-                assert m
-                groups = m.groups()
-                spell = groups[0]
-                shots = int(groups[1])
-                count = int(groups[2])
-
-                if last_gem != spell and last_gem is not None:
-                    cleaned.append(get_spell_text(last_gem, counts))
-                    counts = [0, 0, 0, 0, 0, 0]
-                    counts[shots] = count
-                else:
-                    counts[shots] += count
-
-                if eol:
-                    cleaned.append(get_spell_text(spell, counts))
-
-                last_gem = spell
-
-            d = data["items"]
-            d["Spell"] = cleaned
-            data["items"] = d
-
-        # add icons to potion listings
-        elif category == "Potion":
-            updated = []
-
-            for item in data["items"][category]:
-                icon = ":green_circle:"
-                m = re.search(COUNTS_PATTERN, item)
-                assert m
-                count = int(m.groups()[0])
-
-                if count < 12:
-                    icon = ":red_circle:"
-                elif count < 24:
-                    icon = ":yellow_circle:"
-
-                updated.append(" ".join((icon, item)))
-
-            d = data["items"]
-            d["Potion"] = updated
-            data["items"] = d
+    try:
+        # massage/validate data
+        for category in (
+            "Potion",
+            "Spell",
+        ):
+            items = data["items"][category]
+
+            if len(items) == 0:
+                continue
+
+            # ignore spell/potion blind item reports
+            if items[0] == "0":
+                try:
+                    data["items"][category] = db[guild][f"{category}s"]
+                except KeyError:
+                    data["items"][category] = []
+
+                if levels is not None:
+                    # keep the last known counts
+                    del levels[f"{category}s"]
+
+            # clean up spell listings
+            elif category == "Spell":
+                cleaned = []
+                counts = [0] * SPELL_SHOTS
+                last_gem = None
+                items_len = len(items)
+
+                for idx in range(items_len):
+                    eol = idx == items_len - 1
+                    spell, shots, count = _spell(items[idx])
+
+                    if last_gem != spell and last_gem is not None:
+                        add_spell(cleaned, last_gem, counts)
+                        counts = [0] * SPELL_SHOTS
+                        counts[shots] = count
+                    else:
+                        counts[shots] += count
+
+                    if eol:
+                        add_spell(cleaned, spell, counts)
+
+                    last_gem = spell
+
+                d = data["items"]
+                d["Spell"] = cleaned
+                data["items"] = d
+
+            # add icons to potion listings
+            elif category == "Potion":
+                updated = []
+
+                for item in data["items"][category]:
+                    icon = ":green_circle:"
+                    count = _count(item)
+                    listing = _listing(item)
+                    low = POTION_LOW
+
+                    if levels is not None:
+                        key = _name(item, listing).lower()
+
+                        if key in thresholds:
+                            levels["Potions"][key] = count
+                            low = thresholds[key][1]
+
+                    if count < low:
+                        icon = ":red_circle:"
+                    elif count < low * 2:
+                        icon = ":yellow_circle:"
+
+                    updated.append(" ".join((icon, listing)))
+
+                d = data["items"]
+                d["Potion"] = updated
+                data["items"] = d
+
+        components = catalog.get(guild)
+        listed = []
+
+        for item in data["items"]["Component"]:
+            listing = _listing(item)
+            listed.append(listing)
+            name = _name(item, listing)
+
+            if not components.is_component(name):
+                log.warning(f"Unknown component reported for {guild}: {name}")
+
+            if levels is not None and name.lower() in thresholds:
+                key = name.lower()
+                counted = levels["Components"]
+                counted[key] = counted.get(key, 0) + _count(item)
+    except (KeyError, TypeError, ValueError) as ex:
+        log.warning(f"Rejected safe contents for {guild}: {ex!r}")
+
+        raise HTTPException(400)
 
     db[guild] = {
         "Potions": data["items"]["Potion"],
         "Spells": data["items"]["Spell"],
-        "Components": data["items"]["Component"],
+        "Components": listed,
     }
 
+    if levels is not None:
+        _evaluate(guild, thresholds, levels)
+
     return "", 200
 
 
-def setup_webapp(app: FastAPI, _):
+def setup_webapp(app: "FastAPI", _):
     """Web application setup"""
 
+    from fastapi import APIRouter, Request
+    from fastapi.exceptions import HTTPException
+    from fastapi.staticfiles import StaticFiles
+
     _settings()
-    db = _get_database()
-    setattr(app, "ext_safe_db", db)
+    router = APIRouter(prefix="/nexusclash.safe")
+
+    # the UserScript doesn't send a JSON content type, so decode the body
+    # regardless of it
+    @router.post("/post")
+    async def post(request: Request):
+        try:
+            data = await request.json()
+        except ValueError:
+            raise HTTPException(400)
+
+        return await http_safe(data)
+
+    static = StaticFiles(directory=join(realpath(dirname(__file__)), "web"))
     app.mount(f"{router.prefix}/static", static)
     app.include_router(router)
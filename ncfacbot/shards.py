@@ -0,0 +1,134 @@
+"""
+Guild ownership when the bot is sharded across processes
+
+Storage is shared by every process, but each guild's timers must only run in
+the process which owns the guild's shard. Extensions load and schedule a
+guild's state when it becomes available to their process, and drop their
+timers (but not the stored state) when it goes away, so that ownership hands
+off cleanly when shards are rebalanced.
+"""
+
+# stdlib
+from inspect import isawaitable
+import typing
+
+# 3rd party
+from discord import Guild
+from discord.ext.commands import Bot
+
+# api
+from aethersprite import log
+
+
+def shard_of(guild_id: int | str, shard_count: int) -> int:
+    """
+    Get the shard a guild belongs to, as Discord assigns them.
+
+    :param guild_id: The guild ID
+    :param shard_count: The total number of shards
+    :returns: The shard ID
+    """
+
+    return (int(guild_id) >> 22) % shard_count
+
+
+def owns(bot: Bot, guild_id: int | str) -> bool:
+    """
+    Check whether this process owns a guild.
+
+    :param bot: The bot instance
+    :param guild_id: The guild ID
+    :returns: True if the guild's shard is run by this process, or if the
+        bot isn't sharded
+    """
+
+    count = getattr(bot, "shard_count", None) or 1
+
+    if count == 1:
+        return True
+
+    shards = getattr(bot, "shard_ids", None)
+
+    if shards is None:
+        shard = getattr(bot, "shard_id", None)
+
+        if shard is None:
+            # every shard runs in this process
+            return True
+
+        shards = (shard,)
+
+    return shard_of(guild_id, count) in shards
+
+
+async def _each(callbacks: typing.Iterable[typing.Callable], guild: Guild):
+    """Helper function to call handoff callbacks, isolating any failure"""
+
+    for callback in tuple(callbacks):
+        try:
+            result = callback(guild)
+
+            if isawaitable(result):
+                await result
+        except Exception:
+            log.exception(f"Handoff callback {callback} failed for {guild}")
+
+
+def handoff(
+    bot: Bot,
+    adopt: typing.Callable[[Guild], typing.Any],
+    release: typing.Callable[[Guild], typing.Any],
+):
+    """
+    Register callbacks for when a guild becomes available to this process,
+    and when it goes away. Either may be a plain function or a coroutine
+    function, and both must be safe to call more than once for a guild.
+
+    :param bot: The bot instance
+    :param adopt: Called with the guild when it becomes available
+    :param release: Called with the guild when it goes away
+    """
+
+    handlers: dict | None = getattr(bot, "guild_handoff", None)
+
+    if handlers is None:
+        handlers = {}
+        setattr(bot, "guild_handoff", handlers)
+
+        async def on_available(guild: Guild):
+            await _each(handlers.keys(), guild)
+
+        async def on_gone(guild: Guild):
+            await _each(handlers.values(), guild)
+
+        bot.add_listener(on_available, "on_guild_available")
+        bot.add_listener(on_available, "on_guild_join")
+        bot.add_listener(on_gone, "on_guild_unavailable")
+        bot.add_listener(on_gone, "on_guild_remove")
+
+    handlers[adopt] = release
+
+
+def unhandoff(bot: Bot, adopt: typing.Callable[[Guild], typing.Any]):
+    """
+    Remove callbacks registered with :func:`handoff`.
+
+    :param bot: The bot instance
+    :param adopt: The adopt callback that was registered
+    """
+
+    getattr(bot, "guild_handoff", {}).pop(adopt, None)
+
+
+async def refresh(bot: Bot, guild: Guild):
+    """
+    Release and adopt a guild again, such as after its stored state has
+    been replaced.
+
+    :param bot: The bot instance
+    :param guild: The guild
+    """
+
+    handlers: dict = getattr(bot, "guild_handoff", {})
+    await _each(handlers.values(), guild)
+    await _each(handlers.keys(), guild)
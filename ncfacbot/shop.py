@@ -1,77 +1,33 @@
 "Shopping List commands module"
 
 # stdlib
-from collections import OrderedDict
-from functools import partial
 import typing
 
 # 3rd party
-from aethersprite import data_folder, log
-from aethersprite.authz import channel_only, require_roles_from_setting
+from aethersprite import log
+from aethersprite.authz import channel_only
 from aethersprite.emotes import THUMBS_DOWN
 from aethersprite.filters import RoleFilter
 from aethersprite.settings import register, settings
 from discord.ext.commands import Bot, check, Cog, command, Context
-from sqlitedict import SqliteDict
-
-#: Hard-coded list of components keyed by lowercase item name for lookup
-COMPONENTS = {
-    "bag of industrial plastic": "Bag of Industrial Plastic",
-    "batch of leather": "Batch of Leather",
-    "batch of mushrooms": "Batch of Mushrooms",
-    "battery": "Battery",
-    "blood ice": "Blood Ice",
-    "bottle of holy water": "Bottle of Holy Water",
-    "bottle of paradise water": "Bottle of Paradise Water",
-    "bunch of daisies": "Bunch of Daisies",
-    "bunch of lilies": "Bunch of Lilies",
-    "bunch of paradise lilies": "Bunch of Paradise Lilies",
-    "chunk of brass": "Chunk of Brass",
-    "chunk of iron": "Chunk of Iron",
-    "chunk of ivory": "Chunk of Ivory",
-    "chunk of onyx": "Chunk of Onyx",
-    "chunk of steel": "Chunk of Steel",
-    "chunk of stygian iron": "Chunk of Stygian Iron",
-    "common": "Common Component",
-    "femur": "Femur",
-    "fuel can": "Fuel Can",
-    "gold ingot": "Gold Ingot",
-    "handful of grave dirt": "Handful of Grave Dirt",
-    "humerus": "Humerus",
-    "lead brick": "Lead Brick",
-    "length of chain": "Length of Chain",
-    "length of rope": "Length of Rope",
-    "patch of lichen": "Patch of Lichen",
-    "patch of moss": "Patch of Moss",
-    "piece of stygian coal": "Piece of Stygian Coal",
-    "piece of wood": "Piece of Wood",
-    "pistol clip": "Pistol Clip",
-    "quiver of arrows": "Quiver of Arrows",
-    "rare": "Rare Component",
-    "rifle magazine": "Rifle Magazine",
-    "rock": "Rock",
-    "rose": "Rose",
-    "shotgun shell": "Shotgun Shell",
-    "silver ingot": "Silver Ingot",
-    "skull": "Skull",
-    "small bottle of gunpowder": "Small Bottle of Gunpowder",
-    "smg magazine": "SMG Magazine",
-    "soul ice": "Soul Ice",
-    "spool of copper wire": "Spool of Copper Wire",
-    "sprig of nightshade": "Sprig of Nightshade",
-    "uncom": "Uncommon Component",
-}
+
+# local
+from . import cache, render_table
+from .catalog import catalog
+from .locks import serialized
+from .metrics import instrument
+from .storage import Record, table
 
 # authz decorators
-authz_list = partial(
-    require_roles_from_setting, setting=("shop.setroles", "shop.listroles")
-)
-authz_set = partial(require_roles_from_setting, setting="shop.setroles")
+authz_list = cache.authz(("shop.setroles", "shop.listroles"))
+authz_set = cache.authz("shop.setroles")
 
 
-class ShoppingList:
+class ShoppingList(Record):
     "Shopping list; stores user's information and item requests"
 
+    __slots__ = ("nick", "userid", "items")
+
     def __init__(self, nick: str, userid: str):
         #: User's nickname (defaults to username)
         self.nick = nick
@@ -80,6 +36,29 @@ class ShoppingList:
         #: List of item requests
         self.items = {}
 
+    def to_dict(self) -> dict:
+        """
+        Get the list as a dict of JSON-compatible values.
+
+        :returns: The list's fields keyed by name
+        """
+
+        return {"nick": self.nick, "userid": self.userid, "items": self.items}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ShoppingList":
+        """
+        Create a list from a dict made by :meth:`to_dict`.
+
+        :param data: The list's fields keyed by name
+        :returns: The list
+        """
+
+        lst = cls(data["nick"], data["userid"])
+        lst.items = {str(k): int(v) for k, v in data["items"].items()}
+
+        return lst
+
 
 class Shop(Cog, name="shop"):
 
@@ -90,15 +69,14 @@ class Shop(Cog, name="shop"):
     """
 
     # Persistent storage of shopping lists
-    _lists = SqliteDict(
-        f"{data_folder}shop.sqlite3", tablename="shopping_list", autocommit=True
-    )
+    _lists = table("shop", "shopping_list")
 
     def __init__(self, bot: Bot):
         self.bot = bot
 
     @command(name="shop.set", brief="Manipulate your shopping list")
     @check(authz_set)
+    @serialized("shop")
     async def set(self, ctx: Context, num: str, *, item: str):
         """
         Manipulate your shopping list
@@ -130,7 +108,8 @@ class Shop(Cog, name="shop"):
             return
 
         log.info(f"{ctx.author} set {item} request to {num}")
-        matches = [k for k in COMPONENTS if name in k]
+        components = catalog.get(ctx.guild.id)
+        matches = components.match(name)
         howmany = len(matches)
 
         if howmany == 0:
@@ -142,7 +121,7 @@ class Shop(Cog, name="shop"):
             return
 
         elif howmany > 1:
-            matchstr = "**, **".join([COMPONENTS[k] for k in matches])
+            matchstr = "**, **".join([components.lowered[k] for k in matches])
             await ctx.send(
                 f":person_shrugging: Multiple matches: "
                 f" **{matchstr}**. Be more specific."
@@ -150,7 +129,7 @@ class Shop(Cog, name="shop"):
 
             return
 
-        name = COMPONENTS[matches[0]]
+        name = components.lowered[matches[0]]
 
         if not ctx.guild.id in self._lists:
             # create new store for guild
@@ -207,7 +186,7 @@ class Shop(Cog, name="shop"):
         """
         Show shopping list(s)
 
-        Show current shopping list for [who]. If no value is provided, your own list will be shown. If "all" is used, a list of users with lists that have at least one item will be shown (but not their items). If "net" is used, a list of all items needed from all combined lists will be shown (but not who needs them).
+        Show current shopping list for [who]. If no value is provided, your own list will be shown. If "all" is used, a list of users with lists that have at least one item will be shown (but only how many items they have, not the items themselves). If "net" is used, a list of all items needed from all combined lists will be shown (but not who needs them).
         """
 
         assert ctx.guild
@@ -225,8 +204,12 @@ class Shop(Cog, name="shop"):
 
                 return
 
-            liststr = "**, **".join([l[1].nick for l in self._lists[guild].items()])
-            await ctx.send(f":paperclip: Lists: **{liststr}**")
+            lists = sorted(
+                (l.nick, len(l.items)) for l in self._lists[guild].values()
+            )
+
+            for message in render_table(lists, ":paperclip: Lists:"):
+                await ctx.send(message)
 
             return
 
@@ -260,24 +243,12 @@ class Shop(Cog, name="shop"):
 
             return
 
-        items = OrderedDict(sorted(items.items()))
-        longest = max([len(k) for k in items.keys()])
-        first = True
-        output = "```"
-
-        for k in items:
-            if first:
-                first = False
-            else:
-                output += "\n"
-
-            output += f'{k}{"." * (longest - len(k))}... {items[k]}'
-
-        output += "```"
-        await ctx.send(output)
+        for message in render_table(sorted(items.items())):
+            await ctx.send(message)
 
     @command(name="shop.clear")
     @check(authz_set)
+    @serialized("shop")
     async def clear(self, ctx: Context):
         "Empty your shopping list"
 
@@ -299,6 +270,34 @@ class Shop(Cog, name="shop"):
 
         await ctx.send(":negative_squared_cross_mark: Your list has been " "cleared.")
 
+    @command(name="shop.catalog", brief="Show known components")
+    @check(authz_list)
+    async def catalog_(self, ctx: Context, tag: typing.Optional[str]):
+        """
+        Show known components
+
+        Show the components which may be requested with shop.set. Provide a [tag] to only show components in that category. If "tags" is used, the list of categories will be shown instead.
+        """
+
+        assert ctx.guild
+        components = catalog.get(ctx.guild.id)
+
+        if tag is None:
+            rows = [(n,) for n in sorted(components.tags)]
+        elif tag.lower() == "tags":
+            rows = [(t, len(n)) for t, n in components.tagged.items()]
+        elif tag.lower() in components.tagged:
+            rows = [(n,) for n in components.tagged[tag.lower()]]
+        else:
+            await ctx.send(":person_shrugging: No such category.")
+
+            return
+
+        for message in render_table(rows, ":scroll: Components:"):
+            await ctx.send(message)
+
+        log.info(f"{ctx.author} checked component catalog: {tag}")
+
 
 list_filter = RoleFilter("shop.listroles")
 set_filter = RoleFilter("shop.setroles")
@@ -326,10 +325,12 @@ async def setup(bot):
         "multiple entries with commas.",
         filter=set_filter,
     )
+    cache.watch(bot)
     cog = Shop(bot)
 
     for c in cog.get_commands():
         c.add_check(channel_only)
+        instrument(c)
 
     await bot.add_cog(cog)
 
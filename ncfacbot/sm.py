@@ -2,12 +2,13 @@
 
 # stdlib
 import asyncio as aio
+from bisect import bisect_left, insort
 from datetime import datetime, timezone, timedelta
 from math import ceil
 import typing
 
 # api
-from aethersprite import data_folder, log
+from aethersprite import log
 from aethersprite.authz import channel_only
 from aethersprite.common import FakeContext
 from aethersprite.emotes import THUMBS_DOWN
@@ -15,23 +16,36 @@ from aethersprite.filters import ChannelFilter, RoleFilter
 from aethersprite.settings import register, settings
 
 # 3rd party
+from discord import Guild
 from discord.abc import GuildChannel
 from discord.ext.commands import Bot, check, command, Context
-from sqlitedict import SqliteDict
+
+# local
+from . import cache, MAX_MESSAGE_LENGTH, shards
+from .locks import serialized
+from .metrics import instrument, record_lateness, timed
+from .storage import Record, table
 
 bot: Bot
 
 # constants
 SM_LIMIT = 100
+#: Most countdowns listed by sm.all and the status board
+BOARD_LIMIT = 25
+#: Least seconds between edits of a status board
+BOARD_INTERVAL = 60
 # filters
 channel_filter = ChannelFilter("sm.channel")
 # database
-schedule = SqliteDict(f"{data_folder}sm.sqlite3", tablename="announce", autocommit=True)
+schedule = table("sm", "announce")
+boards = table("sm", "board")
 
 
-class SMSchedule:
+class SMSchedule(Record):
     """Sorcerer's Might expiry announcement schedule"""
 
+    __slots__ = ("user", "nick", "channel", "schedule")
+
     def __init__(self, user: str, nick: str, channel: str, schedule: datetime):
         #: The full user name
         self.user = user
@@ -48,10 +62,193 @@ class SMSchedule:
             f"channel={self.channel} schedule={self.schedule}>"
         )
 
+    def to_dict(self) -> dict:
+        """
+        Get the schedule as a dict of JSON-compatible values.
+
+        :returns: The schedule's fields keyed by name
+        """
+
+        return {
+            "user": self.user,
+            "nick": self.nick,
+            "channel": self.channel,
+            "schedule": self.schedule.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SMSchedule":
+        """
+        Create a schedule from a dict made by :meth:`to_dict`.
+
+        :param data: The schedule's fields keyed by name
+        :returns: The schedule
+        """
+
+        return cls(
+            data["user"],
+            data["nick"],
+            data["channel"],
+            datetime.fromisoformat(data["schedule"]),
+        )
+
+
+class ExpiryIndex:
+    """A guild's active countdowns, ordered by expiry"""
+
+    __slots__ = ("entries", "users")
+
+    def __init__(self):
+        #: (expiry timestamp, user, nick) of each countdown, in order
+        self.entries: list[tuple[float, str, str]] = []
+        #: Each user's entry
+        self.users: dict[str, tuple[float, str, str]] = {}
+
+    def add(self, user: str, nick: str, expiry: datetime):
+        """
+        Add a countdown, replacing any the user already has.
+
+        :param user: The user
+        :param nick: The user's nick
+        :param expiry: When the countdown is announced
+        """
+
+        self.remove(user)
+        entry = (expiry.timestamp(), user, nick)
+        insort(self.entries, entry)
+        self.users[user] = entry
+
+    def remove(self, user: str):
+        """
+        Remove a user's countdown, if they have one.
+
+        :param user: The user
+        """
+
+        entry = self.users.pop(user, None)
+
+        if entry is not None:
+            del self.entries[bisect_left(self.entries, entry)]
+
+    def first(self, k: int) -> list[tuple[float, str, str]]:
+        """
+        Get the countdowns expiring soonest.
+
+        :param k: How many to get
+        :returns: Up to k entries, soonest first
+        """
+
+        return self.entries[:k]
+
+
+class Board:
+    """A guild's pinned countdown status message"""
+
+    __slots__ = ("channel", "message", "edited", "handle")
+
+    def __init__(self, channel: int, message: int):
+        #: The channel ID
+        self.channel = channel
+        #: The message ID
+        self.message = message
+        #: Loop time of the last edit
+        self.edited = float("-inf")
+        #: Timer handle of the next edit, if one is pending
+        self.handle: aio.TimerHandle | None = None
+
+
+def _index(bot: Bot, guild: str) -> ExpiryIndex:
+    """Helper function to get a guild's expiry index"""
+
+    return getattr(bot, "sm_index").setdefault(guild, ExpiryIndex())
+
+
+def _track(bot: Bot, guild: str, user: str, nick: str, expiry: datetime):
+    """Helper function to index a countdown and update the board"""
+
+    _index(bot, guild).add(user, nick, expiry)
+    _changed(bot, guild)
+
+
+def _untrack(bot: Bot, guild: str, user: str):
+    """Helper function to unindex a countdown and update the board"""
+
+    index = _index(bot, guild)
+    index.remove(user)
 
-def _done(bot: Bot, guild: str, channel: str, user: str, nick: str):
+    if not index.entries:
+        del getattr(bot, "sm_index")[guild]
+
+    _changed(bot, guild)
+
+
+def _render(bot: Bot, guild: str) -> str:
+    """Helper function to list a guild's countdowns, soonest first"""
+
+    index = getattr(bot, "sm_index").get(guild) or ExpiryIndex()
+    lines = [":adhesive_bandage: **Sorcerers Might countdowns**"]
+
+    for stamp, _, nick in index.first(BOARD_LIMIT):
+        lines.append(f"<t:{int(stamp)}:t> (<t:{int(stamp)}:R>) {nick}")
+
+    if len(index.entries) > BOARD_LIMIT:
+        lines.append(f"...and {len(index.entries) - BOARD_LIMIT} more")
+    elif not index.entries:
+        lines.append("No active countdowns.")
+
+    return "\n".join(lines)[:MAX_MESSAGE_LENGTH]
+
+
+def _changed(bot: Bot, guild: str):
+    """Helper function to edit a guild's board, at most once per interval"""
+
+    board: Board | None = getattr(bot, "sm_boards").get(guild)
+
+    if board is None or board.handle is not None:
+        return
+
+    loop = aio.get_event_loop()
+    wait = max(0.0, board.edited + BOARD_INTERVAL - loop.time())
+    board.handle = loop.call_later(
+        wait, lambda: loop.create_task(_edit(bot, guild, board))
+    )
+
+
+async def _edit(bot: Bot, guild: str, board: Board):
+    """Helper function to edit a board"""
+
+    board.handle = None
+    board.edited = aio.get_event_loop().time()
+    g = bot.get_guild(int(guild))
+    channel = g.get_channel(board.channel) if g else None
+
+    if channel is None:
+        log.warn(f"SM board channel missing in {guild}")
+
+        return
+
+    try:
+        await channel.get_partial_message(board.message).edit(
+            content=_render(bot, guild)
+        )
+    except Exception:
+        log.exception(f"Unable to update SM board in {guild}")
+
+
+@timed("sm.done")
+def _done(
+    bot: Bot,
+    guild: str,
+    channel: str,
+    user: str,
+    nick: str,
+    scheduled: float | None = None,
+):
     """Countdown completed callback"""
 
+    if scheduled is not None:
+        record_lateness("sm.done", scheduled)
+
     loop = aio.get_event_loop()
     int_guild = int(guild)
     fake_ctx = None
@@ -66,8 +263,8 @@ def _done(bot: Bot, guild: str, channel: str, user: str, nick: str):
         return
 
     try:
-        role: str | None = settings["sm.medicrole"].get(fake_ctx)
-        chan: str | None = settings["sm.channel"].get(fake_ctx)
+        role: str | None = cache.get("sm.medicrole", fake_ctx)
+        chan: str | None = cache.get("sm.channel", fake_ctx)
 
         msg = ":adhesive_bandage: "
 
@@ -106,8 +303,86 @@ def _done(bot: Bot, guild: str, channel: str, user: str, nick: str):
         sm_alerts: dict = getattr(bot, "sm_alerts")
         cd = sm_alerts[guild]
         del cd[user]
-        sm_alerts[guild] = cd
+
+        if cd:
+            sm_alerts[guild] = cd
+        else:
+            # don't keep an empty dict for every guild ever seen
+            del sm_alerts[guild]
+
         setattr(bot, "sm_alerts", sm_alerts)
+        _untrack(bot, guild, user)
+
+
+def adopt(guild: Guild):
+    """Schedule a guild's SM expiry announcements; immediately announce those
+    missed"""
+
+    gid = str(guild.id)
+
+    if gid in boards and gid not in getattr(bot, "sm_boards"):
+        getattr(bot, "sm_boards")[gid] = Board(*boards[gid])
+        _changed(bot, gid)
+
+    if gid not in schedule:
+        return
+
+    now = datetime.now(timezone.utc)
+    loop = aio.get_event_loop()
+    sm_alerts: dict = getattr(bot, "sm_alerts")
+    gcd = sm_alerts.setdefault(gid, {})
+    overdue = []
+
+    for _, sched in schedule[gid].items():
+        if sched.user in gcd:
+            # already scheduled in this process
+            continue
+
+        if sched.schedule <= now:
+            log.info(f"Immediately calling SM expiry for {sched.user}")
+            gcd[sched.user] = (sched.schedule, None)
+            _track(bot, gid, sched.user, sched.nick, sched.schedule)
+            overdue.append(sched)
+        else:
+            log.info(f"Scheduling SM expiry for {sched.user}")
+            diff = (sched.schedule - now).total_seconds()
+            h = loop.call_later(
+                diff,
+                _done,
+                bot,
+                gid,
+                sched.channel,
+                sched.user,
+                sched.nick,
+                sched.schedule.timestamp(),
+            )
+            gcd[sched.user] = (sched.schedule, h)
+            _track(bot, gid, sched.user, sched.nick, sched.schedule)
+
+    if not gcd:
+        del sm_alerts[gid]
+
+    # announce after the loop, since each one may drop the guild's dict once
+    # it is empty
+    for sched in overdue:
+        _done(bot, gid, sched.channel, sched.user, sched.nick)
+
+
+def release(guild: Guild):
+    """Stop a guild's SM expiry announcements in this process, keeping their
+    schedules"""
+
+    sm_alerts: dict = getattr(bot, "sm_alerts")
+
+    for _, h in sm_alerts.pop(str(guild.id), {}).values():
+        if h is not None:
+            h.cancel()
+
+    getattr(bot, "sm_index").pop(str(guild.id), None)
+    board = getattr(bot, "sm_boards").pop(str(guild.id), None)
+
+    if board is not None and board.handle is not None:
+        board.handle.cancel()
 
 
 async def on_ready():
@@ -119,36 +394,21 @@ async def on_ready():
         return
 
     setattr(bot, "__sm_ready__", None)
-    # Use bot property to store alerts; easy way to ensure it is atomic
-    setattr(bot, "sm_alerts", {})
-
-    now = datetime.now(timezone.utc)
-    loop = aio.get_event_loop()
-
-    for gid, guild in schedule.items():
-        for _, sched in guild.items():
-            if sched.schedule <= now:
-                log.info(f"Immediately calling SM expiry for {sched.user}")
-                _done(bot, gid, sched.channel, sched.user, sched.nick)
-            else:
-                log.info(f"Scheduling SM expiry for {sched.user}")
-                diff = (sched.schedule - now).total_seconds()
-                h = loop.call_later(
-                    diff, _done, bot, gid, sched.channel, sched.user, sched.nick
-                )
+    known = {str(g.id) for g in bot.guilds}
 
-                sm_alerts: dict = getattr(bot, "sm_alerts")
-                if not gid in sm_alerts:
-                    sm_alerts[gid] = {}
+    for gid in list(schedule.keys()):
+        # other processes' guilds are left for them to schedule
+        if gid not in known and shards.owns(bot, gid):
+            log.warn(f"Removing missing guild {gid}")
+            del schedule[gid]
 
-                gcd = sm_alerts[gid]
-                gcd[sched.user] = (sched.schedule, h)
-                sm_alerts[gid] = gcd
-                setattr(bot, "sm_alerts", sm_alerts)
+    for guild in bot.guilds:
+        adopt(guild)
 
 
 @command(brief="Start a Sorcerers Might countdown", name="sm")
 @check(channel_only)
+@serialized("sm")
 async def sm(ctx: Context, n: typing.Optional[int] = None):
     """
     Start a Sorcerers Might countdown for n minutes
@@ -218,8 +478,14 @@ async def sm(ctx: Context, n: typing.Optional[int] = None):
             cd = sm_alerts[guild][author]
             cd[1].cancel()
             del gcd[author]
-            sm_alerts[guild] = gcd
+
+            if gcd:
+                sm_alerts[guild] = gcd
+            else:
+                del sm_alerts[guild]
+
             setattr(ctx.bot, "sm_alerts", sm_alerts)
+            _untrack(ctx.bot, guild, author)
 
             try:
                 s = schedule[guild]
@@ -258,9 +524,8 @@ async def sm(ctx: Context, n: typing.Optional[int] = None):
         schedule[guild] = {}
 
     sched = schedule[guild]
-    sched[author] = SMSchedule(
-        author, nick, ctx.channel.name, sm_end + timedelta(minutes=1)
-    )
+    expiry = sm_end + timedelta(minutes=1)
+    sched[author] = SMSchedule(author, nick, ctx.channel.name, expiry)
     schedule[guild] = sched
 
     # set timer for countdown completed callback
@@ -271,15 +536,90 @@ async def sm(ctx: Context, n: typing.Optional[int] = None):
     gcd[author] = (
         sm_end,
         loop.call_later(
-            60 * (n + 1), _done, ctx.bot, guild, ctx.channel.name, author, nick
+            (expiry - now).total_seconds(),
+            _done,
+            ctx.bot,
+            guild,
+            ctx.channel.name,
+            author,
+            nick,
+            expiry.timestamp(),
         ),
     )
     sm_alerts[guild] = gcd
     setattr(ctx.bot, "sm_alerts", sm_alerts)
+    _track(ctx.bot, guild, author, nick, expiry)
     await ctx.send(output)
     log.info(f"{ctx.author} started SM countdown for {n} {minutes}")
 
 
+@command(name="sm.all")
+@check(channel_only)
+async def sm_all(ctx: Context):
+    """
+    List everyone's Sorcerers Might countdowns, soonest first
+    """
+
+    assert ctx.guild
+    await ctx.send(_render(ctx.bot, str(ctx.guild.id)))
+    log.info(f"{ctx.author} listed SM countdowns")
+
+
+@command(name="sm.board")
+@check(channel_only)
+@serialized("sm")
+async def sm_board(ctx: Context, off: typing.Optional[str] = None):
+    """
+    Post a pinned list of everyone's Sorcerers Might countdowns
+
+    The list is kept up to date as countdowns start and end, edited at most once a minute. Only one list is kept per server; posting a new one replaces the old. Use "sm.board off" to stop updating it.
+    """
+
+    assert ctx.guild
+    guild = str(ctx.guild.id)
+    sm_boards: dict = getattr(ctx.bot, "sm_boards")
+    old: Board | None = sm_boards.pop(guild, None)
+
+    if old is not None:
+        if old.handle is not None:
+            old.handle.cancel()
+
+        channel = ctx.guild.get_channel(old.channel)
+
+        if channel is not None:
+            try:
+                await channel.get_partial_message(old.message).unpin()
+            except Exception:
+                log.warn(f"Unable to unpin old SM board in {guild}")
+
+    if guild in boards:
+        del boards[guild]
+
+    if off is not None:
+        if off.lower() != "off":
+            await ctx.message.add_reaction(THUMBS_DOWN)
+
+            return
+
+        await ctx.send(":negative_squared_cross_mark: SM board stopped.")
+        log.info(f"{ctx.author} stopped the SM board")
+
+        return
+
+    message = await ctx.send(_render(ctx.bot, guild))
+
+    try:
+        await message.pin()
+    except Exception:
+        log.warn(f"Unable to pin SM board in {guild}")
+
+    board = Board(message.channel.id, message.id)
+    board.edited = aio.get_event_loop().time()
+    sm_boards[guild] = board
+    boards[guild] = (board.channel, board.message)
+    log.info(f"{ctx.author} posted the SM board")
+
+
 medic_filter = RoleFilter("sm.medicrole")
 
 
@@ -309,8 +649,17 @@ async def setup(bot_: Bot):
         filter=channel_filter,
     )
 
+    # Use bot property to store alerts; easy way to ensure it is atomic
+    setattr(bot, "sm_alerts", {})
+    setattr(bot, "sm_index", {})
+    setattr(bot, "sm_boards", {})
+    cache.watch(bot)
+    shards.handoff(bot, adopt, release)
     bot.add_listener(on_ready)
-    bot.add_command(sm)
+
+    for c in (sm, sm_all, sm_board):
+        instrument(c)
+        bot.add_command(c)
 
 
 async def teardown(bot: Bot):
@@ -319,4 +668,9 @@ async def teardown(bot: Bot):
     for k in ("sm.medicrole", "sm.channel"):
         del settings[k]
 
+    for board in getattr(bot, "sm_boards").values():
+        if board.handle is not None:
+            board.handle.cancel()
+
+    shards.unhandoff(bot, adopt)
     bot.remove_listener(on_ready)
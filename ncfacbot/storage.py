@@ -0,0 +1,180 @@
+"""
+Persistent storage, opened on first use
+
+Tables use SQLite's write-ahead log, so that several bot processes may share
+the same files; each process only writes the guilds it owns (see
+:mod:`ncfacbot.shards`).
+"""
+
+# stdlib
+from collections.abc import MutableMapping
+from functools import cache
+from operator import attrgetter
+import typing
+
+# 3rd party
+from sqlitedict import SqliteDict
+
+# api
+from aethersprite import data_folder
+
+# local
+from .metrics import TimedTable
+
+
+@cache
+def slots(cls: type) -> tuple[str, ...]:
+    """
+    Get the names of the fields a class and its bases declare in
+    ``__slots__``.
+
+    :param cls: The class
+    :returns: The field names, base classes' first
+    """
+
+    names = []
+
+    for klass in reversed(cls.__mro__):
+        declared = klass.__dict__.get("__slots__", ())
+        names += [declared] if isinstance(declared, str) else declared
+
+    return tuple(names)
+
+
+@cache
+def _values(cls: type) -> typing.Callable[[typing.Any], tuple]:
+    """Helper function to get a function returning a record's field values"""
+
+    fields = slots(cls)
+
+    if len(fields) == 1:
+        return lambda record: (getattr(record, fields[0]),)
+
+    return attrgetter(*fields)
+
+
+def restore(cls: type, *values) -> typing.Any:
+    """
+    Rebuild a pickled :class:`Record`. Stored rows refer to this function by
+    name, so it must not be moved or renamed.
+
+    :param cls: The record's class
+    :param values: The record's field values, in the order of its slots
+    :returns: The record
+    """
+
+    record = cls.__new__(cls)
+    fields = slots(cls)
+
+    for name, value in zip(fields, values):
+        setattr(record, name, value)
+
+    # fields added since the row was stored
+    for name in fields[len(values) :]:
+        setattr(record, name, cls.defaults[name])
+
+    return record
+
+
+class Record:
+    """
+    Base class for stored models. Subclasses declare their fields in
+    ``__slots__``, so instances carry no ``__dict__``, and are pickled as a
+    call to :func:`restore` with their field values, which is smaller and
+    quicker to load than an attribute dict. New fields must be appended to
+    ``__slots__`` and given a value in :attr:`defaults`, so that older rows
+    still load; rows pickled before the models had slots load as well.
+    """
+
+    __slots__ = ()
+
+    #: Values for fields which older rows may lack
+    defaults: typing.ClassVar[dict[str, typing.Any]] = {}
+
+    def __reduce__(self):
+        return (restore, (type(self), *_values(type(self))(self)))
+
+    def __setstate__(self, state: dict[str, typing.Any]):
+        # the instance's __dict__, pickled before the model had slots
+        if self.defaults:
+            state = self.defaults | state
+
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class LazyTable(MutableMapping):
+    """SqliteDict table which is not opened until it is first accessed"""
+
+    def __init__(self, filename: str, tablename: str):
+        #: Path of the database file
+        self.filename = filename
+        #: Name of the table within the file
+        self.tablename = tablename
+        self._db: SqliteDict | None = None
+
+    def __repr__(self):
+        return (
+            f"<LazyTable filename='{self.filename}' "
+            f"tablename='{self.tablename}' open={self._db is not None}>"
+        )
+
+    @property
+    def db(self) -> SqliteDict:
+        """The underlying table, opened if necessary"""
+
+        if self._db is None:
+            self._db = SqliteDict(
+                self.filename,
+                tablename=self.tablename,
+                autocommit=True,
+                journal_mode="WAL",
+            )
+
+        return self._db
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the table has been opened"""
+
+        return self._db is not None
+
+    def close(self):
+        """Close the table, if it is open. It will be reopened on next use."""
+
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __getitem__(self, key):
+        return self.db[key]
+
+    def __setitem__(self, key, value):
+        self.db[key] = value
+
+    def __delitem__(self, key):
+        del self.db[key]
+
+    def __contains__(self, key):
+        return key in self.db
+
+    def __iter__(self):
+        return iter(self.db)
+
+    def __len__(self):
+        return len(self.db)
+
+
+def table(name: str, tablename: str) -> TimedTable:
+    """
+    Get a timed table in the bot's data folder, opened on first use.
+
+    :param name: The database name; the file is `<name>.sqlite3`
+    :param tablename: The table within the database
+    :returns: The table, reported to metrics as `<name>.<tablename>`
+    """
+
+    return TimedTable(
+        LazyTable(f"{data_folder}{name}.sqlite3", tablename),
+        f"{name}.{tablename}",
+    )
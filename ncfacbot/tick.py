@@ -1,21 +1,40 @@
 "Next game tick command"
 
 # stdlib
-from datetime import datetime, timezone
+import asyncio as aio
+from datetime import datetime
+from inspect import iscoroutinefunction
+from itertools import count
 from random import randrange
+import time
 import typing
 
 # 3rd party
 from aethersprite import log
+from aethersprite.authz import channel_only
 from aethersprite.common import DATETIME_FORMAT, seconds_to_str
 from aethersprite.emotes import THUMBS_DOWN
-from discord.ext.commands import Bot, command, Context
+from discord import Guild
+from discord.ext.commands import Bot, check, command, Context
 
 # local
-from . import discord_timestamp, get_next_tick
+from . import discord_timestamp, shards, tickmath
+from .metrics import instrument, record_lateness, timed
+from .regen import Character, project
+from .storage import Record, table
+from .tickmath import tick_index, tick_time
+
+if typing.TYPE_CHECKING:
+    from fastapi import FastAPI
 
 #: Future/past tick limit
 TICK_LIMIT = 1000
+#: Tick range length limit
+RANGE_LIMIT = 16
+#: Tick reminder limit
+REMIND_LIMIT = 96
+#: Maximum number of characters per regen projection request
+ROSTER_LIMIT = 500
 #: Silly stuff to say for past ticks
 SILLY = (
     ", when the west was still wild...",
@@ -27,48 +46,538 @@ SILLY = (
 )
 SILLY_LEN = len(SILLY)
 
+bot: Bot
+# database
+reminders = table("tick", "remind")
+
+
+class TickReminder(Record):
+    """Tick reminder requested by a user"""
+
+    __slots__ = ("user", "channel", "tick")
+
+    def __init__(self, user: int, channel: int, tick: int):
+        #: The ID of the user to remind
+        self.user = user
+        #: The ID of the channel where the request was made
+        self.channel = channel
+        #: The index of the tick to remind them at
+        self.tick = tick
+
+    def __repr__(self):
+        return (
+            f"<TickReminder user={self.user} channel={self.channel} "
+            f"tick={self.tick}>"
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Get the reminder as a dict of JSON-compatible values.
+
+        :returns: The reminder's fields keyed by name
+        """
+
+        # snowflakes are too large for some JSON readers to hold as numbers
+        return {
+            "user": str(self.user),
+            "channel": str(self.channel),
+            "tick": self.tick,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TickReminder":
+        """
+        Create a reminder from a dict made by :meth:`to_dict`.
+
+        :param data: The reminder's fields keyed by name
+        :returns: The reminder
+        """
+
+        return cls(int(data["user"]), int(data["channel"]), int(data["tick"]))
+
+
+class TickService:
+    """
+    Fires subscribed callbacks at game tick boundaries
+
+    A single loop timer is kept for the next boundary. One-shot subscriptions
+    are bucketed by the index of the tick they are due at, so each boundary
+    only visits the subscriptions which are due.
+    """
+
+    def __init__(self):
+        self._ids = count()
+        #: One-shot subscriptions keyed by tick index, then subscription ID
+        self._buckets: dict[int, dict[int, typing.Callable]] = {}
+        #: Subscriptions which fire at every tick, keyed by subscription ID
+        self._every: dict[int, typing.Callable] = {}
+        #: Tick index of each one-shot subscription, keyed by subscription ID
+        self._due: dict[int, int] = {}
+        self._handle: aio.TimerHandle | None = None
+        self._next = 0
+
+    def start(self):
+        """Start firing at tick boundaries."""
+
+        if self._handle is None:
+            self._next = tick_index(tickmath.now()) + 1
+            self._arm()
+
+    def stop(self):
+        """Stop firing at tick boundaries."""
+
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def subscribe(self, callback: typing.Callable, tick: int | None = None):
+        """
+        Subscribe to a tick boundary.
+
+        The callback is called with the time of the tick as its only argument.
+        It may be a plain function or a coroutine function.
+
+        :param callback: The function to call
+        :param tick: The index of the tick to fire at, or None for every tick
+        :returns: The subscription ID, for unsubscribing
+        """
+
+        sub = next(self._ids)
+
+        if tick is None:
+            self._every[sub] = callback
+        elif tick < self._next:
+            # already passed; fire as soon as possible
+            aio.get_event_loop().call_soon(
+                self._call, callback, tick_time(tick)
+            )
+        else:
+            self._buckets.setdefault(tick, {})[sub] = callback
+            self._due[sub] = tick
+
+        return sub
+
+    def unsubscribe(self, sub: int):
+        """
+        Remove a subscription.
+
+        :param sub: The subscription ID returned by :meth:`subscribe`
+        """
+
+        if sub in self._every:
+            del self._every[sub]
+
+            return
+
+        tick = self._due.pop(sub, None)
+
+        if tick is None:
+            return
+
+        bucket = self._buckets[tick]
+        del bucket[sub]
+
+        if not bucket:
+            del self._buckets[tick]
+
+    def _arm(self):
+        """Set the loop timer for the next boundary."""
+
+        loop = aio.get_event_loop()
+        wait = max(0, tickmath.tick_stamp(self._next) - time.time())
+        self._handle = loop.call_later(wait, self._fire)
+
+    def _call(self, callback: typing.Callable, when: datetime):
+        """Call a subscriber, isolating any failure."""
+
+        try:
+            if iscoroutinefunction(callback):
+                aio.get_event_loop().create_task(callback(when))
+            else:
+                callback(when)
+        except Exception:
+            log.exception(f"Tick subscriber {callback} failed")
+
+    @timed("tick.fire")
+    def _fire(self):
+        """Fan out to every subscriber due at the current boundary."""
+
+        now = tick_index(tickmath.now())
+
+        if self._next <= now:
+            record_lateness("tick.fire", tickmath.tick_stamp(self._next))
+
+        # fire any boundaries which were missed, then the current one
+        while self._next <= now:
+            when = tick_time(self._next)
+
+            for sub, callback in self._buckets.pop(self._next, {}).items():
+                del self._due[sub]
+                self._call(callback, when)
+
+            for callback in tuple(self._every.values()):
+                self._call(callback, when)
+
+            self._next += 1
+
+        self._arm()
+
+
+def get_tick_service(bot: Bot) -> TickService:
+    """
+    Get the bot's tick service.
+
+    :param bot: The bot instance
+    :returns: The tick service shared by all cogs
+    """
+
+    return getattr(bot, "tick_service")
+
+
+def _remind(guild: str, user: str):
+    """Tick reminder callback"""
+
+    async def callback(when: datetime):
+        reminder = None
+        getattr(bot, "tick_reminders").pop((guild, user), None)
+
+        if guild in reminders and user in reminders[guild]:
+            r = reminders[guild]
+            reminder = r.pop(user)
+
+            if r:
+                reminders[guild] = r
+            else:
+                del reminders[guild]
+
+        if reminder is None:
+            return
+
+        channel = bot.get_channel(reminder.channel)
+
+        if channel is None:
+            log.error(f"Unable to find channel {reminder.channel} for reminder")
+
+            return
+
+        await channel.send(  # type: ignore
+            f":alarm_clock: <@{reminder.user}> Tick reminder for "
+            f"{discord_timestamp(when)}!"
+        )
+        log.info(f"Sent tick reminder to {reminder.user}")
+
+    return callback
+
+
+def adopt(guild: Guild):
+    """Subscribe a guild's tick reminders, if they aren't already"""
+
+    gid = str(guild.id)
+
+    if gid not in reminders:
+        return
+
+    service = get_tick_service(bot)
+    subs: dict = getattr(bot, "tick_reminders")
+
+    for uid, reminder in reminders[gid].items():
+        if (gid, uid) in subs:
+            continue
+
+        log.info(f"Scheduling {reminder}")
+        subs[(gid, uid)] = service.subscribe(_remind(gid, uid), reminder.tick)
+
+
+def release(guild: Guild):
+    """Unsubscribe a guild's tick reminders in this process, keeping them
+    stored"""
+
+    gid = str(guild.id)
+    service = get_tick_service(bot)
+    subs: dict = getattr(bot, "tick_reminders")
+
+    for key in [k for k in subs if k[0] == gid]:
+        service.unsubscribe(subs.pop(key))
+
+
+async def on_ready():
+    """Subscribe tick reminders from database"""
+
+    if hasattr(bot, "__tick_ready__"):
+        return
+
+    setattr(bot, "__tick_ready__", None)
+
+    # only this process's guilds; other processes subscribe their own
+    for guild in bot.guilds:
+        adopt(guild)
+
+
+def _relative(stamp: int, now: int):
+    """Helper function to describe a tick time relative to now"""
+
+    if stamp >= now:
+        until = seconds_to_str(stamp - now)
+
+        return f"{until} from now" if len(until) else "right now!"
+
+    return f"{seconds_to_str(now - stamp)} before now"
+
 
 @command(brief="Next game tick or time [n] ticks from now")
-async def tick(ctx: Context, n: typing.Optional[int] = 1):
+async def tick(
+    ctx: Context, n: typing.Optional[int] = 1, m: typing.Optional[int] = None
+):
     """
     Next game tick or time [n] ticks from now in GMT
 
-    Show the next game tick in GMT. Provide a value for <n> to get the GMT timestamp of <n> ticks from now. For past ticks, use a negative number.
+    Show the next game tick in GMT. Provide a value for <n> to get the GMT timestamp of <n> ticks from now. For past ticks, use a negative number. Provide a second value <m> to list every tick from <n> to <m> ticks from now, up to 16 at a time.
 
-    Values of n between -1000 and 1000 are allowed.
+    Values of n and m between -1000 and 1000 are allowed.
+
+    Examples:
+        !tick         (next tick)
+        !tick 4       (4 ticks from now)
+        !tick 1 8     (each of the next 8 ticks)
     """
 
-    assert n
-    if -TICK_LIMIT > n or n > TICK_LIMIT:
+    assert n is not None
+    last = n if m is None else m
+
+    if (
+        -TICK_LIMIT > min(n, last)
+        or max(n, last) > TICK_LIMIT
+        or abs(last - n) >= RANGE_LIMIT
+    ):
         # let's not be silly, now
         await ctx.message.add_reaction(THUMBS_DOWN)
-        log.warn(f"{ctx.author} made rejected next tick request of {n}")
+        log.warn(f"{ctx.author} made rejected next tick request of {n} {m}")
         return
 
-    future_tick = get_next_tick(n)
-    tick_str = f"{discord_timestamp(future_tick)} - "
-    until = ""
+    now = tickmath.now()
 
-    if n >= 0:
-        until = seconds_to_str(
-            (future_tick - datetime.now(timezone.utc)).total_seconds()
+    if m is not None:
+        first = min(n, last)
+        stamps = tickmath.next_ticks(now, abs(last - n) + 1, first)
+        tick_str = "\n".join(
+            f"{tickmath.discord_stamp(t)} - {_relative(t, now)}" for t in stamps
+        )
+        await ctx.send(f":calendar:\n{tick_str}")
+        log.info(
+            f"{ctx.author} requested ticks {first} to {first + len(stamps) - 1}"
         )
 
-        if len(until):
-            until += " from now"
-        else:
-            until = "right now!"
+        return
 
-    elif n < 0:
-        until = seconds_to_str(
-            (datetime.now(timezone.utc) - future_tick).total_seconds()
-        )
-        until += " before now" + SILLY[randrange(SILLY_LEN)]
+    future_tick = tickmath.next_tick(now, n)
+    tick_str = (
+        f"{tickmath.discord_stamp(future_tick)} - "
+        f"{_relative(future_tick, now)}"
+    )
+
+    if n < 0:
+        tick_str += SILLY[randrange(SILLY_LEN)]
 
-    tick_str += until
     await ctx.send(f":calendar: {tick_str}")
     log.info(f"{ctx.author} requested next tick: {tick_str}")
 
 
-async def setup(bot: Bot):
-    bot.add_command(tick)
+@command(brief="Remind me at a future game tick", name="tick.remind")
+@check(channel_only)
+async def remind(ctx: Context, n: typing.Optional[int] = None):
+    """
+    Remind me [n] ticks from now
+
+    You may also use a value of 0 to cancel the reminder. If no value is provided, the time of the current reminder will be shown.
+
+    Values of n up to 96 (one day) are allowed.
+    """
+
+    assert ctx.guild
+    guild = str(ctx.guild.id)
+    user = str(ctx.author.id)
+    service = get_tick_service(ctx.bot)  # type: ignore
+    subs: dict = getattr(ctx.bot, "tick_reminders")
+    existing = reminders[guild].get(user) if guild in reminders else None
+
+    if n is None:
+        if existing is None:
+            await ctx.send(":person_shrugging: You do not have a reminder.")
+        else:
+            await ctx.send(
+                f":alarm_clock: Reminder set for "
+                f"{discord_timestamp(tick_time(existing.tick))}."
+            )
+
+        return
+
+    if 0 > n or n > REMIND_LIMIT:
+        await ctx.message.add_reaction(THUMBS_DOWN)
+        log.warn(f"{ctx.author} made rejected tick reminder request of {n}")
+
+        return
+
+    if existing is not None:
+        # not subscribed if the guild isn't scheduled in this process yet
+        sub = subs.pop((guild, user), None)
+
+        if sub is not None:
+            service.unsubscribe(sub)
+
+        r = reminders[guild]
+        del r[user]
+
+        if r:
+            reminders[guild] = r
+        else:
+            del reminders[guild]
+
+        if n == 0:
+            await ctx.send(
+                ":negative_squared_cross_mark: Your reminder has been canceled."
+            )
+            log.info(f"{ctx.author} canceled tick reminder")
+
+            return
+
+    if n == 0:
+        await ctx.send(":person_shrugging: You do not have a reminder.")
+
+        return
+
+    index = tick_index(tickmath.now()) + n
+    r = reminders[guild] if guild in reminders else {}
+    r[user] = TickReminder(ctx.author.id, ctx.channel.id, index)
+    reminders[guild] = r
+    subs[(guild, user)] = service.subscribe(_remind(guild, user), index)
+    stamp = discord_timestamp(tick_time(index))
+    await ctx.send(f":alarm_clock: I will remind you at {stamp}.")
+    log.info(f"{ctx.author} set tick reminder for {stamp}")
+
+
+@command(brief="When will my AP and MP be full?", name="tick.ap")
+async def tick_ap(
+    ctx: Context,
+    ap: int,
+    max_ap: int,
+    ap_rate: int = 1,
+    mp: typing.Optional[int] = None,
+    max_mp: typing.Optional[int] = None,
+    mp_rate: int = 1,
+):
+    """
+    When will my AP and MP be full?
+
+    Show the tick when your AP will be full, given your current <ap>, your <max_ap>, and the [ap_rate] you regain each tick (default 1). Provide your current [mp] and [max_mp] (and optionally [mp_rate]) to include MP as well.
+
+    Examples:
+        !tick.ap 12 50          (12 of 50 AP, 1 per tick)
+        !tick.ap 12 50 2        (12 of 50 AP, 2 per tick)
+        !tick.ap 12 50 1 5 30   (also 5 of 30 MP, 1 per tick)
+    """
+
+    now = tickmath.now()
+    with_mp = mp is not None and max_mp is not None
+    character = Character(
+        ctx.author.display_name,
+        ap,
+        max_ap,
+        ap_rate,
+        mp if with_mp else 0,  # type: ignore
+        max_mp if with_mp else 0,  # type: ignore
+        mp_rate,
+    )
+    p = project([character], now)[0]
+    resources = [(":zap: AP", p.ap_ticks, p.ap_full)]
+    lines = []
+
+    if with_mp:
+        resources.append((":crystal_ball: MP", p.mp_ticks, p.mp_full))
+
+    for label, ticks, full in resources:
+        if ticks is None:
+            lines.append(f"{label} will never be full.")
+        elif ticks == 0:
+            lines.append(f"{label} is already full.")
+        else:
+            lines.append(
+                f"{label} full in {ticks} ticks at "
+                f"{tickmath.discord_stamp(full)} - {_relative(full, now)}"  # type: ignore
+            )
+
+    await ctx.send("\n".join(lines))
+    log.info(f"{ctx.author} projected regen: {p}")
+
+
+async def setup(bot_: Bot):
+    global bot
+
+    bot = bot_
+    service = TickService()
+    setattr(bot, "tick_service", service)
+    setattr(bot, "tick_reminders", {})
+    service.start()
+    shards.handoff(bot, adopt, release)
+    bot.add_listener(on_ready)
+
+    for c in (tick, remind, tick_ap):
+        instrument(c)
+        bot.add_command(c)
+
+
+async def teardown(bot: Bot):
+    get_tick_service(bot).stop()
+    shards.unhandoff(bot, adopt)
+    bot.remove_listener(on_ready)
+
+
+async def http_ap(data: dict):
+    """
+    Project AP/MP regeneration for a roster of characters
+
+    :param data: The decoded request body
+    """
+
+    try:
+        roster = data["characters"]
+
+        if not 0 < len(roster) <= ROSTER_LIMIT:
+            raise ValueError("Roster size out of range")
+
+        characters = [
+            Character(
+                str(c["name"]),
+                int(c["ap"]),
+                int(c["max_ap"]),
+                int(c.get("ap_rate", 1)),
+                int(c.get("mp", 0)),
+                int(c.get("max_mp", 0)),
+                int(c.get("mp_rate", 1)),
+            )
+            for c in roster
+        ]
+    except (KeyError, TypeError, ValueError):
+        from fastapi.exceptions import HTTPException
+
+        raise HTTPException(400)
+
+    now = tickmath.now()
+
+    return {
+        "now": now,
+        "characters": [p.to_dict() for p in project(characters, now)],
+    }
+
+
+def setup_webapp(app: "FastAPI", _):
+    """Web application setup"""
+
+    from fastapi import APIRouter, Request
+
+    router = APIRouter(prefix="/nexusclash.tick")
+
+    @router.post("/ap")
+    async def ap(request: Request):
+        return await http_ap(await request.json())
+
+    app.include_router(router)
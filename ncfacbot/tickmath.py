@@ -0,0 +1,120 @@
+"""
+Game tick arithmetic on integer UNIX timestamps
+
+Commands should read the clock once with :func:`now` and pass the result to
+everything else, so that every value in a reply agrees. Batch queries return
+ranges, which are computed lazily rather than building lists of datetimes.
+"""
+
+# stdlib
+from datetime import datetime, timezone
+import time
+
+# 3rd party
+from aethersprite.common import FIFTEEN_MINS
+
+
+def now() -> int:
+    """
+    Read the clock.
+
+    :returns: The current UNIX timestamp in whole seconds
+    """
+
+    return int(time.time())
+
+
+def tick_index(stamp: int) -> int:
+    """
+    Get the index of the most recent tick at a given time.
+
+    :param stamp: The UNIX timestamp
+    :returns: The number of ticks since the epoch
+    """
+
+    return stamp // FIFTEEN_MINS
+
+
+def tick_stamp(index: int) -> int:
+    """
+    Get the time of a tick.
+
+    :param index: The number of ticks since the epoch
+    :returns: The UNIX timestamp of the tick
+    """
+
+    return index * FIFTEEN_MINS
+
+
+def tick_time(index: int) -> datetime:
+    """
+    Get the time of a tick as a datetime.
+
+    :param index: The number of ticks since the epoch
+    :returns: The time of the tick in GMT
+    """
+
+    return to_datetime(index * FIFTEEN_MINS)
+
+
+def next_tick(stamp: int, n: int = 1) -> int:
+    """
+    Calculate the time of a tick relative to a given time.
+
+    :param stamp: The UNIX timestamp to start from
+    :param n: The number of ticks forward to calculate; 0 is the most recent
+        tick, and negative values are past ticks
+    :returns: The UNIX timestamp of the calculated tick
+    """
+
+    return stamp - stamp % FIFTEEN_MINS + n * FIFTEEN_MINS
+
+
+def next_ticks(stamp: int, count: int, start: int = 1) -> range:
+    """
+    Calculate the times of several consecutive ticks.
+
+    :param stamp: The UNIX timestamp to start from
+    :param count: How many ticks to calculate
+    :param start: The offset of the first tick, as in :func:`next_tick`
+    :returns: The UNIX timestamps of the calculated ticks
+    """
+
+    first = next_tick(stamp, start)
+
+    return range(first, first + count * FIFTEEN_MINS, FIFTEEN_MINS)
+
+
+def ticks_between(start: int, end: int) -> range:
+    """
+    Calculate the times of the ticks after one time, up to and including
+    another.
+
+    :param start: The UNIX timestamp to start from (exclusive)
+    :param end: The UNIX timestamp to end at (inclusive)
+    :returns: The UNIX timestamps of the ticks in between
+    """
+
+    return range(next_tick(start), end + 1, FIFTEEN_MINS)
+
+
+def to_datetime(stamp: int) -> datetime:
+    """
+    Convert a UNIX timestamp to a datetime.
+
+    :param stamp: The UNIX timestamp
+    :returns: The time in GMT
+    """
+
+    return datetime.fromtimestamp(stamp, tz=timezone.utc)
+
+
+def discord_stamp(stamp: int) -> str:
+    """
+    Format a UNIX timestamp as a Discord timestamp.
+
+    :param stamp: The UNIX timestamp
+    :returns: A formatted Discord timestamp string
+    """
+
+    return f"<t:{stamp}>"
@@ -1,7 +1,7 @@
 // ==UserScript==
 // @name		Nexus Clash Discord Bot Safe Contents (B4)
 // @namespace	https://roadha.us
-// @version		0.14
+// @version		0.15
 // @description	Sends the components, potions, and spell gems in the safe for consumption by https://github.com/haliphax/ncfacbot
 // @author		haliphax
 // @match		https://www.nexusclash.com/modules.php?name=Game*
@@ -38,6 +38,8 @@
 		categories = ['Component', 'Potion', 'Spell'],
 		regex_category = /Retrieve ([A-Za-z]+)/,
 		regex_spellblind = /^small [a-z]+ gem(, [0-9]+ shots)?( \([0-9]+\))?$/i,
+		regex_spell = /^(.+?) - Small [A-Za-z]+ Gem, ([0-9]+) shots \(([0-9]+)\)$/,
+		regex_counted = /^(.+?) \(([0-9]+)\)$/,
 		category_items = {},
 		chars = GM_getValue('characters', {}),
 		last_known = GM_getValue('last_known', ''),
@@ -84,6 +86,30 @@
 		return;
 	}
 
+	// split an item's text into its fields; anything unexpected is sent as
+	// text, which the server still accepts
+	const structured = (category, text) => {
+		if (category == 'Spell') {
+			const spell = regex_spell.exec(text);
+
+			if (!spell)
+				return text;
+
+			return {
+				name: spell[1],
+				shots: parseInt(spell[2], 10),
+				count: parseInt(spell[3], 10),
+			};
+		}
+
+		const counted = regex_counted.exec(text);
+
+		if (!counted)
+			return text;
+
+		return {name: counted[1], count: parseInt(counted[2], 10)};
+	};
+
 	for (let c in categories) {
 		const category = categories[c];
 
@@ -121,7 +147,7 @@
 				break;
 			}
 
-			category_items[category].push(name);
+			category_items[category].push(structured(category, name));
 		}
 	}
 